@@ -0,0 +1,51 @@
+"""
+签名服务器吞吐对比
+同时压测多个签名服务器（例如 gevent 版 server.py 和 asyncio 版 server_async.py），
+输出每个服务器的吞吐量和延迟分位数。
+
+使用方法：
+  python server.py                                  # 默认端口 5005
+  PORT=5006 python server_async.py
+  python bench_compare.py http://localhost:5005 http://localhost:5006 --concurrency 32 --duration 30
+
+说明：
+  每个请求的 data 都不同，并带上 Cache-Control: no-cache，
+  避免签名缓存和相同请求合并影响对比结果。
+"""
+
+import argparse
+import json
+
+from load_test import run_load
+
+
+def main():
+    parser = argparse.ArgumentParser(description='签名服务器吞吐对比')
+    parser.add_argument('urls', nargs='+', help='签名服务器地址，例如 http://localhost:5005')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发请求数（默认 16）')
+    parser.add_argument('--duration', type=float, default=20, help='每个服务器压测时长（秒，默认 20）')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    results = []
+    for url in args.urls:
+        url = url.rstrip('/')
+        print(f"正在压测 {url}（并发 {args.concurrency}，{args.duration:.0f} 秒）...")
+        results.append(run_load(url, args.concurrency, args.duration))
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+
+    print("\n" + "=" * 86)
+    print(f"{'服务器':<32}{'成功':>8}{'失败':>8}{'RPS':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}")
+    print("=" * 86)
+    for r in results:
+        print(f"{r['url']:<32}{r['ok']:>8}{sum(r['errors'].values()):>8}{r['throughput_rps']:>10.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+        if r['errors']:
+            print(f"  错误分布: {r['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+签名调用开销微基准
+对比同一个页面上三种调用 window._webmsxyw 的方式每次签名的耗时：
+  - evaluate：原来的写法，每次发送表达式 "([url, data]) => window._webmsxyw(url, data)"
+  - batch：page.evaluate(BATCH_SIGN_JS, ...)，即 SIGN_FAST_PATH=0 时的路径
+  - fast：SignFastPath，缓存函数句柄并通过 CDP Runtime.callFunctionOn 调用
+
+使用方法：
+  python bench_sign_fastpath.py                  # 使用本地的模拟签名函数，不需要网络
+  python bench_sign_fastpath.py --real           # 访问小红书首页，使用真实的签名函数
+  python bench_sign_fastpath.py --iterations 5000 --json
+
+说明：
+  模拟签名函数几乎不耗时，测出的差距就是每次调用的固定开销；
+  真实签名函数本身的耗时对三种方式相同。
+"""
+
+import argparse
+import json
+import time
+
+from playwright.sync_api import sync_playwright
+
+import server
+
+# 模拟签名函数：返回结构与真实的 window._webmsxyw 相同
+FAKE_SIGNER_HTML = """
+<html><body><script>
+window._webmsxyw = (url, data) => ({
+    'X-s': 'XYW_' + btoa(unescape(encodeURIComponent(url + JSON.stringify(data || '')))),
+    'X-t': Date.now()
+});
+</script></body></html>
+"""
+
+LEGACY_SIGN_JS = "([url, data]) => window._webmsxyw(url, data)"
+
+SAMPLE_URI = "/api/sns/web/v1/feed"
+SAMPLE_DATA = {"source_note_id": "64b7a2f1000000001203f8c4", "image_formats": ["jpg", "webp", "avif"]}
+
+
+def measure(name, call, iterations, warmup):
+    """执行 warmup 次预热后计时 iterations 次，返回每次调用的耗时统计（微秒）"""
+    for _ in range(warmup):
+        call()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return {
+        'mode': name,
+        'iterations': iterations,
+        'mean_us': sum(samples) / len(samples),
+        'p50_us': server.percentile(samples, 50),
+        'p99_us': server.percentile(samples, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='签名调用开销微基准')
+    parser.add_argument('--iterations', type=int, default=2000, help='每种方式计时的调用次数（默认 2000）')
+    parser.add_argument('--warmup', type=int, default=200, help='每种方式的预热次数（默认 200）')
+    parser.add_argument('--real', action='store_true', help='访问小红书首页，使用真实的签名函数')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=True)
+        page = browser.new_page()
+        if args.real:
+            page.goto("https://www.xiaohongshu.com")
+            server.wait_for_sign_ready(page, server.SIGN_READY_TIMEOUT)
+        else:
+            page.set_content(FAKE_SIGNER_HTML)
+
+        fast = server.SignFastPath(page)
+        payload = [[SAMPLE_URI, SAMPLE_DATA]]
+        results = [
+            measure('evaluate', lambda: page.evaluate(LEGACY_SIGN_JS, [SAMPLE_URI, SAMPLE_DATA]),
+                    args.iterations, args.warmup),
+            measure('batch', lambda: page.evaluate(server.BATCH_SIGN_JS, payload), args.iterations, args.warmup),
+            measure('fast', lambda: fast.call(payload), args.iterations, args.warmup),
+        ]
+        browser.close()
+
+    baseline = results[0]['mean_us']
+    for r in results:
+        r['speedup'] = baseline / r['mean_us'] if r['mean_us'] else 0
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+
+    print("\n" + "=" * 60)
+    print(f"{'方式':<12}{'平均(us)':>12}{'p50(us)':>12}{'p99(us)':>12}{'加速比':>10}")
+    print("=" * 60)
+    for r in results:
+        print(f"{r['mode']:<12}{r['mean_us']:>12.1f}{r['p50_us']:>12.1f}{r['p99_us']:>12.1f}{r['speedup']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
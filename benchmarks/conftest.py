@@ -0,0 +1,87 @@
+"""
+签名服务微基准的公共夹具
+用假的页面对象代替 Chromium，所有签名都在进程内完成，不需要浏览器和网络
+所有模块级状态都通过 MonkeyPatch 设置，基准结束后自动恢复，不影响同一进程中的其他测试
+"""
+
+import logging
+import os
+import queue
+import sys
+
+# 导入 server 之前设置：关闭合并窗口（基准测的是单个请求的开销）和 CDP 快速路径（假页面没有 CDP 会话），
+# 不采样成功日志，避免日志输出影响测量
+os.environ.setdefault('SIGN_COALESCE_WINDOW_MS', '0')
+os.environ.setdefault('SIGN_FAST_PATH', '0')
+os.environ.setdefault('LOG_SUCCESS_SAMPLE_RATE', '0')
+os.environ.setdefault('STORAGE_STATE_PATH', '')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# 与单元测试共用 tests/fakes.py 中的假页面
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+import pytest
+
+import server
+from fakes import FakePage
+
+
+# 基准中的签名缓存 TTL：足够长，命中缓存的基准不会因为运行时间超过默认的 10 秒而变成未命中
+BENCH_CACHE_TTL = 3600
+
+
+@pytest.fixture(scope='session')
+def fake_pages():
+    """启动页面池：两个假页面，浏览器状态为 ready；签名缓存、熔断器和相同请求合并都是基准专用的"""
+    pages = [FakePage(), FakePage()]
+    log_level = server.logger.level
+    server.logger.setLevel(logging.WARNING)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(server, 'pool_pages', pages)
+        mp.setattr(server, 'context_page', pages[0])
+        mp.setattr(server, 'page_workers', [])
+        mp.setattr(server, 'sign_jobs', queue.Queue(maxsize=server.PAGE_QUEUE_MAX))
+        mp.setattr(server, 'sign_cache', server.SignCache(
+            BENCH_CACHE_TTL, server.SIGN_CACHE_MAX_ENTRIES, server.SIGN_CACHE_MAX_BYTES
+        ))
+        mp.setattr(server, 'inflight_signs', {})
+        mp.setattr(server, 'sign_breaker', server.CircuitBreaker(
+            server.BREAKER_FAILURE_THRESHOLD, server.BREAKER_OPEN_SECONDS, server.BREAKER_HALF_OPEN_PROBES,
+            recover=lambda: None
+        ))
+        mp.setattr(server, 'browser_state', server.browser_state)
+        mp.setattr(server, 'browser_state_reason', server.browser_state_reason)
+        mp.setattr(server, 'browser_state_changed_at', server.browser_state_changed_at)
+        server.start_page_workers(pages)
+        server.browser_ready_event.set()
+        server.set_browser_state('ready', '基准测试')
+        yield pages
+        for worker in server.page_workers:
+            worker.stop()
+        server.browser_ready_event.clear()
+    server.logger.setLevel(log_level)
+
+
+@pytest.fixture
+def sign_server(fake_pages):
+    """每个基准开始前清空签名缓存并重置熔断器"""
+    server.sign_cache.entries.clear()
+    server.sign_cache.bytes = 0
+    server.sign_breaker.consecutive_failures = 0
+    FakePage.fail_next = 0
+    return server
+
+
+@pytest.fixture
+def fail_once():
+    """让下一次页面调用失败一次"""
+    def inject():
+        FakePage.fail_next = 1
+    return inject
+
+
+@pytest.fixture
+def client(sign_server):
+    return sign_server.app.test_client()
+
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+运行签名服务微基准，并与保存的基线对比
+
+使用方法：
+  pip install -r requirements-dev.txt
+  python benchmarks/run_benchmarks.py                    # 第一次运行保存基线，之后与基线对比
+  python benchmarks/run_benchmarks.py --save-baseline    # 重新保存基线（例如确认性能变化是预期的）
+  BENCH_MAX_SLOWDOWN=10 python benchmarks/run_benchmarks.py
+
+任意一个基准的平均耗时比基线慢超过 BENCH_MAX_SLOWDOWN%（默认 20%）时退出码非 0。
+基线保存在 benchmarks/.benchmarks/ 下，只在本机有意义，不要提交到仓库。
+其余参数原样传给 pytest，例如 -k generate_sign。
+"""
+
+import glob
+import os
+import sys
+
+import pytest
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+STORAGE_DIR = os.path.join(BENCH_DIR, '.benchmarks')
+MAX_SLOWDOWN = int(os.environ.get('BENCH_MAX_SLOWDOWN', 20))  # 允许比基线慢多少（整数百分比）
+
+
+def main():
+    args = sys.argv[1:]
+    save_baseline = '--save-baseline' in args
+    if save_baseline:
+        args.remove('--save-baseline')
+
+    pytest_args = [BENCH_DIR, f'--benchmark-storage=file://{STORAGE_DIR}', *args]
+    has_baseline = bool(glob.glob(os.path.join(STORAGE_DIR, '*', '*.json')))
+
+    if save_baseline or not has_baseline:
+        print(f"保存新的基线到 {STORAGE_DIR}")
+        pytest_args.append('--benchmark-save=baseline')
+    else:
+        print(f"与最近保存的基线对比，平均耗时慢超过 {MAX_SLOWDOWN}% 视为失败")
+        pytest_args += ['--benchmark-compare', f'--benchmark-compare-fail=mean:{MAX_SLOWDOWN}%']
+
+    sys.exit(pytest.main(pytest_args))
+
+
+if __name__ == '__main__':
+    main()
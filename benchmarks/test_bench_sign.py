@@ -0,0 +1,117 @@
+"""
+签名服务进程内微基准（pytest-benchmark）
+覆盖 generate_sign、/sign 处理函数、JSON 解析和响应构建，小 / 大 data、成功 / 重试 / 命中缓存几种路径
+
+运行方式见 benchmarks/run_benchmarks.py
+"""
+
+import json
+
+import pytest
+
+import server
+
+pytest.importorskip('pytest_benchmark')
+
+SMALL_DATA = {"source_note_id": "64b7a2f1000000001203f8c4", "image_formats": ["jpg", "webp", "avif"]}
+
+# 接近发布笔记时的请求体：长正文、多张图片、多个话题
+LARGE_DATA = {
+    "common": {
+        "type": "normal",
+        "title": "标题" * 10,
+        "desc": "正文内容，" * 400,
+        "ats": [],
+        "hash_tag": [{"id": str(i), "name": f"话题{i}", "link": "", "type": "topic"} for i in range(10)],
+        "business_binds": "{\"version\":1,\"noteId\":0}",
+        "privacy_info": {"op_type": 1, "type": 0},
+    },
+    "image_info": {
+        "images": [
+            {"file_id": f"spectrum/{i:032x}", "width": 1080, "height": 1440, "metadata": {"source": -1},
+             "stickers": {"version": 2, "floating": []}, "extra_info_json": "{\"mimeType\":\"image/jpeg\"}"}
+            for i in range(18)
+        ]
+    },
+}
+
+SIGN_URI = "/api/sns/web/v1/feed"
+
+PAYLOADS = {
+    'small': SMALL_DATA,
+    'large': LARGE_DATA,
+}
+
+
+@pytest.mark.parametrize('size', PAYLOADS)
+def test_generate_sign(benchmark, sign_server, size):
+    data = PAYLOADS[size]
+    result = benchmark(sign_server.generate_sign, SIGN_URI, data, '', '', use_cache=False)
+    assert result['x-s']
+
+
+def test_generate_sign_retry(benchmark, sign_server, fail_once):
+    """每次签名第一次尝试失败，第二次立即重试成功"""
+    result = benchmark.pedantic(
+        sign_server.generate_sign,
+        args=(SIGN_URI, SMALL_DATA, '', ''),
+        kwargs={'use_cache': False},
+        setup=fail_once,
+        rounds=500
+    )
+    assert result['x-s']
+
+
+@pytest.mark.parametrize('size', PAYLOADS)
+def test_generate_sign_cache_hit(benchmark, sign_server, size):
+    data = PAYLOADS[size]
+    sign_server.generate_sign(SIGN_URI, data, '', '')
+    misses = sign_server.sign_cache.misses
+    result = benchmark(sign_server.generate_sign, SIGN_URI, data, '', '')
+    assert result['x-s']
+    assert sign_server.sign_cache.misses == misses
+
+
+@pytest.mark.parametrize('size', PAYLOADS)
+def test_sign_cache_key(benchmark, sign_server, size):
+    benchmark(sign_server.sign_cache_key, SIGN_URI, PAYLOADS[size])
+
+
+@pytest.mark.parametrize('size', PAYLOADS)
+def test_sign_handler(benchmark, client, size):
+    body = {"uri": SIGN_URI, "data": PAYLOADS[size], "a1": "", "web_session": ""}
+    headers = {"Cache-Control": "no-cache"}
+    response = benchmark(client.post, '/sign', json=body, headers=headers)
+    assert response.status_code == 200
+
+
+def test_sign_handler_cache_hit(benchmark, client):
+    body = {"uri": SIGN_URI, "data": SMALL_DATA, "a1": "", "web_session": ""}
+    client.post('/sign', json=body)
+    misses = server.sign_cache.misses
+    response = benchmark(client.post, '/sign', json=body)
+    assert response.status_code == 200
+    assert server.sign_cache.misses == misses
+
+
+@pytest.mark.parametrize('size', PAYLOADS)
+def test_request_json_parsing(benchmark, sign_server, size):
+    """Flask 解析请求体 JSON 的开销"""
+    raw = json.dumps({"uri": SIGN_URI, "data": PAYLOADS[size], "a1": "", "web_session": ""})
+
+    def parse():
+        with sign_server.app.test_request_context('/sign', method='POST', data=raw, content_type='application/json'):
+            return sign_server.request.get_json()
+
+    assert benchmark(parse)['uri'] == SIGN_URI
+
+
+def test_response_building(benchmark, sign_server):
+    """jsonify 构建签名响应的开销"""
+    result = {"x-s": "XYW_" + "a" * 200, "x-t": "1700000000000"}
+
+    def build():
+        with sign_server.app.app_context():
+            return sign_server.jsonify(result)
+
+    assert benchmark(build).status_code == 200
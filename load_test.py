@@ -0,0 +1,176 @@
+"""
+签名服务器压测工具
+以固定并发或固定速率请求 /sign，输出吞吐量、延迟分位数（p50/p95/p99）和错误分布。
+
+配合离线替身签名页面，可以在没有外网的 Linux 机器上完成压测：
+  FAKE_SIGNER_DIR=fixtures/fake_signer python server.py
+  python load_test.py --concurrency 32 --duration 30
+  python load_test.py --rps 500 --duration 30 --json --output report.json
+
+说明：
+  - 固定并发（--concurrency）：N 个线程各自循环发送请求，测的是服务器能达到的最大吞吐
+  - 固定速率（--rps）：按计划时间发送请求，不受响应快慢影响；延迟从计划发送时间算起，
+    服务器变慢时排队时间也会计入延迟，不会被低估
+  - 默认每个请求的 data 都不同，并带上 Cache-Control: no-cache，避免签名缓存和相同请求合并影响结果；
+    --repeat-data 时所有请求使用相同的 data，用于测试缓存效果
+"""
+
+import argparse
+import itertools
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+SIGN_URI = "/api/sns/web/v1/feed"
+
+
+def percentile(sorted_values, pct):
+    """已排序列表的分位数（最近秩法，与 server.percentile 一致：第 ceil(pct% × n) 个值）"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(math.ceil(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoadStats:
+    """线程安全地收集每个请求的结果"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def record(self, outcome, elapsed_ms):
+        with self.lock:
+            if outcome == 'ok':
+                self.latencies.append(elapsed_ms)
+            else:
+                self.errors[outcome] = self.errors.get(outcome, 0) + 1
+
+    def report(self, base_url, elapsed, **settings):
+        latencies = sorted(self.latencies)
+        return {
+            'url': base_url,
+            **settings,
+            'elapsed_seconds': round(elapsed, 3),
+            'requests': len(latencies) + sum(self.errors.values()),
+            'ok': len(latencies),
+            'errors': self.errors,
+            'throughput_rps': len(latencies) / elapsed if elapsed else 0,
+            'mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1] if latencies else 0.0,
+        }
+
+
+def send_sign(session, base_url, sequence, repeat_data=False):
+    """发送一个签名请求，返回结果类型：ok、http_<状态码> 或异常类名"""
+    payload = {
+        "uri": SIGN_URI,
+        "data": {"source_note_id": "0" if repeat_data else str(sequence)},
+        "a1": "",
+        "web_session": ""
+    }
+    headers = {} if repeat_data else {"Cache-Control": "no-cache"}
+    try:
+        response = session.post(f"{base_url}/sign", json=payload, headers=headers, timeout=30)
+        return 'ok' if response.status_code == 200 else f"http_{response.status_code}"
+    except Exception as e:
+        return type(e).__name__
+
+
+def run_load(base_url, concurrency, duration, repeat_data=False):
+    """以固定并发持续请求 /sign，返回统计结果"""
+    counter = itertools.count()
+    stats = LoadStats()
+    deadline = time.time() + duration
+
+    def worker():
+        session = requests.Session()
+        while time.time() < deadline:
+            started = time.perf_counter()
+            outcome = send_sign(session, base_url, next(counter), repeat_data)
+            stats.record(outcome, (time.perf_counter() - started) * 1000)
+
+    started = time.time()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.report(base_url, time.time() - started, mode='concurrency', concurrency=concurrency)
+
+
+def run_rate(base_url, rps, duration, max_inflight=256, repeat_data=False):
+    """以固定速率请求 /sign（开环），同时在途的请求最多 max_inflight 个，返回统计结果"""
+    stats = LoadStats()
+    local = threading.local()
+
+    def send(sequence, scheduled):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        outcome = send_sign(local.session, base_url, sequence, repeat_data)
+        stats.record(outcome, (time.perf_counter() - scheduled) * 1000)
+
+    total = int(rps * duration)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        for sequence in range(total):
+            scheduled = started + sequence / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, sequence, scheduled)
+    return stats.report(base_url, time.perf_counter() - started, mode='rate', target_rps=rps)
+
+
+def print_report(result):
+    print("\n" + "=" * 60)
+    print(f"压测结果: {result['url']}")
+    print("=" * 60)
+    print(f"请求数: {result['requests']}，成功: {result['ok']}，耗时: {result['elapsed_seconds']:.1f} 秒")
+    print(f"吞吐量: {result['throughput_rps']:.1f} 次/秒")
+    print(f"延迟(ms): 平均 {result['mean_ms']:.1f}，p50 {result['p50_ms']:.1f}，"
+          f"p95 {result['p95_ms']:.1f}，p99 {result['p99_ms']:.1f}，最大 {result['max_ms']:.1f}")
+    if result['errors']:
+        print(f"错误分布: {result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='签名服务器压测工具')
+    parser.add_argument('--url', default='http://localhost:5005', help='签名服务器地址（默认 http://localhost:5005）')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--concurrency', type=int, default=16, help='固定并发数（默认 16）')
+    mode.add_argument('--rps', type=float, help='固定速率（每秒请求数），设置后忽略 --concurrency')
+    parser.add_argument('--duration', type=float, default=20, help='压测时长（秒，默认 20）')
+    parser.add_argument('--max-inflight', type=int, default=256, help='固定速率模式下同时在途的最大请求数（默认 256）')
+    parser.add_argument('--repeat-data', action='store_true', help='所有请求使用相同的 data（允许命中签名缓存）')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    parser.add_argument('--output', help='把 JSON 结果写入文件')
+    args = parser.parse_args()
+
+    url = args.url.rstrip('/')
+    if args.rps:
+        print(f"正在压测 {url}（固定速率 {args.rps:g} 次/秒，{args.duration:.0f} 秒）...")
+        result = run_rate(url, args.rps, args.duration, args.max_inflight, args.repeat_data)
+    else:
+        print(f"正在压测 {url}（并发 {args.concurrency}，{args.duration:.0f} 秒）...")
+        result = run_load(url, args.concurrency, args.duration, args.repeat_data)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_report(result)
+
+
+if __name__ == '__main__':
+    main()
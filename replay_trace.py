@@ -0,0 +1,180 @@
+"""
+回放录制的 /sign 流量
+读取服务器通过 TRACE_FILE 录制的 JSONL，按原始的请求间隔把请求重新发给任意签名服务器，
+输出吞吐量、延迟分位数和错误分布，并与录制时的延迟对比。
+
+使用方法：
+  TRACE_FILE=traces/sign.jsonl python server.py                       # 录制
+  python replay_trace.py traces/sign.jsonl --url http://localhost:5006   # 1 倍速回放
+  python replay_trace.py traces/sign.jsonl --speed 10                    # 10 倍速（请求间隔缩短为 1/10）
+  python replay_trace.py traces/sign.jsonl --speed max --concurrency 64  # 不等待间隔，以固定并发尽快发送
+
+说明：
+  录制文件中没有 data 和查询参数的原始值，只有结构、参数名和指纹。回放时按结构生成同样大小、同样形状的 data，
+  按参数名生成查询参数，指纹相同的请求生成完全相同的请求，因此签名缓存和相同请求合并的命中情况与线上一致。
+  延迟从计划发送时间算起，服务器变慢时排队时间也会计入。
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+
+from load_test import LoadStats, percentile, print_report
+
+
+def load_trace(path, limit=None):
+    """读取录制文件，按到达时间排序"""
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries[:limit] if limit else entries
+
+
+def filler(fingerprint, salt, length):
+    """由指纹确定的填充字符串：相同指纹、相同位置得到相同内容"""
+    seed = hashlib.sha256(f"{fingerprint}:{salt}".encode('utf-8')).hexdigest()
+    return (seed * (length // len(seed) + 1))[:length]
+
+
+def build_data(shape, fingerprint, path='$'):
+    """按录制的结构生成 data"""
+    if shape is None:
+        return None
+    if isinstance(shape, dict) and 'dict' in shape:
+        return {key: build_data(item, fingerprint, f"{path}.{key}") for key, item in shape['dict'].items()}
+    if isinstance(shape, dict) and 'list' in shape:
+        return [build_data(shape['item'], fingerprint, f"{path}[{i}]") for i in range(shape['list'])]
+    if shape == 'bool':
+        return int(filler(fingerprint, path, 1), 16) % 2 == 0
+    if shape == 'int':
+        return int(filler(fingerprint, path, 8), 16)
+    if shape == 'float':
+        return int(filler(fingerprint, path, 8), 16) / 1000
+    # str:<长度> 或过深部分的 json:<字节数>，都用同样长度的字符串代替
+    length = shape.partition(':')[2]
+    return filler(fingerprint, path, int(length or 0))
+
+
+def build_uri(entry):
+    """按录制的路径和查询参数名生成 uri，参数值由查询指纹确定"""
+    keys = entry.get('query_keys')
+    if not keys:
+        return entry['uri']
+    query = urlencode([(key, filler(entry.get('query_fp', ''), f"?{i}", 8)) for i, key in enumerate(keys)])
+    return f"{entry['uri']}?{query}"
+
+
+def replay(entries, base_url, speed=1.0, concurrency=32, max_inflight=256):
+    """
+    回放请求，speed 为倍速（None 表示尽快发送，最多 concurrency 个并发），返回统计结果
+    """
+    stats = LoadStats()
+    local = threading.local()
+
+    def send(entry, scheduled):
+        # --speed max 没有计划发送时间，延迟从实际开始发送算起
+        started_at = scheduled or time.perf_counter()
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        payload = {
+            "uri": build_uri(entry),
+            "data": build_data(entry.get('data_shape'), entry.get('data_fp', '')),
+            "a1": "",
+            "web_session": ""
+        }
+        headers = {"Cache-Control": "no-cache"} if entry.get('no_cache') else {}
+        try:
+            response = local.session.post(f"{base_url}/sign", json=payload, headers=headers, timeout=30)
+            outcome = 'ok' if response.status_code == 200 else f"http_{response.status_code}"
+        except Exception as e:
+            outcome = type(e).__name__
+        stats.record(outcome, (time.perf_counter() - started_at) * 1000)
+
+    started = time.perf_counter()
+    if speed is None:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for entry in entries:
+                executor.submit(send, entry, None)
+    else:
+        first_ts = entries[0]['ts'] if entries else 0
+        with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+            for entry in entries:
+                scheduled = started + (entry['ts'] - first_ts) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(send, entry, scheduled)
+
+    return stats.report(base_url, time.perf_counter() - started, mode='replay',
+                        speed='max' if speed is None else speed, entries=len(entries))
+
+
+def recorded_summary(entries):
+    """录制时的延迟和结果分布，用于与回放结果对比"""
+    latencies = sorted(entry['latency_ms'] for entry in entries if entry.get('outcome') == 'ok')
+    outcomes = {}
+    for entry in entries:
+        outcomes[entry.get('outcome', 'unknown')] = outcomes.get(entry.get('outcome', 'unknown'), 0) + 1
+    span = entries[-1]['ts'] - entries[0]['ts'] if len(entries) > 1 else 0
+    return {
+        'requests': len(entries),
+        'duration_seconds': round(span, 3),
+        'rate_rps': len(entries) / span if span else 0,
+        'outcomes': outcomes,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回放录制的 /sign 流量')
+    parser.add_argument('trace', help='TRACE_FILE 录制的 JSONL 文件')
+    parser.add_argument('--url', default='http://localhost:5005', help='签名服务器地址（默认 http://localhost:5005）')
+    parser.add_argument('--speed', default='1', help='回放倍速，例如 1、10；max 表示不等待请求间隔（默认 1）')
+    parser.add_argument('--concurrency', type=int, default=32, help='--speed max 时的并发数（默认 32）')
+    parser.add_argument('--max-inflight', type=int, default=256, help='按间隔回放时同时在途的最大请求数（默认 256）')
+    parser.add_argument('--limit', type=int, help='只回放前 N 个请求')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    parser.add_argument('--output', help='把 JSON 结果写入文件')
+    args = parser.parse_args()
+
+    entries = load_trace(args.trace, args.limit)
+    if not entries:
+        parser.error(f"{args.trace} 中没有录制的请求")
+    speed = None if args.speed == 'max' else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed 必须大于 0，或者为 max")
+
+    recorded = recorded_summary(entries)
+    url = args.url.rstrip('/')
+    expected = f"约 {recorded['duration_seconds'] / speed:.0f} 秒" if speed else "尽快发送"
+    print(f"正在回放 {len(entries)} 个请求到 {url}（{args.speed} 倍速，{expected}）...")
+    result = replay(entries, url, speed, args.concurrency, args.max_inflight)
+    result['recorded'] = recorded
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+
+    print_report(result)
+    print(f"录制时: {recorded['requests']} 个请求，{recorded['rate_rps']:.1f} 次/秒，"
+          f"p50 {recorded['p50_ms']:.1f} ms，p95 {recorded['p95_ms']:.1f} ms，p99 {recorded['p99_ms']:.1f} ms，"
+          f"结果分布: {recorded['outcomes']}")
+
+
+if __name__ == '__main__':
+    main()
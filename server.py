@@ -8,74 +8,2208 @@
 from gevent import monkey
 monkey.patch_all()
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, has_request_context
 from playwright.sync_api import sync_playwright
 from gevent import pywsgi
+from gevent.event import AsyncResult, Event
+import gevent
+from collections import OrderedDict, deque
+from bisect import bisect_left
+from contextlib import contextmanager
 import os
+import sys
+import json
+import math
 import time
+import random
+import hashlib
+import fcntl
+import queue
+import socket
 import logging
+import threading
+import uuid
 import requests
+from urllib.parse import urlsplit, parse_qsl
+
+# 日志配置
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')  # text 或 json（每行一个 JSON 对象）
+LOG_SUCCESS_SAMPLE_RATE = float(os.environ.get('LOG_SUCCESS_SAMPLE_RATE', 1))  # 成功请求的 INFO 日志按该比例采样，失败和重试始终完整输出
+
+
+class JsonLogFormatter(logging.Formatter):
+    """结构化日志：每条记录一行 JSON，带上请求 ID"""
+    
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RequestIdFilter(logging.Filter):
+    """给日志记录加上当前请求的 ID（请求之外为 -）"""
+    
+    def filter(self, record):
+        record.request_id = g.get('request_id', '-') if has_request_context() else '-'
+        return True
+
+
+class AsyncLogHandler(logging.Handler):
+    """
+    非阻塞日志：请求 greenlet 只把日志记录放进队列，格式化和写 stdout 都在一个真正的 OS 线程里完成
+    （gevent 打过补丁的 threading 只是 greenlet，写 stdout 仍会阻塞 hub，因此这里使用原始的线程和队列）
+    
+    未被采样的请求先把 INFO 日志暂存起来：请求成功时直接丢弃，
+    一旦出现 WARNING 及以上（失败、重试），先补上暂存的日志，之后该请求的日志全部输出
+    """
+    
+    _STOP = object()  # close() 发给写日志线程的结束标记
+    
+    def __init__(self, target):
+        super().__init__()
+        self.target = target
+        self.queue = monkey.get_original('queue', 'SimpleQueue')()
+        # 原始的锁：写日志线程退出时释放，close() 据此等待它把队列写完
+        self.drained = monkey.get_original('_thread', 'allocate_lock')()
+        self.drained.acquire()
+        self.stopped = False
+        monkey.get_original('_thread', 'start_new_thread')(self.drain, ())
+    
+    def emit(self, record):
+        if has_request_context() and not g.get('log_sampled', True):
+            if record.levelno < logging.WARNING:
+                g.log_buffer.append(record)
+                return
+            g.log_sampled = True
+            for buffered in g.log_buffer:
+                self.queue.put(buffered)
+            g.log_buffer.clear()
+        self.queue.put(record)
+    
+    def drain(self):
+        # 只有这个线程写入 target，不需要 target 的锁
+        try:
+            while True:
+                record = self.queue.get()
+                if record is self._STOP:
+                    return
+                try:
+                    self.target.emit(record)
+                except Exception:
+                    self.target.handleError(record)
+        finally:
+            self.drained.release()
+    
+    def close(self):
+        # 进程退出时让写日志线程把队列里剩余的日志写完再退出，写入 target 的始终只有那一个线程
+        if not self.stopped:
+            self.stopped = True
+            self.queue.put(self._STOP)
+            self.drained.acquire(timeout=5)
+            self.target.flush()
+        super().close()
+
+
+def configure_logging():
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == 'json':
+        stream_handler.setFormatter(JsonLogFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'))
+    handler = AsyncLogHandler(stream_handler)
+    handler.addFilter(RequestIdFilter())
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+
 
 # 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+app = Flask(__name__)
+
+# 页面池配置
+PAGE_POOL_SIZE = max(1, int(os.environ.get('PAGE_POOL_SIZE', 1)))  # 预热页面数量
+PAGE_QUEUE_MAX = max(1, int(os.environ.get('PAGE_QUEUE_MAX', 64)))  # 签名任务队列上限，队列满时返回 429
+PAGE_ACQUIRE_TIMEOUT = float(os.environ.get('PAGE_ACQUIRE_TIMEOUT', 10))  # 等待签名任务完成的超时（秒）
+WORKER_INBOX_POLL = 0.5  # 空闲的页面持有者多久检查一次只发给自己的任务（秒）
+
+# 页面池自动扩缩容：根据排队等待时间、页面执行耗时和主机剩余内存在 [POOL_MIN, POOL_MAX] 之间调整页面数量
+POOL_MIN = max(1, int(os.environ.get('POOL_MIN', PAGE_POOL_SIZE)))  # 最少页面数
+POOL_MAX = max(POOL_MIN, int(os.environ.get('POOL_MAX', POOL_MIN)))  # 最多页面数，等于 POOL_MIN 时不自动扩缩容
+AUTOSCALE_INTERVAL = float(os.environ.get('AUTOSCALE_INTERVAL', 10))  # 扩缩容检查间隔（秒）
+AUTOSCALE_UP_WAIT_MS = float(os.environ.get('AUTOSCALE_UP_WAIT_MS', 100))  # 排队等待 p95 超过该值时扩容（毫秒）
+AUTOSCALE_DOWN_WAIT_MS = float(os.environ.get('AUTOSCALE_DOWN_WAIT_MS', 10))  # 排队等待 p95 低于该值且页面利用率低时缩容（毫秒）
+AUTOSCALE_DOWN_UTILIZATION = float(os.environ.get('AUTOSCALE_DOWN_UTILIZATION', 0.3))  # 页面平均忙碌比例低于该值时才缩容
+AUTOSCALE_MAX_EVAL_P95_MS = float(os.environ.get('AUTOSCALE_MAX_EVAL_P95_MS', 500))  # 页面执行耗时 p95 超过该值说明 CPU 已经饱和，不再扩容（毫秒）
+AUTOSCALE_MIN_FREE_MB = float(os.environ.get('AUTOSCALE_MIN_FREE_MB', 300))  # 主机可用内存低于该值时不扩容并主动缩容（MB）
+AUTOSCALE_UP_INTERVALS = 2  # 连续多少次检查满足扩容条件才扩容
+AUTOSCALE_DOWN_INTERVALS = 6  # 连续多少次检查满足缩容条件才缩容（比扩容更保守，避免来回抖动）
+AUTOSCALE_COOLDOWN = float(os.environ.get('AUTOSCALE_COOLDOWN', 30))  # 每次扩缩容后至少间隔多久（秒）
+
+# 批量签名配置
+SIGN_BATCH_MAX = int(os.environ.get('SIGN_BATCH_MAX', 100))  # 单次批量签名最多多少条
+
+# 在页面内循环签名，每一条单独捕获异常，一条失败不影响其他条
+# 签名函数不存在（页面已跳转或未加载完）时整个调用失败，由页面持有者重新加载页面
+BATCH_SIGN_JS = """
+(items) => {
+    if (typeof window._webmsxyw !== 'function') {
+        throw new Error('window._webmsxyw is not a function');
+    }
+    return items.map(([url, data]) => {
+        try {
+            const result = window._webmsxyw(url, data);
+            return {ok: true, 'x-s': result['X-s'], 'x-t': String(result['X-t'])};
+        } catch (e) {
+            return {ok: false, error: String(e)};
+        }
+    });
+}
+"""
+
+# 清空当前页面所在源的 localStorage 和 sessionStorage（备用上下文交给账号身份之前使用）
+CLEAR_STORAGE_JS = "() => { localStorage.clear(); sessionStorage.clear(); }"
+
+# 签名快速路径：每个页面只解析一次 window._webmsxyw 的远程对象句柄，
+# 之后通过 CDP Runtime.callFunctionOn 直接调用，参数预先序列化成一个 JSON 字符串，
+# 省去每次编译表达式和 Playwright 通用参数序列化的开销；页面跳转后自动重新解析
+SIGN_FAST_PATH = os.environ.get('SIGN_FAST_PATH', '1').lower() not in ('0', 'false', 'no')
+
+# 以签名函数为 this 调用；返回 JSON 字符串，由 Python 端一次解析
+FAST_SIGN_FN = """
+function (payload) {
+    const sign = this;
+    return JSON.stringify(JSON.parse(payload).map(([url, data]) => {
+        try {
+            const result = sign.call(window, url, data);
+            return {ok: true, 'x-s': result['X-s'], 'x-t': String(result['X-t'])};
+        } catch (e) {
+            return {ok: false, error: String(e)};
+        }
+    }));
+}
+"""
+
+# 签名重试策略
+SIGN_MAX_ATTEMPTS = int(os.environ.get('SIGN_MAX_ATTEMPTS', 10))  # 单个请求最多尝试次数
+SIGN_DEADLINE = float(os.environ.get('SIGN_DEADLINE', 8))  # 单个请求默认总耗时上限（秒），可用 X-Sign-Deadline 请求头覆盖
+SIGN_DEADLINE_MAX = float(os.environ.get('SIGN_DEADLINE_MAX', 30))  # 请求头允许设置的最大总耗时（秒）
+SIGN_RETRY_BACKOFF_BASE = float(os.environ.get('SIGN_RETRY_BACKOFF_BASE', 0.05))  # 重试退避基数（秒）
+SIGN_RETRY_BACKOFF_MAX = float(os.environ.get('SIGN_RETRY_BACKOFF_MAX', 1))  # 单次重试最长等待（秒）
+
+# 熔断器：连续失败后快速拒绝请求，后台只执行一次恢复
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', 5))  # 连续多少个请求失败后熔断
+BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', 10))  # 熔断后至少拒绝多久才开始探测（秒）
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get('BREAKER_HALF_OPEN_PROBES', 3))  # 半开状态下需要成功的探测请求数
+BREAKER_RECOVERY_TIMEOUT = float(os.environ.get('BREAKER_RECOVERY_TIMEOUT', 30))  # 恢复时每次金丝雀签名的超时（秒）
+
+# 后台初始化：请求处理过程中不会启动浏览器
+INIT_WAIT_TIMEOUT = float(os.environ.get('INIT_WAIT_TIMEOUT', 0))  # 初始化期间签名请求最多等待多久（秒），0 表示直接返回 503
+INIT_RETRY_INTERVAL = float(os.environ.get('INIT_RETRY_INTERVAL', 30))  # 初始化失败后多久重试（秒）
+
+# 浏览器身份持久化：初始化成功后保存 cookie 和 localStorage，下次启动直接恢复（相同的 a1，更快就绪）
+STORAGE_STATE_PATH = os.environ.get('STORAGE_STATE_PATH', 'storage_state.json')  # 为空表示不持久化
+
+# 静态资源磁盘缓存：签名页面的 JS/CSS 从本地缓存读取，定期向服务器重新验证
+ASSET_CACHE_DIR = os.environ.get('ASSET_CACHE_DIR', '')  # 缓存目录，为空表示不缓存
+ASSET_CACHE_REVALIDATE = float(os.environ.get('ASSET_CACHE_REVALIDATE', 3600))  # 缓存多久后向服务器重新验证（秒）
+ASSET_CACHE_TYPES = set(filter(None, os.environ.get('ASSET_CACHE_TYPES', 'script,stylesheet').split(',')))  # 缓存的资源类型
+# 与内容一起缓存并原样返回的响应头：crossorigin 脚本需要 CORS 头，否则浏览器拒绝执行
+ASSET_CACHE_HEADERS = (
+    'content-type',
+    'access-control-allow-origin',
+    'access-control-allow-credentials',
+    'access-control-expose-headers',
+    'timing-allow-origin',
+    'cross-origin-resource-policy',
+)
+
+# 签名页面资源拦截：签名只需要定义 window._webmsxyw 的脚本，图片、视频、字体和统计上报都直接拦截
+BLOCK_PROFILE = os.environ.get('BLOCK_PROFILE', 'safe')  # off / safe / aggressive
+BLOCK_URL_PATTERNS = list(filter(None, os.environ.get('BLOCK_URL_PATTERNS', '').split(',')))  # 额外拦截的 URL 片段
+BLOCK_VALIDATE = os.environ.get('BLOCK_VALIDATE', '').lower() in ('1', 'true', 'yes')  # 启动时对比拦截前后并验证签名
+
+# 各档位拦截的资源类型（Playwright resource_type）和 URL 片段
+BLOCK_PROFILES = {
+    'off': (set(), ()),
+    'safe': (
+        {'image', 'media', 'font', 'ping'},
+        ('google-analytics.com', 'googletagmanager.com', 'doubleclick.net')
+    ),
+    'aggressive': (
+        {'image', 'media', 'font', 'ping', 'stylesheet', 'texttrack', 'manifest', 'eventsource', 'websocket'},
+        ('google-analytics.com', 'googletagmanager.com', 'doubleclick.net',
+         't2.xiaohongshu.com', 'apm-fe.xiaohongshu.com', 'lng.xiaohongshu.com')
+    ),
+}
+if BLOCK_PROFILE not in BLOCK_PROFILES:
+    logger.warning(f"⚠️ 未知的 BLOCK_PROFILE: {BLOCK_PROFILE}，改用 safe")
+    BLOCK_PROFILE = 'safe'
+
+# 多账号身份：按请求中的 a1 把签名路由到带有调用方 cookie 的独立上下文
+IDENTITY_MAX_CONTEXTS = int(os.environ.get('IDENTITY_MAX_CONTEXTS', 0))  # 最多同时保留多少个账号身份，0 表示所有请求都使用服务自己的 a1
+IDENTITY_MAX_RSS_MB = float(os.environ.get('IDENTITY_MAX_RSS_MB', 0))  # 浏览器总内存超过多少 MB 时，新建身份前先淘汰最久未使用的身份，0 表示不限制
+IDENTITY_COOKIE_DOMAIN = '.xiaohongshu.com'
+
+# 预热备用上下文：后台保持若干个已经访问过首页、可以直接签名的上下文，
+# 新账号身份、页面崩溃恢复和页面池扩容直接领取，不用等待冷启动
+STANDBY_MIN = int(os.environ.get('STANDBY_MIN', 0))  # 最少保持多少个备用上下文
+STANDBY_MAX = int(os.environ.get('STANDBY_MAX', 0))  # 最多保持多少个备用上下文，0 表示不预热
+STANDBY_DEMAND_WINDOW = float(os.environ.get('STANDBY_DEMAND_WINDOW', 300))  # 按最近多少秒内的领取次数调整备用数量
+STANDBY_CHECK_INTERVAL = 5  # 备用上下文补充检查间隔（秒）
+
+# 离线替身签名页面：用磁盘上的页面代替小红书首页（通过请求拦截返回），不需要访问 xiaohongshu.com，用于压测和回归测试
+FAKE_SIGNER_DIR = os.environ.get('FAKE_SIGNER_DIR', '')  # 替身页面目录（例如 fixtures/fake_signer），为空表示使用真实首页
+FAKE_SIGNER_LATENCY_MS = float(os.environ.get('FAKE_SIGNER_LATENCY_MS', 0))  # 替身签名函数每次调用的模拟耗时（毫秒）
+FAKE_SIGNER_FAILURE_RATE = float(os.environ.get('FAKE_SIGNER_FAILURE_RATE', 0))  # 替身签名函数抛出异常的比例（0~1）
+
+# 页面就绪检测：访问首页后等待 a1 cookie 和签名函数就绪，而不是固定 sleep
+SIGN_READY_TIMEOUT = float(os.environ.get('SIGN_READY_TIMEOUT', 15))  # 等待页面就绪的超时（秒）
+SIGN_READY_POLL_INTERVAL = 0.05  # 轮询 a1 cookie 的间隔（秒）
+
+# 页面回收：页面用久了内存会持续增长并开始签名失败，后台定期用新页面无缝替换
+RECYCLE_AFTER_SIGNS = int(os.environ.get('RECYCLE_AFTER_SIGNS', 10000))  # 页面执行多少个签名任务后回收，0 表示不按次数回收
+RECYCLE_AFTER_MINUTES = float(os.environ.get('RECYCLE_AFTER_MINUTES', 120))  # 页面使用多久后回收（分钟），0 表示不按时间回收
+RECYCLE_RSS_MB = float(os.environ.get('RECYCLE_RSS_MB', 0))  # 浏览器进程总内存超过多少 MB 时回收最旧的页面，0 表示不按内存回收
+RECYCLE_CHECK_INTERVAL = float(os.environ.get('RECYCLE_CHECK_INTERVAL', 30))  # 回收检查间隔（秒）
+RECYCLE_TIMEOUT = float(os.environ.get('RECYCLE_TIMEOUT', 60))  # 新页面预热好之后，等待页面持有者切换过去的超时（秒）
+
+# 用于检查签名页面是否可用的金丝雀签名
+SIGN_CANARY_URI = "/api/sns/web/v1/user/selfinfo"
+
+# 出现这些错误说明页面本身坏了（签名函数丢失、页面跳转或关闭），重试前需要重新加载页面
+PAGE_BROKEN_ERRORS = (
+    '_webmsxyw is not a function',
+    'Execution context was destroyed',
+    'Cannot find context with specified id',
+    'navigat',
+    'Target closed',
+    'has been closed',
+)
+
+# 自动合并并发的单条 /sign 请求：在时间窗口内到达的请求合并成一次页面调用
+SIGN_COALESCE_WINDOW_MS = float(os.environ.get('SIGN_COALESCE_WINDOW_MS', 2))  # 合并窗口（毫秒），0 表示不等待
+SIGN_COALESCE_MAX_ITEMS = int(os.environ.get('SIGN_COALESCE_MAX_ITEMS', 32))  # 攒够这么多条立即发送
+
+# 签名缓存：相同 (uri, data) 在 x-t 仍然有效的时间内直接复用签名
+SIGN_CACHE_TTL = float(os.environ.get('SIGN_CACHE_TTL', 10))  # 签名从 x-t 时间起可复用的秒数，0 表示关闭缓存
+SIGN_CACHE_MAX_ENTRIES = int(os.environ.get('SIGN_CACHE_MAX_ENTRIES', 10000))  # 最多缓存条数
+SIGN_CACHE_MAX_BYTES = int(os.environ.get('SIGN_CACHE_MAX_BYTES', 16 * 1024 * 1024))  # 缓存占用内存上限（估算）
+
+# 流量录制：把脱敏后的 /sign 请求（到达时间、uri、data 的大小和结构、耗时、结果）追加写入 JSONL，供 replay_trace.py 回放
+TRACE_FILE = os.environ.get('TRACE_FILE', '')  # 录制文件路径，为空表示不录制
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 1))  # 录制的请求比例
+TRACE_QUEUE_MAX = int(os.environ.get('TRACE_QUEUE_MAX', 10000))  # 等待写入的最大条数，写入跟不上时丢弃并计数
+TRACE_SALT = os.environ.get('TRACE_SALT', '')  # 指纹的盐（由 supervisor.py 为所有 worker 生成同一个），为空表示每次启动随机生成
+
+# 多进程模式配置（由 supervisor.py 设置，单进程运行时为空）
+WORKER_ID = os.environ.get('WORKER_ID', '')  # 当前 worker 编号
+LISTEN_FD = os.environ.get('LISTEN_FD', '')  # supervisor 预先创建好的监听 socket
+SUPERVISOR_STATUS_DIR = os.environ.get('SUPERVISOR_STATUS_DIR', '')  # worker 状态文件目录
+
+# 每个 worker 有自己的浏览器和 a1，各自保存到独立的身份文件（storage_state.json → storage_state.worker-1.json）
+if WORKER_ID and STORAGE_STATE_PATH:
+    _state_root, _state_ext = os.path.splitext(STORAGE_STATE_PATH)
+    STORAGE_STATE_PATH = f"{_state_root}.worker-{WORKER_ID}{_state_ext}"
+
+# 全局变量
+playwright_instance = None
+browser_instance = None
+browser_context = None
+stealth_script_path = None  # 已下载的 stealth.min.js 路径，新建上下文时使用
+context_page = None  # 第一个签名页面（兼容旧逻辑，用于健康检查）
+global_a1 = ""  # 当前浏览器中的 a1 值
+init_timings = {}  # 最近一次初始化各阶段耗时（秒）
+init_mode = ''  # 最近一次初始化方式：warm（从保存的身份恢复）或 cold（全新身份）
+
+# 浏览器状态机：initializing → ready → degraded → recovering → ready
+browser_state = 'initializing'
+browser_state_changed_at = time.time()
+browser_state_reason = '服务启动'
+browser_ready_event = Event()  # 浏览器可以签名时置位
+init_lock = threading.Lock()  # 同一时间只允许一个初始化/重启
+init_greenlet = None  # 后台初始化的 greenlet
+pool_pages = []  # 所有已预热的签名页面
+page_workers = []  # 每个签名页面对应一个持有者 greenlet
+sign_jobs = queue.Queue(maxsize=PAGE_QUEUE_MAX)  # 等待执行的签名任务（有界队列）
+sign_fast_paths = {}  # 页面 → SignFastPath（无法使用快速路径的页面为 False）
+sign_job_seconds = 0.05  # 单个签名任务执行耗时的滑动平均（秒），用于估算 Retry-After
+page_job_waits = deque(maxlen=4096)  # 最近签名任务的排队等待时间（秒），供自动扩缩容使用
+page_job_runs = deque(maxlen=4096)  # 最近签名任务的执行耗时（秒）
+blocked_resource_types = set(BLOCK_PROFILES[BLOCK_PROFILE][0])  # 当前拦截的资源类型（验证失败时清空）
+blocked_url_patterns = list(BLOCK_PROFILES[BLOCK_PROFILE][1]) + BLOCK_URL_PATTERNS  # 当前拦截的 URL 片段
+block_stats = {'requests': 0, 'by_type': {}}
+block_report = None  # 最近一次拦截验证的结果
+
+
+class PagePoolBusy(Exception):
+    """签名页面繁忙（等待签名任务完成超时）"""
+
+
+class SignQueueFull(PagePoolBusy):
+    """签名任务队列已满，调用方应在 retry_after 秒后重试"""
+    
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SignDeadlineExceeded(Exception):
+    """签名请求超过了总耗时上限"""
+
+
+class BrowserNotReady(Exception):
+    """浏览器尚未就绪（初始化中或初始化失败），调用方应在 retry_after 秒后重试"""
+    
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def set_browser_state(state, reason):
+    """切换浏览器状态并记录原因"""
+    global browser_state, browser_state_changed_at, browser_state_reason
+    
+    if state == browser_state:
+        return
+    logger.info(f"浏览器状态变化: {browser_state} → {state}（{reason}）")
+    browser_state = state
+    browser_state_changed_at = time.time()
+    browser_state_reason = reason
+    write_worker_status()
+
+
+class CircuitOpen(Exception):
+    """熔断器已打开，签名后端正在恢复，调用方应在 retry_after 秒后重试"""
+    
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    签名后端熔断器
+    - closed：正常放行；连续 failure_threshold 个请求最终失败后转为 open
+    - open：直接拒绝新请求，后台只执行一次恢复；恢复成功且至少经过 open_seconds 后转为 half_open
+    - half_open：只放行 probes 个探测请求，全部成功转为 closed，任一失败重新 open
+    """
+    
+    def __init__(self, failure_threshold, open_seconds, probes, recover):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.recover = recover
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.recovery = None  # 正在执行恢复的 greenlet
+        self.recovery_ok = False
+        self.recoveries = 0
+        self.rejected = 0
+        self.transitions = deque(maxlen=20)
+    
+    def acquire(self):
+        """请求开始签名前调用，返回本次请求是否为探测请求；熔断中抛出 CircuitOpen"""
+        if self.state == 'open' and self.recovery is None and time.time() - self.opened_at >= self.open_seconds:
+            if self.recovery_ok:
+                self._transition('half_open', '恢复完成，开始探测')
+            else:
+                # 上一次恢复失败，再试一次
+                self._start_recovery()
+        
+        if self.state == 'closed':
+            return False
+        if self.state == 'half_open' and self.probes_in_flight < self.probes:
+            self.probes_in_flight += 1
+            return True
+        
+        self.rejected += 1
+        raise CircuitOpen("签名服务正在恢复中，请稍后重试", retry_after=self.retry_after())
+    
+    def record_success(self, probe):
+        if probe:
+            self.probes_in_flight -= 1
+            if self.state == 'half_open':
+                self.probe_successes += 1
+                if self.probe_successes >= self.probes:
+                    self._transition('closed', f'{self.probes} 个探测签名全部成功')
+            return
+        self.consecutive_failures = 0
+    
+    def record_failure(self, probe, reason):
+        if probe:
+            self.probes_in_flight -= 1
+            if self.state == 'half_open':
+                self._open(f'探测签名失败: {reason}')
+            return
+        if self.state != 'closed':
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self._open(f'连续 {self.consecutive_failures} 个请求签名失败: {reason}')
+    
+    def release(self, probe):
+        """请求既没有成功也不算后端故障（例如排队已满）时调用"""
+        if probe:
+            self.probes_in_flight -= 1
+    
+    def retry_after(self):
+        if self.state != 'open':
+            return 1
+        return max(1, math.ceil(self.opened_at + self.open_seconds - time.time()))
+    
+    def _transition(self, state, reason):
+        logger.warning(f"熔断器状态变化: {self.state} → {state}（{reason}）")
+        self.transitions.append({'from': self.state, 'to': state, 'reason': reason, 'at': time.time()})
+        self.state = state
+        if state == 'open':
+            set_browser_state('degraded', f'熔断: {reason}')
+        elif state == 'closed':
+            set_browser_state('ready', reason)
+    
+    def _open(self, reason):
+        self._transition('open', reason)
+        self.opened_at = time.time()
+        self.consecutive_failures = 0
+        self.probe_successes = 0
+        self._start_recovery()
+    
+    def _start_recovery(self):
+        if self.recovery is not None:
+            return
+        self.recovery_ok = False
+        self.recoveries += 1
+        self.recovery = gevent.spawn(self._run_recovery)
+    
+    def _run_recovery(self):
+        set_browser_state('recovering', '熔断后恢复签名后端')
+        try:
+            self.recover()
+            self.recovery_ok = True
+            logger.info("✅ 签名后端恢复完成，等待探测")
+        except Exception as e:
+            logger.error(f"❌ 签名后端恢复失败: {e}", exc_info=True)
+            set_browser_state('degraded', f'恢复失败: {e}')
+        finally:
+            self.recovery = None
+    
+    def status(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'failure_threshold': self.failure_threshold,
+            'retry_after': self.retry_after() if self.state == 'open' else 0,
+            'recovering': self.recovery is not None,
+            'recoveries': self.recoveries,
+            'rejected': self.rejected,
+            'transitions': list(self.transitions)
+        }
+
+
+def classify_sign_error(e):
+    """签名失败分类：page_broken 表示需要重新加载页面，transient 表示直接重试即可"""
+    error_msg = str(e)
+    if any(pattern in error_msg for pattern in PAGE_BROKEN_ERRORS):
+        return 'page_broken'
+    return 'transient'
+
+
+def retry_delay(attempt):
+    """第 attempt 次失败后的等待时间：第一次立即重试，之后指数退避并加随机抖动"""
+    if attempt <= 1:
+        return 0
+    return random.uniform(0, min(SIGN_RETRY_BACKOFF_MAX, SIGN_RETRY_BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+class Histogram:
+    """
+    Prometheus 风格的直方图：桶在创建时分配好，observe 只做一次二分查找和几次整数加法
+    gevent 下所有 greenlet 在同一个线程里运行，计数不需要加锁
+    """
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+    
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一格为 +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def render(self, name, labels=''):
+        """输出 _bucket / _sum / _count 样本行（桶为累计计数）"""
+        lines = []
+        cumulative = 0
+        prefix = f"{labels}," if labels else ''
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ''
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ATTEMPT_BUCKETS = (1, 2, 3, 5, 10)
+
+queue_wait_histogram = Histogram(LATENCY_BUCKETS)  # 签名任务从入队到被页面领取的等待时间（秒）
+evaluate_histogram = Histogram(LATENCY_BUCKETS)  # 签名任务在页面上的执行时间（秒）
+attempts_histogram = Histogram(ATTEMPT_BUCKETS)  # 单个签名请求的尝试次数
+request_histograms = {endpoint: Histogram(LATENCY_BUCKETS) for endpoint in ('sign', 'sign_batch')}  # 端到端耗时（秒）
+request_counts = {}  # (endpoint, HTTP 状态码) → 请求数
+
+
+class SignJob:
+    """一个需要在签名页面上执行的任务（private 表示只发给某一个 worker，不计入页面池负载统计）"""
+    __slots__ = ('fn', 'result', 'enqueued_at', 'cancelled', 'private')
+    
+    def __init__(self, fn, private=False):
+        self.fn = fn
+        self.result = AsyncResult()
+        self.enqueued_at = time.time()
+        self.cancelled = False
+        self.private = private
+
+
+class PageWorker:
+    """
+    签名页面的持有者
+    Playwright 同步 API 的对象不能被多个 greenlet 同时调用，
+    因此页面交给 worker 之后只由自己的 worker greenlet 操作，HTTP 请求只负责投递任务并等待结果；
+    还没有交给任何 worker 的页面（预热中的新页面、备用上下文）由创建它的 greenlet 独自操作
+    """
+    
+    def __init__(self, page, context=None, jobs=None):
+        self.page = page
+        self.context = context  # 页面独占的浏览器上下文（回收后才有），None 表示使用共享的 browser_context
+        self.jobs = jobs if jobs is not None else sign_jobs  # 从哪个队列领取任务（账号身份有自己的队列）
+        self.busy = False
+        self.jobs_done = 0
+        self.needs_reload = False
+        self.reloads = 0
+        self.created_at = time.time()  # 当前页面开始服务的时间
+        self.page_jobs = 0  # 当前页面执行过的任务数
+        self.recycles = 0
+        self.retiring = False  # 缩容时置位，当前任务完成后退出
+        self.inbox = deque()  # 只能由这个 worker 执行的任务（金丝雀检查、页面回收），优先于共享队列
+        self.greenlet = gevent.spawn(self.run)
+    
+    def next_job(self):
+        """优先取发给自己的任务；共享队列为空时每 WORKER_INBOX_POLL 秒检查一次 inbox"""
+        while not self.inbox:
+            try:
+                return self.jobs.get(timeout=WORKER_INBOX_POLL)
+            except queue.Empty:
+                continue
+        return self.inbox.popleft()
+    
+    def run(self):
+        global sign_job_seconds
+        
+        while True:
+            job = self.next_job()
+            if job.cancelled:
+                # 调用方已经等待超时放弃了，不再浪费页面
+                continue
+            
+            self.busy = True
+            started = time.time()
+            shared = not job.private and self.jobs is sign_jobs
+            # 发给自己的维护任务（金丝雀检查、页面回收）不计入签名任务的统计
+            if not job.private:
+                queue_wait_histogram.observe(started - job.enqueued_at)
+            if shared:
+                page_job_waits.append(started - job.enqueued_at)
+            try:
+                # 上一个任务发现页面坏了：所有失败的请求共享这一次重新加载
+                # 有预热好的备用上下文时直接换上，不用等待重新访问首页
+                if self.needs_reload:
+                    spare = standby_pool.claim('recovery') if self.jobs is sign_jobs else None
+                    if spare:
+                        self.swap(spare)
+                    else:
+                        self.reload()
+                job.result.set(job.fn(self.page))
+            except Exception as e:
+                if classify_sign_error(e) == 'page_broken':
+                    self.needs_reload = True
+                job.result.set_exception(e)
+            finally:
+                self.busy = False
+                if not job.private:
+                    self.jobs_done += 1
+                    self.page_jobs += 1
+                    elapsed = time.time() - started
+                    sign_job_seconds = sign_job_seconds * 0.9 + elapsed * 0.1
+                    evaluate_histogram.observe(elapsed)
+                    if shared:
+                        page_job_runs.append(elapsed)
+            
+            if self.retiring:
+                gevent.spawn(close_sign_page, self.page, self.context)
+                return
+    
+    def reload(self):
+        logger.warning("签名页面异常，正在重新加载...")
+        self.needs_reload = False
+        self.reloads += 1
+        load_sign_page(self.page)
+        logger.info("✅ 签名页面已重新加载")
+    
+    def swap(self, replacement):
+        """切换到预热好的新 (page, context)，旧页面在后台关闭；只在持有者自己的任务之间调用"""
+        global context_page
+        
+        old_page, old_context = self.page, self.context
+        self.page, self.context = replacement
+        self.needs_reload = False
+        self.created_at = time.time()
+        self.page_jobs = 0
+        self.recycles += 1
+        
+        if old_page in pool_pages:
+            pool_pages[pool_pages.index(old_page)] = self.page
+        if context_page is old_page:
+            context_page = self.page
+        gevent.spawn(close_sign_page, old_page, old_context)
+        logger.info("✅ 已切换到新的签名页面")
+    
+    def call(self, fn, timeout):
+        """在这个 worker 自己的页面上执行 fn(page)（不经过共享队列），worker 繁忙超时抛出 PagePoolBusy"""
+        job = SignJob(fn, private=True)
+        self.inbox.append(job)
+        try:
+            return job.result.get(timeout=timeout)
+        except gevent.Timeout:
+            job.cancelled = True
+            raise PagePoolBusy(f"等待页面持有者执行任务超时（{timeout} 秒）")
+    
+    def stop(self):
+        self.greenlet.kill(block=False)
+        while self.inbox:
+            self.inbox.popleft().result.set_exception(PagePoolBusy("签名页面已停止"))
+    
+    def retire(self):
+        """缩容：空闲时立即停止，正在执行任务时等任务完成后退出，然后关闭页面"""
+        if self.busy:
+            self.retiring = True
+        else:
+            self.stop()
+            gevent.spawn(close_sign_page, self.page, self.context)
+
+
+class SignCache:
+    """
+    带过期时间的 LRU 签名缓存
+    过期时间从签名的 x-t 起算，超过条数或内存上限时淘汰最久未使用的条目
+    """
+    
+    def __init__(self, ttl, max_entries, max_bytes):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (result, expires_at, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+    
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+    
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        result, expires_at, size = entry
+        if time.time() >= expires_at:
+            self._remove(key)
+            self.expired += 1
+            self.misses += 1
+            return None
+        
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+    
+    def put(self, key, result):
+        try:
+            signed_at = int(result['x-t']) / 1000
+        except (KeyError, TypeError, ValueError):
+            signed_at = time.time()
+        expires_at = signed_at + self.ttl
+        if expires_at <= time.time():
+            return
+        
+        # 粗略估算条目占用的内存：key + 签名字符串 + 固定开销
+        size = len(key) + len(result['x-s']) + len(result['x-t']) + 200
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (result, expires_at, size)
+        self.bytes += size
+        
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+    
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.bytes -= size
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'ttl_seconds': self.ttl,
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+            'evictions': self.evictions,
+            'expired': self.expired
+        }
+
+
+class AssetCache:
+    """
+    内容寻址的静态资源磁盘缓存
+    - objects/<sha256>：资源内容，相同内容只存一份
+    - index.json：URL → {sha256, headers, etag, fetched_at}，headers 只保留 ASSET_CACHE_HEADERS
+    多进程模式下各 worker 共用同一个目录：写索引时在文件锁内先合并磁盘上其他 worker 写入的条目，
+    本地找不到某个 URL 时也会重新读取有变化的索引
+    """
+    
+    def __init__(self, directory, revalidate_seconds):
+        self.directory = directory
+        self.revalidate_seconds = revalidate_seconds
+        self.index = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stale_served = 0
+        self.bytes_served = 0
+        self.index_mtime = None  # 上次读取或写入时 index.json 的修改时间
+        if directory:
+            os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+            self.index = self.read_index()
+    
+    @property
+    def enabled(self):
+        return bool(self.directory)
+    
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, 'index.json')
+    
+    def read_index(self):
+        """读取磁盘上的索引，文件不存在或损坏时返回空索引"""
+        try:
+            self.index_mtime = os.stat(self.index_path).st_mtime_ns
+            with open(self.index_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def merge(self, other):
+        """合并另一份索引：同一个 URL 保留最近获取或验证过的条目"""
+        for url, entry in other.items():
+            mine = self.index.get(url)
+            if mine is None or entry.get('fetched_at', 0) > mine.get('fetched_at', 0):
+                self.index[url] = entry
+    
+    def refresh(self):
+        """其他 worker 更新过索引时合并进来"""
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self.index_mtime:
+            self.merge(self.read_index())
+    
+    def lookup(self, url):
+        """返回 (entry, body, fresh)，没有缓存时返回 (None, None, False)"""
+        entry = self.index.get(url)
+        if entry is None:
+            self.refresh()
+            entry = self.index.get(url)
+        if entry is None:
+            return None, None, False
+        try:
+            with open(os.path.join(self.directory, 'objects', entry['sha256']), 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None, None, False
+        fresh = time.time() - entry['fetched_at'] < self.revalidate_seconds
+        return entry, body, fresh
+    
+    @staticmethod
+    def response_headers(entry):
+        """返回给浏览器的响应头（旧版本的索引只记录了 content_type）"""
+        return entry.get('headers') or {'content-type': entry.get('content_type', 'application/octet-stream')}
+    
+    def store(self, url, body, headers, etag=None):
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = os.path.join(self.directory, 'objects', digest)
+        if not os.path.exists(object_path):
+            # 多进程模式下所有 worker 共用缓存目录，临时文件名带上进程号，避免互相覆盖
+            tmp_path = f"{object_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, object_path)
+        self.index[url] = {
+            'sha256': digest,
+            'headers': {name: value for name, value in headers.items() if name.lower() in ASSET_CACHE_HEADERS},
+            'etag': etag,
+            'fetched_at': time.time()
+        }
+        self.save_index()
+    
+    def touch(self, url):
+        """服务器确认内容未变化（304），刷新验证时间"""
+        self.index[url]['fetched_at'] = time.time()
+        self.save_index()
+    
+    def save_index(self):
+        """在文件锁内合并磁盘上的索引再整体替换，不会覆盖掉其他 worker 刚写入的条目"""
+        with open(f"{self.index_path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.merge(self.read_index())
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+            self.index_mtime = os.stat(self.index_path).st_mtime_ns
+    
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'entries': len(self.index),
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'stale_served': self.stale_served,
+            'bytes_served': self.bytes_served
+        }
+
+
+def blocking_enabled():
+    return bool(blocked_resource_types or blocked_url_patterns)
+
+
+def should_block(request):
+    if request.resource_type in blocked_resource_types:
+        return True
+    url = request.url
+    return any(pattern in url for pattern in blocked_url_patterns)
+
+
+def fake_signer_page():
+    """读取替身页面并填入模拟耗时和失败率"""
+    with open(os.path.join(FAKE_SIGNER_DIR, 'index.html'), encoding='utf-8') as f:
+        html = f.read()
+    return (html
+            .replace('__FAKE_SIGNER_LATENCY_MS__', f'{FAKE_SIGNER_LATENCY_MS:g}')
+            .replace('__FAKE_SIGNER_FAILURE_RATE__', f'{FAKE_SIGNER_FAILURE_RATE:g}'))
+
+
+def handle_fake_signer_route(route):
+    """离线模式：小红书首页返回替身页面，其余请求全部中止，不产生任何外部网络访问"""
+    request = route.request
+    if request.resource_type == 'document' and 'xiaohongshu.com' in request.url:
+        route.fulfill(status=200, content_type='text/html; charset=utf-8', body=fake_signer_page())
+    else:
+        route.abort('blockedbyclient')
+
+
+def handle_context_route(route, block=True):
+    """浏览器上下文的请求拦截入口：先按拦截档位丢弃无用资源，再走静态资源缓存"""
+    if FAKE_SIGNER_DIR:
+        handle_fake_signer_route(route)
+        return
+    request = route.request
+    if block and should_block(request):
+        block_stats['requests'] += 1
+        by_type = block_stats['by_type']
+        by_type[request.resource_type] = by_type.get(request.resource_type, 0) + 1
+        route.abort('blockedbyclient')
+        return
+    if asset_cache.enabled:
+        handle_asset_route(route)
+    else:
+        route.fallback()
+
+
+def handle_asset_route(route):
+    """
+    浏览器上下文的请求拦截：JS/CSS 优先从磁盘缓存返回
+    缓存过期时带上 If-None-Match 向服务器重新验证，网络失败时继续使用旧缓存
+    """
+    request = route.request
+    if request.method != 'GET' or request.resource_type not in ASSET_CACHE_TYPES:
+        route.fallback()
+        return
+    
+    url = request.url
+    entry, body, fresh = asset_cache.lookup(url)
+    if entry and fresh:
+        asset_cache.hits += 1
+        asset_cache.bytes_served += len(body)
+        route.fulfill(status=200, headers=asset_cache.response_headers(entry), body=body)
+        return
+    
+    headers = dict(request.headers)
+    if entry and entry.get('etag'):
+        headers['if-none-match'] = entry['etag']
+    try:
+        response = route.fetch(headers=headers)
+    except Exception as e:
+        if entry is None:
+            # 没有缓存可用：让这个请求失败，而不是把异常抛出拦截函数、让请求一直挂着
+            logger.warning(f"获取静态资源失败: {url} ({e})")
+            route.abort('failed')
+            return
+        logger.warning(f"重新验证静态资源失败，继续使用缓存: {url} ({e})")
+        asset_cache.stale_served += 1
+        route.fulfill(status=200, headers=asset_cache.response_headers(entry), body=body)
+        return
+    
+    if entry and response.status == 304:
+        asset_cache.revalidated += 1
+        try:
+            asset_cache.touch(url)
+        except OSError as e:
+            logger.warning(f"更新静态资源缓存索引失败（忽略）: {e}")
+        route.fulfill(status=200, headers=asset_cache.response_headers(entry), body=body)
+        return
+    
+    asset_cache.misses += 1
+    fetched = response.body()
+    if response.ok:
+        # 写缓存失败（磁盘满、权限等）不能让请求挂着：照常把响应交给浏览器
+        try:
+            asset_cache.store(url, fetched, response.headers, response.headers.get('etag'))
+        except OSError as e:
+            logger.warning(f"写入静态资源缓存失败（忽略）: {url} ({e})")
+    route.fulfill(response=response, body=fetched)
+
+
+def identity_cookies(a1, web_session, web_id):
+    """调用方身份对应的 cookie 列表（空值不设置）"""
+    values = {'a1': a1, 'web_session': web_session, 'webId': web_id}
+    return [
+        {'name': name, 'value': value, 'domain': IDENTITY_COOKIE_DOMAIN, 'path': '/'}
+        for name, value in values.items() if value
+    ]
+
+
+class IdentityContext:
+    """一个账号身份：独立的浏览器上下文和签名页面，由自己的持有者 worker 和任务队列服务"""
+    
+    def __init__(self, a1, web_session, web_id, spare=None):
+        self.a1 = a1
+        self.web_session = web_session
+        self.web_id = web_id
+        self.jobs = queue.Queue(maxsize=PAGE_QUEUE_MAX)
+        if spare is not None:
+            # 领取到预热好的备用上下文：它复制的是服务自己的 cookie 和 localStorage，全部清掉并换上调用方的 cookie，
+            # 再重新访问首页，让页面在调用方的 a1 下初始化（省下的是新建上下文和加载反检测脚本的时间）
+            page, self.context = spare
+            try:
+                page.evaluate(CLEAR_STORAGE_JS)
+                self.context.clear_cookies()
+                self.context.add_cookies(identity_cookies(a1, web_session, web_id))
+                load_sign_page(page)
+            except Exception:
+                self.context.close()
+                raise
+        else:
+            self.context = new_browser_context()
+            try:
+                self.context.add_cookies(identity_cookies(a1, web_session, web_id))
+                page = self.context.new_page()
+                load_sign_page(page)
+            except Exception:
+                self.context.close()
+                raise
+        self.worker = PageWorker(page, self.context, jobs=self.jobs)
+        self.applied_cookies = (web_session, web_id)  # 上下文里实际设置的 web_session / web_id
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.signs = 0
+        self.users = 0  # 已经交给请求、还没用完的次数，大于 0 时不能淘汰
+    
+    @property
+    def idle(self):
+        return self.users == 0 and not self.worker.busy and self.jobs.empty()
+    
+    def update_cookies(self, web_session, web_id):
+        """记录调用方最新的 web_session / web_id，等下一次真正签名时再由页面持有者写入上下文（命中缓存时不占用页面）"""
+        self.web_session, self.web_id = web_session, web_id
+    
+    def sync_cookies(self, page):
+        """在页面持有者中执行：cookie 与上下文里的不同时才更新"""
+        wanted = (self.web_session, self.web_id)
+        if wanted != self.applied_cookies:
+            page.context.add_cookies(identity_cookies(self.a1, *wanted))
+            self.applied_cookies = wanted
+    
+    def close(self, close_page=True):
+        """停止 worker，排队中的任务直接失败；浏览器已经关闭时 close_page=False"""
+        self.worker.stop()
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            job.result.set_exception(PagePoolBusy("账号身份上下文已被淘汰"))
+        if close_page:
+            gevent.spawn(close_sign_page, self.worker.page, self.context)
+
+
+class PendingIdentity:
+    """正在创建的账号身份：创建结果和等待它的请求数"""
+    __slots__ = ('result', 'waiters')
+    
+    def __init__(self):
+        self.result = AsyncResult()
+        self.waiters = 0
+
+
+class IdentityPool:
+    """
+    按 a1 索引的账号身份上下文池
+    - 第一次遇到某个 a1 时才创建上下文，同一个 a1 的并发请求共享这一次创建
+    - 达到数量上限或内存上限时，淘汰最久未使用且空闲的身份；正在创建的身份同样占用名额
+    - get() 交出的身份在 release() 之前不会被淘汰
+    """
+    
+    def __init__(self, max_contexts, max_rss_mb):
+        self.max_contexts = max_contexts
+        self.max_rss_mb = max_rss_mb
+        self.contexts = OrderedDict()  # a1 → IdentityContext，按最近使用排序
+        self.creating = {}  # a1 → PendingIdentity，正在创建的身份
+        self.hits = 0
+        self.created = 0
+        self.evicted = 0
+    
+    @property
+    def enabled(self):
+        return self.max_contexts > 0
+    
+    def get(self, a1, web_session, web_id, deadline):
+        """返回 a1 对应的身份并占用它，调用方用完后必须 release()"""
+        identity = self.contexts.get(a1)
+        if identity is not None:
+            self.contexts.move_to_end(a1)
+            self.hits += 1
+            identity.users += 1
+            identity.last_used = time.time()
+            identity.update_cookies(web_session, web_id)
+            return identity
+        
+        pending = self.creating.get(a1)
+        if pending is None:
+            # 先同步腾出名额再登记，并发的首次请求不会一起越过上限
+            self.make_room()
+            # 在后台创建：请求最多等到自己的截止时间，超时后创建继续进行，之后的请求可以直接使用
+            pending = PendingIdentity()
+            self.creating[a1] = pending
+            gevent.spawn(self.create, a1, web_session, web_id, pending)
+        
+        # 创建完成时 create() 已经替每个等待者占用了这个身份，中间不会被淘汰
+        pending.waiters += 1
+        try:
+            return pending.result.get(timeout=max(0, deadline - time.time()))
+        except gevent.Timeout:
+            if pending.result.successful():
+                self.release(pending.result.value)
+            else:
+                pending.waiters -= 1
+            raise SignDeadlineExceeded("等待账号身份上下文创建超时")
+    
+    def release(self, identity):
+        identity.users -= 1
+    
+    def create(self, a1, web_session, web_id, pending):
+        """后台创建一个身份，结果（或异常）交给所有等待它的请求"""
+        try:
+            logger.info(f"正在为 a1={a1[:20]}... 创建账号身份上下文")
+            identity = IdentityContext(a1, web_session, web_id, standby_pool.claim('identity'))
+            identity.users = pending.waiters
+            self.contexts[a1] = identity
+            self.created += 1
+            pending.result.set(identity)
+            logger.info(f"✅ 账号身份上下文已就绪（当前 {len(self.contexts)} 个）")
+        except Exception as e:
+            logger.warning(f"⚠️ 创建账号身份上下文失败 a1={a1[:20]}...: {e}")
+            pending.result.set_exception(e)
+        finally:
+            del self.creating[a1]
+            if not pending.result.ready():
+                pending.result.set_exception(PagePoolBusy("账号身份上下文的创建被中断"))
+    
+    def make_room(self):
+        """
+        新建身份前按数量和内存上限淘汰，正在创建的身份同样占用名额；没有空闲的身份可以淘汰时抛出 PagePoolBusy
+        内存不会立即回落，每次最多因内存淘汰一个
+        """
+        over_memory = bool(self.max_rss_mb) and (browser_rss_mb() or 0) >= self.max_rss_mb
+        while len(self.contexts) + len(self.creating) >= self.max_contexts or (over_memory and self.contexts):
+            victim = next((identity for identity in self.contexts.values() if identity.idle), None)
+            if victim is None:
+                raise PagePoolBusy(f"所有账号身份上下文都在使用或创建中（{len(self.contexts) + len(self.creating)} 个）")
+            self.evict(victim.a1, '内存超过上限' if over_memory else '数量达到上限')
+            over_memory = False
+    
+    def evict(self, a1, reason):
+        identity = self.contexts.pop(a1)
+        identity.close()
+        self.evicted += 1
+        logger.info(f"淘汰账号身份上下文 a1={a1[:20]}...（{reason}）")
+    
+    def clear(self):
+        """浏览器重启时丢弃所有身份（上下文已随浏览器关闭）"""
+        for identity in self.contexts.values():
+            identity.close(close_page=False)
+        self.contexts.clear()
+    
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'contexts': len(self.contexts),
+            'max_contexts': self.max_contexts,
+            'busy': sum(1 for identity in self.contexts.values() if not identity.idle),
+            'hits': self.hits,
+            'created': self.created,
+            'evicted': self.evicted
+        }
+
+
+class StandbyPool:
+    """
+    预热好的备用上下文（每个都是 create_sign_context() 创建的 (page, context)）
+    领取是即时的，后台 warmer 异步补充；目标数量取最近 STANDBY_DEMAND_WINDOW 秒内的领取次数，
+    限制在 [min_size, max_size] 之间，需求下降后多余的备用上下文会被关闭
+    """
+    
+    def __init__(self, min_size, max_size, demand_window):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.demand_window = demand_window
+        self.spares = deque()
+        self.claim_times = deque()
+        self.wakeup = Event()
+        self.claims = {}  # 领取用途 → 次数
+        self.misses = 0
+        self.warmed = 0
+        self.failures = 0
+    
+    @property
+    def enabled(self):
+        return self.max_size > 0
+    
+    def target(self):
+        cutoff = time.time() - self.demand_window
+        while self.claim_times and self.claim_times[0] < cutoff:
+            self.claim_times.popleft()
+        return max(self.min_size, min(self.max_size, len(self.claim_times)))
+    
+    def claim(self, purpose):
+        """领取一个备用上下文，返回 (page, context)，没有可用的时返回 None"""
+        if not self.enabled:
+            return None
+        self.claim_times.append(time.time())
+        self.wakeup.set()
+        if not self.spares:
+            self.misses += 1
+            return None
+        self.claims[purpose] = self.claims.get(purpose, 0) + 1
+        logger.info(f"✅ 领取备用上下文（{purpose}），剩余 {len(self.spares) - 1} 个")
+        return self.spares.popleft()
+    
+    def run(self):
+        """后台 warmer：按目标数量补充或关闭备用上下文"""
+        while True:
+            if context_page is not None:
+                self.replenish()
+            self.wakeup.wait(timeout=STANDBY_CHECK_INTERVAL)
+            self.wakeup.clear()
+    
+    def replenish(self):
+        """备用上下文在被领取之前不属于任何 worker，由 warmer 自己创建、检查和关闭"""
+        target = self.target()
+        while len(self.spares) > target:
+            gevent.spawn(close_sign_page, *self.spares.pop())
+        # 一个一个预热，避免同时创建多个页面造成内存尖峰
+        while len(self.spares) < target:
+            try:
+                page, context = create_sign_context()
+                check_sign_page(page)
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"预热备用上下文失败: {e}")
+                return
+            self.spares.append((page, context))
+            self.warmed += 1
+            logger.info(f"✅ 备用上下文已预热（{len(self.spares)}/{target}）")
+    
+    def clear(self):
+        """浏览器重启时丢弃所有备用上下文（已随浏览器关闭）"""
+        self.spares.clear()
+    
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'ready': len(self.spares),
+            'target': self.target() if self.enabled else 0,
+            'min': self.min_size,
+            'max': self.max_size,
+            'claims': self.claims,
+            'misses': self.misses,
+            'warmed': self.warmed,
+            'failures': self.failures
+        }
+
+
+def percentile(values, pct):
+    """分位数（最近秩法），values 为空时返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(math.ceil(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def host_mem_available_mb():
+    """主机可用内存（MB，读取 /proc/meminfo），无法读取时返回 None"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class Autoscaler:
+    """
+    共享页面池的自动扩缩容
+    每 AUTOSCALE_INTERVAL 秒根据这段时间的排队等待 p95、页面执行耗时 p95、页面利用率和主机可用内存决定：
+    - 扩容：排队等待 p95 > AUTOSCALE_UP_WAIT_MS 连续 AUTOSCALE_UP_INTERVALS 次，且执行耗时没有饱和、内存充足
+    - 缩容：排队等待 p95 < AUTOSCALE_DOWN_WAIT_MS 且利用率低连续 AUTOSCALE_DOWN_INTERVALS 次，或内存不足
+    扩容和缩容使用不同的阈值和连续次数，每次调整后有冷却时间，避免来回抖动
+    """
+    
+    def __init__(self, min_size, max_size):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.up_streak = 0
+        self.down_streak = 0
+        self.last_scaled_at = 0.0
+        self.last_metrics = {}
+        self.decisions = deque(maxlen=50)
+    
+    @property
+    def enabled(self):
+        return self.max_size > self.min_size
+    
+    def run(self):
+        while True:
+            time.sleep(AUTOSCALE_INTERVAL)
+            if context_page is None or sign_breaker.state != 'closed':
+                continue
+            try:
+                self.evaluate()
+            except Exception as e:
+                logger.warning(f"自动扩缩容失败: {e}")
+    
+    def collect(self):
+        """取出上一个检查周期内的签名任务统计"""
+        waits = [page_job_waits.popleft() for _ in range(len(page_job_waits))]
+        runs = [page_job_runs.popleft() for _ in range(len(page_job_runs))]
+        size = len(page_workers)
+        return {
+            'pages': size,
+            'jobs': len(runs),
+            'queued': sign_jobs.qsize(),
+            'queue_wait_p95_ms': round(percentile(waits, 95) * 1000, 2),
+            'evaluate_p95_ms': round(percentile(runs, 95) * 1000, 2),
+            'utilization': round(sum(runs) / (AUTOSCALE_INTERVAL * size), 3) if size else 0,
+            'mem_available_mb': host_mem_available_mb()
+        }
+    
+    def evaluate(self):
+        metrics = self.collect()
+        self.last_metrics = metrics
+        size = metrics['pages']
+        mem = metrics['mem_available_mb']
+        low_memory = mem is not None and mem < AUTOSCALE_MIN_FREE_MB
+        
+        wants_up = (
+            metrics['queue_wait_p95_ms'] > AUTOSCALE_UP_WAIT_MS
+            and metrics['evaluate_p95_ms'] <= AUTOSCALE_MAX_EVAL_P95_MS
+            and not low_memory
+        )
+        wants_down = (
+            metrics['queue_wait_p95_ms'] < AUTOSCALE_DOWN_WAIT_MS
+            and metrics['utilization'] < AUTOSCALE_DOWN_UTILIZATION
+        )
+        self.up_streak = self.up_streak + 1 if wants_up else 0
+        self.down_streak = self.down_streak + 1 if wants_down else 0
+        
+        if time.time() - self.last_scaled_at < AUTOSCALE_COOLDOWN:
+            return
+        if low_memory and size > self.min_size:
+            self.scale_down(metrics, f"主机可用内存 {mem:.0f} MB 低于 {AUTOSCALE_MIN_FREE_MB:.0f} MB")
+        elif self.up_streak >= AUTOSCALE_UP_INTERVALS and size < self.max_size:
+            self.scale_up(metrics, f"排队等待 p95 {metrics['queue_wait_p95_ms']:.0f} ms 超过 {AUTOSCALE_UP_WAIT_MS:.0f} ms")
+        elif self.down_streak >= AUTOSCALE_DOWN_INTERVALS and size > self.min_size:
+            self.scale_down(metrics, f"排队等待 p95 {metrics['queue_wait_p95_ms']:.0f} ms，利用率 {metrics['utilization']:.0%}")
+    
+    def scale_up(self, metrics, reason):
+        """新页面在交给新的 PageWorker 之前由扩缩容 greenlet 预热和检查，不会操作已有 worker 的页面"""
+        spare = standby_pool.claim('scale_up')
+        if spare:
+            page, context = spare
+        else:
+            page, context = create_sign_context()
+            try:
+                check_sign_page(page)
+            except Exception:
+                close_sign_page(page, context)
+                raise
+        page_workers.append(PageWorker(page, context))
+        pool_pages.append(page)
+        self.record('scale_up', len(page_workers) - 1, len(page_workers), reason, metrics)
+    
+    def scale_down(self, metrics, reason):
+        # 保留第一个页面（健康检查使用），移除最新加入的页面
+        candidates = [worker for worker in page_workers if worker.page is not context_page]
+        if not candidates:
+            return
+        worker = max(candidates, key=lambda w: w.created_at)
+        page_workers.remove(worker)
+        if worker.page in pool_pages:
+            pool_pages.remove(worker.page)
+        worker.retire()
+        self.record('scale_down', len(page_workers) + 1, len(page_workers), reason, metrics)
+    
+    def record(self, action, before, after, reason, metrics):
+        self.last_scaled_at = time.time()
+        self.up_streak = 0
+        self.down_streak = 0
+        self.decisions.append({
+            'time': self.last_scaled_at,
+            'action': action,
+            'from': before,
+            'to': after,
+            'reason': reason,
+            'metrics': metrics
+        })
+        logger.info(f"📈 页面池{'扩容' if action == 'scale_up' else '缩容'} {before} → {after}（{reason}），指标: {metrics}")
+    
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'min': self.min_size,
+            'max': self.max_size,
+            'pages': len(page_workers),
+            'up_streak': self.up_streak,
+            'down_streak': self.down_streak,
+            'last_metrics': self.last_metrics,
+            'decisions': list(self.decisions)
+        }
+
+
+class SignFastPath:
+    """
+    一个签名页面的 CDP 快速路径
+    句柄在第一次签名时解析，主框架跳转（包括重新加载页面）时作废，下次签名重新解析
+    """
+    
+    # 句柄已经失效（页面跳转后的旧执行上下文）
+    STALE_ERRORS = (
+        'Cannot find context with specified id',
+        'Could not find object with given id',
+        'Execution context was destroyed',
+    )
+    
+    def __init__(self, page):
+        self.page = page
+        self.cdp = page.context.new_cdp_session(page)
+        self.object_id = None
+        self.resolves = 0
+        page.on('framenavigated', self.on_navigated)
+    
+    def on_navigated(self, frame):
+        if frame == self.page.main_frame:
+            self.object_id = None
+    
+    def resolve(self):
+        response = self.cdp.send('Runtime.evaluate', {'expression': 'window._webmsxyw', 'objectGroup': 'xhs-sign'})
+        remote = response['result']
+        if remote.get('type') != 'function':
+            raise Exception('window._webmsxyw is not a function')
+        self.object_id = remote['objectId']
+        self.resolves += 1
+    
+    def call(self, payload):
+        """签名 payload 中的所有 [uri, data]，返回值与 BATCH_SIGN_JS 相同"""
+        if self.object_id is None:
+            self.resolve()
+        arguments = [{'value': json.dumps(payload, ensure_ascii=False)}]
+        try:
+            response = self.invoke(arguments)
+        except Exception as e:
+            if not any(marker in str(e) for marker in self.STALE_ERRORS):
+                raise
+            # 跳转事件还没到达时句柄就已失效：重新解析一次再调用
+            self.resolve()
+            response = self.invoke(arguments)
+        
+        if 'exceptionDetails' in response:
+            details = response['exceptionDetails']
+            raise Exception(details.get('exception', {}).get('description') or details.get('text', 'unknown error'))
+        return json.loads(response['result']['value'])
+    
+    def invoke(self, arguments):
+        return self.cdp.send('Runtime.callFunctionOn', {
+            'objectId': self.object_id,
+            'functionDeclaration': FAST_SIGN_FN,
+            'arguments': arguments,
+            'returnByValue': True
+        })
+
+
+def sign_on_page(page, payload):
+    """在页面上签名一批 [uri, data]：优先走 CDP 快速路径，不可用时回退到 page.evaluate"""
+    if SIGN_FAST_PATH:
+        fast = sign_fast_paths.get(page)
+        if fast is None:
+            try:
+                fast = SignFastPath(page)
+            except Exception as e:
+                logger.warning(f"⚠️ 无法创建签名快速路径，改用 page.evaluate: {e}")
+                fast = False
+            sign_fast_paths[page] = fast
+        if fast:
+            return fast.call(payload)
+    return page.evaluate(BATCH_SIGN_JS, payload)
+
+
+def data_shape(value, depth=0):
+    """
+    data 的脱敏结构：保留 key、类型、字符串长度和列表长度，不保留任何值
+    嵌套过深的部分只记录序列化后的字节数
+    """
+    if value is None or isinstance(value, bool):
+        return None if value is None else 'bool'
+    if isinstance(value, (int, float)):
+        return 'int' if isinstance(value, int) else 'float'
+    if isinstance(value, str):
+        return f'str:{len(value)}'
+    if depth >= 6:
+        return f"json:{len(json.dumps(value, ensure_ascii=False).encode('utf-8'))}"
+    if isinstance(value, list):
+        return {'list': len(value), 'item': data_shape(value[0], depth + 1) if value else None}
+    if isinstance(value, dict):
+        return {'dict': {str(key): data_shape(item, depth + 1) for key, item in value.items()}}
+    return f'str:{len(str(value))}'
+
+
+class TraceRecorder:
+    """
+    /sign 流量录制
+    请求处理时只把原始数据放进有界队列，脱敏、序列化和写文件都在一个真正的 OS 线程里完成（与 AsyncLogHandler 相同）
+    uri 只保留路径和查询参数名；data 和查询参数值只记录加盐指纹：盐相同时相同的值指纹相同（回放时可以复现缓存命中），
+    但无法反推原始值。每行用一次 O_APPEND 的 os.write 写入，多个 worker 写同一个文件时行不会交错
+    """
+    
+    def __init__(self, path, salt='', max_queued=10000):
+        self.path = path
+        self.salt = salt.encode('utf-8') if salt else os.urandom(16)
+        self.max_queued = max_queued
+        self.recorded = 0
+        self.errors = 0
+        self.dropped = 0
+        self.alive = False
+        self.last_error = None
+        self.failure_logged = False
+        if path:
+            self.alive = True
+            self.queue = monkey.get_original('queue', 'SimpleQueue')()
+            monkey.get_original('_thread', 'start_new_thread')(self.run, ())
+    
+    @property
+    def enabled(self):
+        return bool(self.path)
+    
+    def record(self, arrived_at, payload, no_cache, status, latency):
+        if not self.alive:
+            self.dropped += 1
+            if not self.failure_logged:
+                self.failure_logged = True
+                logger.error(f"❌ 流量录制线程已停止，后续请求不再录制: {self.last_error}")
+            return
+        if self.queue.qsize() >= self.max_queued:
+            self.dropped += 1
+            return
+        self.queue.put((arrived_at, payload, no_cache, status, latency))
+    
+    def run(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        except BaseException as e:
+            self.last_error = f"无法打开录制文件: {e}"
+            self.alive = False
+            return
+        try:
+            while True:
+                item = self.queue.get()
+                try:
+                    line = (json.dumps(self.build(*item), ensure_ascii=False) + "\n").encode('utf-8')
+                    os.write(fd, line)
+                    self.recorded += 1
+                except Exception as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+        except BaseException as e:
+            self.last_error = f"录制线程退出: {e!r}"
+        finally:
+            self.alive = False
+            os.close(fd)
+    
+    def fingerprint(self, value):
+        return hashlib.sha256(self.salt + value).hexdigest()[:16]
+    
+    def build(self, arrived_at, payload, no_cache, status, latency):
+        data = payload.get('data')
+        canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        uri = urlsplit(str(payload.get('uri', '')))
+        entry = {
+            'ts': round(arrived_at, 6),
+            'uri': uri.path,
+            'data_bytes': len(canonical),
+            'data_shape': data_shape(data),
+            'data_fp': self.fingerprint(canonical),
+            'no_cache': no_cache,
+            'status': status,
+            'outcome': 'ok' if status == 200 else f'http_{status}',
+            'latency_ms': round(latency * 1000, 3)
+        }
+        if uri.query:
+            entry['query_keys'] = [key for key, _ in parse_qsl(uri.query, keep_blank_values=True)]
+            entry['query_fp'] = self.fingerprint(uri.query.encode('utf-8'))
+        return entry
+    
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'file': self.path,
+            'writer_alive': self.alive,
+            'last_error': self.last_error,
+            'queued': self.queue.qsize() if self.enabled else 0,
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'errors': self.errors
+        }
+
+
+def sign_cache_key(uri, data, identity=''):
+    """缓存 key：uri + data 规范化 JSON（key 排序、紧凑格式）的哈希，账号身份的签名额外带上 a1"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    key = f"{uri}#{hashlib.sha1(canonical.encode('utf-8')).hexdigest()}"
+    return f"{identity}@{key}" if identity else key
+
+
+sign_cache = SignCache(SIGN_CACHE_TTL, SIGN_CACHE_MAX_ENTRIES, SIGN_CACHE_MAX_BYTES)
+asset_cache = AssetCache(ASSET_CACHE_DIR, ASSET_CACHE_REVALIDATE)
+trace_recorder = TraceRecorder(TRACE_FILE, TRACE_SALT, TRACE_QUEUE_MAX)
+identity_pool = IdentityPool(IDENTITY_MAX_CONTEXTS, IDENTITY_MAX_RSS_MB)
+standby_pool = StandbyPool(STANDBY_MIN, STANDBY_MAX, STANDBY_DEMAND_WINDOW)
+autoscaler = Autoscaler(POOL_MIN, POOL_MAX)
+sign_breaker = CircuitBreaker(
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_HALF_OPEN_PROBES,
+    recover=lambda: recover_sign_backend()
+)
+
+# 相同签名请求合并：key -> 正在进行中的签名结果
+inflight_signs = {}
+singleflight_stats = {
+    'leaders': 0,  # 实际执行签名的请求数
+    'coalesced': 0  # 等待其他相同请求结果、没有重复签名的请求数
+}
+
+
+# 自动合并签名的统计（通过 /metrics 暴露）
+COALESCE_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+coalesce_stats = {
+    'batches': 0,  # 发出的页面调用次数
+    'items': 0,  # 合并处理的签名条数
+    'max_batch_size': 0,
+    'size_buckets': [0] * (len(COALESCE_SIZE_BUCKETS) + 1),  # 每批条数分布，最后一格为超出最大桶
+    'added_latency_ms_total': 0.0,  # 所有条目在窗口内等待的总时长
+    'added_latency_ms_max': 0.0
+}
+coalesce_pending = []  # 当前窗口内等待发送的签名
+coalesce_timer = None  # 窗口到期时触发发送的 greenlet
+
+
+class PendingSign:
+    """一条等待合并发送的签名请求（deadline 为调用方的截止时间，默认 SIGN_DEADLINE 秒后）"""
+    __slots__ = ('uri', 'data', 'result', 'enqueued_at', 'deadline')
+    
+    def __init__(self, uri, data, deadline=None):
+        self.uri = uri
+        self.data = data
+        self.result = AsyncResult()
+        self.enqueued_at = time.time()
+        self.deadline = deadline if deadline is not None else self.enqueued_at + SIGN_DEADLINE
+
+def download_stealth_js():
+    """下载 stealth.min.js 到本地"""
+    stealth_js_path = "stealth.min.js"
+    
+    # 如果文件已存在，直接返回
+    if os.path.exists(stealth_js_path):
+        logger.info(f"✅ stealth.min.js 已存在")
+        return stealth_js_path
+    
+    # 多个备用下载源
+    cdn_urls = [
+        "https://cdn.jsdelivr.net/gh/requireCool/stealth.min.js/stealth.min.js",
+        "https://fastly.jsdelivr.net/gh/requireCool/stealth.min.js/stealth.min.js",
+        "https://raw.githubusercontent.com/requireCool/stealth.min.js/main/stealth.min.js",
+    ]
+    
+    # 静态资源缓存里已经有了（例如镜像构建时预先放入），无需联网
+    if asset_cache.enabled:
+        for url in cdn_urls:
+            _, body, _ = asset_cache.lookup(url)
+            if body:
+                with open(stealth_js_path, 'wb') as f:
+                    f.write(body)
+                logger.info(f"✅ stealth.min.js 已从静态资源缓存恢复 ({len(body)} bytes)")
+                return stealth_js_path
+    
+    for idx, url in enumerate(cdn_urls):
+        try:
+            logger.info(f"正在从源 {idx + 1}/{len(cdn_urls)} 下载 stealth.min.js...")
+            logger.info(f"URL: {url}")
+            
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            
+            # 验证下载内容
+            if len(response.text) < 100:
+                logger.warning(f"下载的文件太小，可能不是有效的脚本: {len(response.text)} bytes")
+                continue
+            
+            with open(stealth_js_path, 'w', encoding='utf-8') as f:
+                f.write(response.text)
+            if asset_cache.enabled:
+                try:
+                    asset_cache.store(url, response.content, {'content-type': 'application/javascript'})
+                except OSError as e:
+                    logger.warning(f"写入静态资源缓存失败（忽略）: {e}")
+            
+            logger.info(f"✅ stealth.min.js 下载成功 ({len(response.text)} bytes)")
+            return stealth_js_path
+            
+        except Exception as e:
+            logger.warning(f"从源 {idx + 1} 下载失败: {e}")
+            if idx < len(cdn_urls) - 1:
+                logger.info(f"尝试下一个下载源...")
+            continue
+    
+    logger.error(f"❌ 所有下载源都失败了")
+    logger.warning(f"💡 提示: 您可以手动下载 stealth.min.js 文件到当前目录")
+    logger.warning(f"   下载地址: https://github.com/requireCool/stealth.min.js")
+    return None
+
+
+def create_sign_page(timings=None):
+    """
+    创建一个预热好的签名页面
+    页面会先访问小红书首页，确保 window._webmsxyw 可用
+    传入 timings 字典时，会把访问首页和等待就绪的耗时写进去
+    """
+    page = browser_context.new_page()
+    page_timings = load_sign_page(page)
+    if timings is not None:
+        timings.update(page_timings)
+    return page
+
+
+def load_sign_page(page):
+    """
+    让页面（重新）访问小红书首页并等待签名就绪，返回 {'goto': 秒, 'readiness': 秒}
+    官方示例在这里固定 sleep 1 秒（不 sleep 签名就会失败），
+    这里改为等待真正的就绪信号：a1 cookie 已生成，且 window._webmsxyw 已定义
+    """
+    # 访问小红书首页（必须先访问首页）
+    logger.info("正在访问小红书首页...")
+    started = time.time()
+    page.goto("https://www.xiaohongshu.com")
+    goto_seconds = time.time() - started
+    
+    started = time.time()
+    wait_for_sign_ready(page, SIGN_READY_TIMEOUT)
+    readiness_seconds = time.time() - started
+    logger.info(f"✅ 签名页面已就绪（访问首页 {goto_seconds:.2f} 秒，等待就绪 {readiness_seconds:.2f} 秒）")
+    return {'goto': round(goto_seconds, 3), 'readiness': round(readiness_seconds, 3)}
+
+
+def wait_for_sign_ready(page, timeout):
+    """等待签名函数和 a1 cookie 就绪；签名函数超时未就绪时抛出异常，a1 未生成只告警"""
+    deadline = time.time() + timeout
+    page.wait_for_function("typeof window._webmsxyw === 'function'", timeout=timeout * 1000)
+    
+    while not any(cookie['name'] == 'a1' for cookie in page.context.cookies()):
+        if time.time() >= deadline:
+            logger.warning(f"⚠️ 等待 a1 cookie 超时（{timeout} 秒），签名可能会失败")
+            return
+        time.sleep(SIGN_READY_POLL_INTERVAL)
+
+
+@contextmanager
+def timed_phase(name):
+    """记录初始化某个阶段的耗时到 init_timings"""
+    started = time.time()
+    yield
+    init_timings[name] = round(time.time() - started, 3)
+    logger.info(f"⏱️ 初始化阶段 {name} 耗时 {init_timings[name]:.2f} 秒")
+
+
+def recover_sign_backend():
+    """
+    熔断后的恢复：先让所有页面重新加载并用金丝雀签名验证，
+    仍然失败则重启整个浏览器
+    """
+    logger.warning("正在恢复签名后端：重新加载所有签名页面...")
+    workers = list(page_workers)
+    for worker in workers:
+        worker.needs_reload = True
+    
+    def run_canary(worker):
+        try:
+            worker.call(check_sign_page, BREAKER_RECOVERY_TIMEOUT)
+        except Exception as e:
+            return e
+    
+    # 每个页面各自执行一次金丝雀签名（由自己的持有者在重新加载之后执行），同时进行
+    canaries = [gevent.spawn(run_canary, worker) for worker in workers]
+    gevent.joinall(canaries)
+    errors = [canary.value for canary in canaries if canary.value is not None]
+    if not errors:
+        return
+    
+    broken = [e for e in errors if not isinstance(e, PagePoolBusy)]
+    if not broken:
+        # 页面一直在执行别的任务，不能说明页面坏了：本次恢复算失败，熔断器稍后再试，不重启浏览器
+        raise PagePoolBusy(f"{len(errors)} 个签名页面繁忙，金丝雀检查稍后重试")
+    logger.warning(f"重新加载页面后 {len(broken)}/{len(workers)} 个页面金丝雀签名仍然失败: {broken[0]}，正在重启浏览器...")
+    restart_browser()
+
+
+def restart_browser():
+    """
+    关闭当前浏览器和 Playwright，重新执行 init_browser()
+    重启失败时交给后台初始化循环按 INIT_RETRY_INTERVAL 继续重试，然后把异常抛给调用方
+    """
+    global context_page, init_greenlet
+    
+    with init_lock:
+        browser_ready_event.clear()
+        for worker in page_workers:
+            worker.stop()
+        identity_pool.clear()
+        standby_pool.clear()
+        sign_fast_paths.clear()
+        context_page = None
+        try:
+            if browser_instance:
+                browser_instance.close()
+            if playwright_instance:
+                playwright_instance.stop()
+        except Exception as e:
+            logger.warning(f"关闭旧浏览器失败（忽略）: {e}")
+        
+        try:
+            init_browser()
+        except Exception as e:
+            logger.error(f"❌ 重启浏览器失败，{INIT_RETRY_INTERVAL:.0f} 秒后在后台重试: {e}")
+            set_browser_state('degraded', f'重启失败: {e}')
+            context_page = None
+            init_greenlet = None
+            error = e
+        else:
+            browser_ready_event.set()
+            return
+    
+    # 启动时的初始化循环早已结束，重新启动一个
+    start_browser_init(delay=INIT_RETRY_INTERVAL)
+    raise error
+
+
+def start_browser_init(delay=0):
+    """在后台启动浏览器初始化（同一时间只有一个），失败后按 INIT_RETRY_INTERVAL 自动重试"""
+    global init_greenlet
+    
+    if init_greenlet is None:
+        init_greenlet = gevent.spawn(run_browser_init, delay)
+    return init_greenlet
+
+
+def run_browser_init(delay=0):
+    """后台初始化循环：等待 delay 秒后开始，直到浏览器初始化成功为止"""
+    if delay:
+        time.sleep(delay)
+        set_browser_state('recovering', '重试初始化')
+    while True:
+        with init_lock:
+            if context_page is not None:
+                return
+            try:
+                init_browser()
+            except Exception as e:
+                logger.error(f"初始化失败，服务器将以降级模式运行，{INIT_RETRY_INTERVAL:.0f} 秒后重试: {e}")
+                set_browser_state('degraded', f'初始化失败: {e}')
+            else:
+                set_browser_state('ready', '初始化完成')
+                browser_ready_event.set()
+                return
+        
+        time.sleep(INIT_RETRY_INTERVAL)
+        set_browser_state('recovering', '重试初始化')
+
+
+def close_sign_page(page, context=None):
+    """关闭不再使用的签名页面（独占的上下文一起关闭）"""
+    sign_fast_paths.pop(page, None)
+    try:
+        if context is not None:
+            context.close()
+        else:
+            page.close()
+    except Exception as e:
+        logger.warning(f"关闭旧签名页面失败（忽略）: {e}")
+
+
+def new_browser_context(storage_state=None, block=True):
+    """
+    新建浏览器上下文并加载反检测脚本，storage_state 可以是保存的文件路径或字典
+    block=False 时不拦截资源（只用于拦截验证的对照组）
+    """
+    context = browser_instance.new_context(storage_state=storage_state)
+    
+    # 加载反检测脚本（重要！）
+    if stealth_script_path:
+        context.add_init_script(path=stealth_script_path)
+    
+    # 拦截无用资源，静态资源走本地磁盘缓存
+    if (block and blocking_enabled()) or asset_cache.enabled or FAKE_SIGNER_DIR:
+        context.route("**/*", lambda route: handle_context_route(route, block))
+    return context
+
+
+def measure_sign_page_load(block):
+    """用全新的上下文加载一次签名页面，返回 (请求数, 下载字节数, 是否能签名, 错误信息)"""
+    context = new_browser_context(block=block)
+    finished = []
+    try:
+        page = context.new_page()
+        page.on('requestfinished', finished.append)
+        load_sign_page(page)
+        try:
+            page.wait_for_load_state('networkidle', timeout=SIGN_READY_TIMEOUT * 1000)
+        except Exception:
+            pass
+        total_bytes = 0
+        for request in list(finished):
+            sizes = request.sizes()
+            total_bytes += sizes['responseHeadersSize'] + sizes['responseBodySize']
+        try:
+            check_sign_page(page)
+            error = None
+        except Exception as e:
+            error = str(e)
+        return len(finished), total_bytes, error is None, error
+    finally:
+        context.close()
+
+
+def validate_block_profile():
+    """
+    拦截验证：分别在不拦截和拦截的情况下加载签名页面，
+    报告节省的请求数和字节数；拦截后无法签名则关闭拦截
+    """
+    global block_report, blocked_resource_types, blocked_url_patterns
+    
+    logger.info(f"正在验证资源拦截档位 {BLOCK_PROFILE}...")
+    try:
+        base_requests, base_bytes, base_ok, _ = measure_sign_page_load(block=False)
+    except Exception as e:
+        logger.warning(f"⚠️ 不拦截时无法加载签名页面，拦截验证未完成，保持当前拦截设置: {e}")
+        block_report = {'profile': BLOCK_PROFILE, 'sign_ok': None, 'error': f'对照组加载失败: {e}', 'validated_at': time.time()}
+        return
+    try:
+        blocked_requests, blocked_bytes, blocked_ok, error = measure_sign_page_load(block=True)
+    except Exception as e:
+        # 最常见的失败方式：拦截掉了定义 _webmsxyw 的脚本，页面一直等不到签名函数就绪
+        blocked_requests, blocked_bytes, blocked_ok, error = 0, 0, False, str(e)
+    
+    block_report = {
+        'profile': BLOCK_PROFILE,
+        'sign_ok': blocked_ok,
+        'requests': {'unblocked': base_requests, 'blocked': blocked_requests, 'saved': base_requests - blocked_requests},
+        'bytes': {'unblocked': base_bytes, 'blocked': blocked_bytes, 'saved': base_bytes - blocked_bytes},
+        'validated_at': time.time()
+    }
+    if blocked_ok:
+        logger.info(f"✅ 资源拦截验证通过：少 {base_requests - blocked_requests} 个请求，"
+                    f"少下载 {(base_bytes - blocked_bytes) / 1024:.0f} KB")
+    elif base_ok:
+        logger.error(f"❌ 拦截后无法签名（{error}），已关闭资源拦截")
+        block_report['error'] = error
+        blocked_resource_types = set()
+        blocked_url_patterns = []
+    else:
+        logger.warning("⚠️ 不拦截时同样无法签名，拦截验证结果不可靠，保持当前拦截设置")
+
+
+def create_sign_context():
+    """
+    新建一个独立的浏览器上下文和签名页面
+    复制当前上下文的 cookie 和 localStorage，保持相同的 a1 身份
+    """
+    context = new_browser_context(browser_context.storage_state())
+    try:
+        page = context.new_page()
+        load_sign_page(page)
+        return page, context
+    except Exception:
+        context.close()
+        raise
+
+
+def storage_meta_path():
+    return f"{STORAGE_STATE_PATH}.meta.json"
+
+
+def load_saved_identity():
+    """读取上次保存的浏览器身份信息，没有可用的保存文件时返回 None（离线替身模式不使用保存的身份）"""
+    if not STORAGE_STATE_PATH or FAKE_SIGNER_DIR or not os.path.exists(STORAGE_STATE_PATH):
+        return None
+    try:
+        with open(storage_meta_path(), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # 只有身份文件没有元数据：仍然可以尝试恢复，只是无法校验 a1
+        return {}
+
+
+def discard_saved_identity():
+    """把无法加载的身份文件改名为 .bad（保留下来便于排查），并删除它的元数据"""
+    try:
+        os.replace(STORAGE_STATE_PATH, f"{STORAGE_STATE_PATH}.bad")
+        logger.warning(f"已将无法使用的浏览器身份移动到 {STORAGE_STATE_PATH}.bad")
+    except OSError as e:
+        logger.warning(f"移走浏览器身份文件失败: {e}")
+    try:
+        os.remove(storage_meta_path())
+    except OSError:
+        pass
+
 
-# 全局变量
-playwright_instance = None
-browser_context = None
-context_page = None
-global_a1 = ""  # 当前浏览器中的 a1 值
+def save_identity(meta):
+    """保存当前浏览器上下文的 cookie 和 localStorage，以及用于校验和对比耗时的元数据"""
+    if not STORAGE_STATE_PATH or FAKE_SIGNER_DIR:
+        return
+    try:
+        # 先写到本进程自己的临时文件再原子替换，读取方不会看到写了一半的文件
+        tmp_path = f"{STORAGE_STATE_PATH}.{os.getpid()}.tmp"
+        browser_context.storage_state(path=tmp_path)
+        os.replace(tmp_path, STORAGE_STATE_PATH)
+        meta_tmp_path = f"{storage_meta_path()}.{os.getpid()}.tmp"
+        with open(meta_tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(meta_tmp_path, storage_meta_path())
+        logger.info(f"✅ 浏览器身份已保存到 {STORAGE_STATE_PATH}")
+    except Exception as e:
+        logger.warning(f"保存浏览器身份失败（忽略）: {e}")
 
-def download_stealth_js():
-    """下载 stealth.min.js 到本地"""
-    stealth_js_path = "stealth.min.js"
-    
-    # 如果文件已存在，直接返回
-    if os.path.exists(stealth_js_path):
-        logger.info(f"✅ stealth.min.js 已存在")
-        return stealth_js_path
-    
-    # 多个备用下载源
-    cdn_urls = [
-        "https://cdn.jsdelivr.net/gh/requireCool/stealth.min.js/stealth.min.js",
-        "https://fastly.jsdelivr.net/gh/requireCool/stealth.min.js/stealth.min.js",
-        "https://raw.githubusercontent.com/requireCool/stealth.min.js/main/stealth.min.js",
-    ]
-    
-    for idx, url in enumerate(cdn_urls):
-        try:
-            logger.info(f"正在从源 {idx + 1}/{len(cdn_urls)} 下载 stealth.min.js...")
-            logger.info(f"URL: {url}")
-            
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # 验证下载内容
-            if len(response.text) < 100:
-                logger.warning(f"下载的文件太小，可能不是有效的脚本: {len(response.text)} bytes")
+
+def validate_restored_page(page, saved):
+    """校验恢复的身份：a1 必须与保存时一致，且能正常签名"""
+    a1 = next((c['value'] for c in browser_context.cookies() if c['name'] == 'a1'), '')
+    if saved.get('a1') and a1 != saved['a1']:
+        raise Exception(f"恢复后的 a1 与保存的不一致（{a1[:20]}...）")
+    check_sign_page(page)
+
+
+def check_sign_page(page):
+    """用金丝雀签名检查页面是否可以正常签名"""
+    outcome = page.evaluate(BATCH_SIGN_JS, [[SIGN_CANARY_URI, None]])[0]
+    if not outcome.get('ok'):
+        raise Exception(f"金丝雀签名失败: {outcome.get('error', 'unknown error')}")
+
+
+def browser_rss_mb():
+    """当前进程所有子孙进程（Playwright 驱动和 Chromium）的常驻内存总和（MB），无法读取 /proc 时返回 None"""
+    try:
+        children = {}
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
                 continue
-            
-            with open(stealth_js_path, 'w', encoding='utf-8') as f:
-                f.write(response.text)
-            
-            logger.info(f"✅ stealth.min.js 下载成功 ({len(response.text)} bytes)")
-            return stealth_js_path
-            
-        except Exception as e:
-            logger.warning(f"从源 {idx + 1} 下载失败: {e}")
-            if idx < len(cdn_urls) - 1:
-                logger.info(f"尝试下一个下载源...")
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    # 进程名可能包含空格，从最后一个括号之后开始解析
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(pid))
+        
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        total = 0
+        stack = list(children.get(os.getpid(), []))
+        while stack:
+            pid = stack.pop()
+            stack.extend(children.get(pid, []))
+            try:
+                with open(f'/proc/{pid}/statm') as f:
+                    total += int(f.read().split()[1]) * page_size
+            except (OSError, IndexError, ValueError):
+                continue
+        return total / 1024 / 1024
+    except (OSError, ValueError):
+        return None
+
+
+def recycle_reason(worker, rss_mb):
+    """判断页面是否需要回收，返回原因（不需要回收时返回 None）"""
+    if RECYCLE_AFTER_SIGNS and worker.page_jobs >= RECYCLE_AFTER_SIGNS:
+        return f"已执行 {worker.page_jobs} 个签名任务"
+    if RECYCLE_AFTER_MINUTES and time.time() - worker.created_at >= RECYCLE_AFTER_MINUTES * 60:
+        return f"已使用 {(time.time() - worker.created_at) / 60:.0f} 分钟"
+    if RECYCLE_RSS_MB and rss_mb is not None and rss_mb >= RECYCLE_RSS_MB:
+        oldest = min(page_workers, key=lambda w: w.created_at)
+        if worker is oldest:
+            return f"浏览器内存 {rss_mb:.0f} MB 超过 {RECYCLE_RSS_MB:.0f} MB"
+    return None
+
+
+def recycle_page_worker(worker, reason):
+    """
+    蓝绿切换：在回收器自己的 greenlet 中领取备用上下文或预热新页面，通过金丝雀签名后，
+    只把切换这一步作为任务发给页面的持有者（空闲的 worker 也会立即处理），旧页面在后台关闭；
+    新页面交给持有者之前不属于任何 worker，预热期间旧页面照常签名，失败时继续使用旧页面
+    """
+    logger.info(f"正在回收签名页面（{reason}）...")
+    replacement = standby_pool.claim('recycle')
+    if replacement is None:
+        replacement = create_sign_context()
+        try:
+            check_sign_page(replacement[0])
+        except Exception:
+            close_sign_page(*replacement)
+            raise
+    
+    try:
+        worker.call(lambda page: worker.swap(replacement), RECYCLE_TIMEOUT)
+    except Exception:
+        close_sign_page(*replacement)
+        raise
+
+
+def page_recycler():
+    """后台定期检查每个签名页面，按次数、时间或内存阈值回收"""
+    while True:
+        time.sleep(RECYCLE_CHECK_INTERVAL)
+        if context_page is None or sign_breaker.state != 'closed':
             continue
+        
+        rss_mb = browser_rss_mb() if RECYCLE_RSS_MB else None
+        for worker in list(page_workers):
+            reason = recycle_reason(worker, rss_mb)
+            if not reason:
+                continue
+            try:
+                recycle_page_worker(worker, reason)
+            except Exception as e:
+                logger.warning(f"回收签名页面失败，继续使用旧页面: {e}")
+            # 每轮只回收一个页面，避免同时创建多个页面造成内存尖峰
+            break
+
+
+def start_page_workers(pages):
+    """为每个签名页面启动一个持有者 greenlet（重新初始化时先停掉旧的）"""
+    global page_workers
     
-    logger.error(f"❌ 所有下载源都失败了")
-    logger.warning(f"💡 提示: 您可以手动下载 stealth.min.js 文件到当前目录")
-    logger.warning(f"   下载地址: https://github.com/requireCool/stealth.min.js")
-    return None
+    for worker in page_workers:
+        worker.stop()
+    page_workers = [PageWorker(page) for page in pages]
+
+
+def estimate_retry_after():
+    """根据排队任务数和平均执行耗时估算客户端应等待多久再重试（秒）"""
+    workers = max(1, len(page_workers))
+    return max(1, math.ceil(sign_jobs.qsize() * sign_job_seconds / workers))
+
+
+def run_on_page(fn, timeout=PAGE_ACQUIRE_TIMEOUT, jobs=None, deadline=None):
+    """
+    把 fn(page) 投递给签名页面的持有者执行，并等待结果
+    jobs 为账号身份的任务队列，默认投递到共享页面池
+    队列已满时立即抛出 SignQueueFull（返回 429），不让请求无限堆积
+    deadline 不为空时最多等到请求截止时间，超时抛出 SignDeadlineExceeded（返回 504），
+    否则等待 timeout 秒，超时抛出 PagePoolBusy
+    """
+    if deadline is not None:
+        timeout = max(0, deadline - time.time())
+    job = SignJob(fn)
+    try:
+        (sign_jobs if jobs is None else jobs).put_nowait(job)
+    except queue.Full:
+        raise SignQueueFull(
+            f"签名任务队列已满（{PAGE_QUEUE_MAX}）",
+            retry_after=estimate_retry_after()
+        )
+    
+    try:
+        return job.result.get(timeout=timeout)
+    except gevent.Timeout:
+        job.cancelled = True
+        if deadline is not None:
+            raise SignDeadlineExceeded(f"签名超时（{timeout:.2f} 秒内未完成）")
+        raise PagePoolBusy(f"等待签名任务完成超时（{timeout} 秒）")
 
 
 def init_browser():
@@ -88,45 +2222,84 @@ def init_browser():
     - 如果一直失败可尝试设置成 False 让其打开浏览器
     - 适当添加 sleep 可查看浏览器状态
     """
-    global playwright_instance, browser_context, context_page, global_a1
+    global playwright_instance, browser_instance, browser_context, context_page, global_a1, pool_pages
+    global stealth_script_path, init_mode
     
+    init_timings.clear()
+    init_started = time.time()
     try:
         # 1. 下载 stealth.js（反检测脚本）
-        stealth_js_path = download_stealth_js()
-        if not stealth_js_path:
+        #    离线替身模式不需要反检测脚本，也不联网下载
+        with timed_phase('stealth'):
+            stealth_js_path = None if FAKE_SIGNER_DIR else download_stealth_js()
+        stealth_script_path = stealth_js_path
+        if FAKE_SIGNER_DIR:
+            logger.info(f"离线替身模式：签名页面使用 {FAKE_SIGNER_DIR}，跳过 stealth.min.js")
+        elif not stealth_js_path:
             logger.warning("⚠️ stealth.js 下载失败，将在没有反检测脚本的情况下启动")
         
-        # 2. 启动 Playwright
-        logger.info("正在启动 playwright...")
-        playwright_instance = sync_playwright().start()
-        chromium = playwright_instance.chromium
-        
-        # 3. 启动浏览器（headless=True，官方推荐）
-        # 如果一直失败可尝试设置成 False 让其打开浏览器
-        logger.info("正在启动 chromium 浏览器（无头模式）...")
-        browser = chromium.launch(headless=True)
-        
-        # 4. 创建浏览器上下文
-        browser_context = browser.new_context()
+        with timed_phase('launch'):
+            # 2. 启动 Playwright
+            logger.info("正在启动 playwright...")
+            playwright_instance = sync_playwright().start()
+            chromium = playwright_instance.chromium
+            
+            # 3. 启动浏览器（headless=True，官方推荐）
+            # 如果一直失败可尝试设置成 False 让其打开浏览器
+            logger.info("正在启动 chromium 浏览器（无头模式）...")
+            browser_instance = chromium.launch(headless=True)
         
-        # 5. 加载反检测脚本（重要！）
+        # 4. 创建浏览器上下文并加载反检测脚本（有保存的身份时直接恢复）
+        saved = load_saved_identity()
+        init_mode = 'warm' if saved is not None else 'cold'
+        with timed_phase('context'):
+            try:
+                browser_context = new_browser_context(STORAGE_STATE_PATH if saved is not None else None)
+            except Exception as e:
+                if saved is None:
+                    raise
+                # 保存的身份文件损坏或与当前浏览器版本不兼容：移走它，否则每次重试都会失败在这里
+                logger.warning(f"⚠️ 无法加载保存的浏览器身份，改为冷启动: {e}")
+                discard_saved_identity()
+                saved = None
+                init_mode = 'cold'
+                browser_context = new_browser_context()
+        if saved is not None:
+            logger.info(f"正在从 {STORAGE_STATE_PATH} 恢复浏览器身份...")
         if stealth_js_path:
-            browser_context.add_init_script(path=stealth_js_path)
             logger.info("✅ stealth.min.js 反检测脚本已加载")
         
-        # 6. 创建页面
-        context_page = browser_context.new_page()
+        # 验证资源拦截不影响签名（在预热页面之前，验证失败时页面池不会被拦截）
+        if BLOCK_VALIDATE and blocking_enabled():
+            with timed_phase('block_validate'):
+                validate_block_profile()
         
-        # 7. 访问小红书首页（必须先访问首页）
-        logger.info("正在访问小红书首页...")
-        context_page.goto("https://www.xiaohongshu.com")
+        # 5. 创建并预热签名页面池（每个页面都已访问首页并等待就绪）
+        #    第一个页面的访问首页和就绪耗时单独记录为 goto / readiness
+        pool_size = min(max(PAGE_POOL_SIZE, POOL_MIN), POOL_MAX)
+        logger.info(f"正在预热 {pool_size} 个签名页面...")
+        with timed_phase('pages'):
+            try:
+                first_page = create_sign_page(init_timings)
+                if saved is not None:
+                    validate_restored_page(first_page, saved)
+            except Exception as e:
+                if saved is None:
+                    raise
+                # 恢复的身份不可用：丢弃它，走全新身份的冷启动
+                logger.warning(f"⚠️ 恢复浏览器身份失败，改为冷启动: {e}")
+                browser_context.close()
+                browser_context = new_browser_context()
+                init_mode = 'cold'
+                first_page = create_sign_page(init_timings)
+            pages = [first_page]
+            pages += [create_sign_page() for _ in range(pool_size - 1)]
+        start_page_workers(pages)
+        pool_pages = pages
+        context_page = pages[0]
+        logger.info(f"✅ 签名页面池已就绪（{len(pages)} 个页面）")
         
-        # 8. 这个地方设置完浏览器 cookie 之后，如果这儿不 sleep 一下签名获取就失败了
-        # 如果经常失败请设置长一点试试（官方注释）
-        logger.info("等待页面完全加载（1秒）...")
-        time.sleep(1)
-        
-        # 9. 提取浏览器生成的 a1 cookie
+        # 6. 提取浏览器生成的 a1 cookie
         cookies = browser_context.cookies()
         for cookie in cookies:
             if cookie["name"] == "a1":
@@ -138,19 +2311,123 @@ def init_browser():
         if not global_a1:
             logger.warning("⚠️ 未能获取到 a1 cookie，签名可能会失败")
         
-        logger.info("✅ 浏览器初始化完成，等待签名请求")
+        init_timings['total'] = round(time.time() - init_started, 3)
+        logger.info(f"✅ 浏览器初始化完成（{init_mode}，共 {init_timings['total']:.2f} 秒），等待签名请求")
+        logger.info(f"⏱️ 各阶段耗时: {init_timings}")
+        
+        # 7. 保存浏览器身份，记录冷启动和恢复的耗时用于对比
+        meta = dict(saved or {})
+        meta.update({'a1': global_a1, 'saved_at': time.time()})
+        meta[f'{init_mode}_init_seconds'] = init_timings['total']
+        if init_mode == 'warm' and meta.get('cold_init_seconds'):
+            logger.info(f"⏱️ 恢复身份耗时 {init_timings['total']:.2f} 秒，上次冷启动耗时 {meta['cold_init_seconds']:.2f} 秒")
+        save_identity(meta)
         
     except Exception as e:
         logger.error(f"❌ 浏览器初始化失败: {e}", exc_info=True)
         raise
 
+
+def write_worker_status():
+    """多进程模式下，把当前 worker 的状态写入状态目录，供其他 worker 的 /health 汇总"""
+    if not SUPERVISOR_STATUS_DIR or not WORKER_ID:
+        return
+    
+    status = {
+        'worker_id': WORKER_ID,
+        'pid': os.getpid(),
+        'browser_ready': context_page is not None,
+        'browser_state': browser_state,
+        'a1': global_a1[:20] + "..." if global_a1 else "",
+        'page_pool_size': len(pool_pages),
+        'updated_at': time.time()
+    }
+    path = os.path.join(SUPERVISOR_STATUS_DIR, f"worker-{WORKER_ID}.json")
+    try:
+        # 先写临时文件再替换，避免读到写了一半的文件
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"写入 worker 状态失败: {e}")
+
+
+def read_workers_status():
+    """读取 supervisor 及所有 worker 的状态，单进程模式下返回 None"""
+    if not SUPERVISOR_STATUS_DIR:
+        return None
+    
+    try:
+        with open(os.path.join(SUPERVISOR_STATUS_DIR, 'supervisor.json'), encoding='utf-8') as f:
+            supervisor_status = json.load(f)
+    except (OSError, ValueError) as e:
+        return {'error': f"无法读取 supervisor 状态: {e}"}
+    
+    for worker in supervisor_status.get('workers', []):
+        try:
+            with open(os.path.join(SUPERVISOR_STATUS_DIR, f"worker-{worker['id']}.json"), encoding='utf-8') as f:
+                worker_status = json.load(f)
+        except (OSError, ValueError):
+            worker_status = {}
+        # 只采用当前进程写入的状态，已重启的 worker 留下的旧状态文件会被忽略
+        worker['browser_ready'] = worker_status.get('pid') == worker.get('pid') and worker_status.get('browser_ready', False)
+    
+    return supervisor_status
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # 请求 ID：沿用调用方传入的 X-Request-ID，没有则生成一个；成功日志是否输出在请求开始时一次决定
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    g.log_sampled = LOG_SUCCESS_SAMPLE_RATE >= 1 or random.random() < LOG_SUCCESS_SAMPLE_RATE
+    g.log_buffer = []
+
+
+@app.after_request
+def record_request_metrics(response):
+    """记录每个接口按状态码的请求数，签名接口额外记录端到端耗时"""
+    # 没有匹配到任何路由（404、405 等）的请求统一记为 unmatched
+    key = (request.endpoint or 'unmatched', response.status_code)
+    request_counts[key] = request_counts.get(key, 0) + 1
+    histogram = request_histograms.get(request.endpoint)
+    if histogram is not None and 'request_started' in g:
+        latency = time.perf_counter() - g.request_started
+        histogram.observe(latency)
+        if (request.endpoint == 'sign' and trace_recorder.enabled
+                and (TRACE_SAMPLE_RATE >= 1 or random.random() < TRACE_SAMPLE_RATE)):
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict):
+                no_cache = 'no-cache' in request.headers.get('Cache-Control', '').lower()
+                trace_recorder.record(time.time() - latency, payload, no_cache, response.status_code, latency)
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+
 @app.before_request
 def ensure_browser():
-    """确保浏览器已初始化"""
-    global context_page
-    if context_page is None:
-        logger.warning("浏览器未初始化，正在初始化...")
-        init_browser()
+    """
+    签名接口需要浏览器已就绪
+    浏览器只在后台初始化，请求处理过程中从不启动浏览器：
+    初始化期间最多等待 INIT_WAIT_TIMEOUT 秒，仍未就绪直接返回 503
+    """
+    if request.endpoint not in ('sign', 'sign_batch'):
+        return None
+    if browser_ready_event.is_set() or browser_ready_event.wait(INIT_WAIT_TIMEOUT):
+        return None
+    
+    e = BrowserNotReady(f"浏览器尚未就绪（{browser_state}）", retry_after=5)
+    logger.warning(f"⚠️ {e}")
+    response = jsonify({
+        'error': str(e),
+        'error_type': type(e).__name__,
+        'browser_state': browser_state,
+        'success': False,
+        'hint': f'签名服务正在启动，请 {e.retry_after} 秒后重试'
+    })
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
 
 @app.route('/', methods=['GET'])
 def index():
@@ -166,6 +2443,16 @@ def index():
                 'method': 'GET',
                 'description': '健康检查'
             },
+            'metrics': {
+                'path': '/metrics',
+                'method': 'GET',
+                'description': '签名服务内部统计（Prometheus 文本格式，可直接作为抓取目标）'
+            },
+            'metrics_json': {
+                'path': '/metrics/json',
+                'method': 'GET',
+                'description': '签名服务内部统计（JSON 格式的详细统计）'
+            },
             'sign': {
                 'path': '/sign',
                 'method': 'POST',
@@ -176,6 +2463,14 @@ def index():
                     'a1': 'Cookie a1 字段',
                     'web_session': 'Cookie web_session 字段'
                 }
+            },
+            'sign_batch': {
+                'path': '/sign/batch',
+                'method': 'POST',
+                'description': '批量生成签名（单条失败不影响其他条）',
+                'parameters': {
+                    'items': '[{"uri": "API 路径", "data": "请求数据（可选）"}, ...]'
+                }
             }
         }
     })
@@ -186,18 +2481,157 @@ def health():
     browser_ready = context_page is not None
     
     return jsonify({
-        'status': 'healthy' if browser_ready else 'initializing',
+        'status': 'healthy' if browser_state == 'ready' else browser_state,
         'browser_ready': browser_ready,
+        'browser_state': {
+            'state': browser_state,
+            'reason': browser_state_reason,
+            'since': browser_state_changed_at
+        },
         'a1': global_a1[:20] + "..." if global_a1 else "",
+        'page_pool': {
+            'size': len(pool_pages),
+            'busy': sum(1 for worker in page_workers if worker.busy),
+            'queued': sign_jobs.qsize(),
+            'max_queued': PAGE_QUEUE_MAX,
+            'recycles': sum(worker.recycles for worker in page_workers),
+            'oldest_page_age_seconds': max((time.time() - worker.created_at for worker in page_workers), default=0)
+        },
+        'init_mode': init_mode,
+        'init_timings': init_timings,
+        'circuit_breaker': sign_breaker.status(),
+        'worker_id': WORKER_ID or None,
+        'pid': os.getpid(),
+        'workers': read_workers_status(),
         'timestamp': time.time()
     }), 200 if browser_ready else 503
 
+def render_prometheus_metrics():
+    """按 Prometheus 文本格式输出所有计数器、直方图和仪表盘指标"""
+    lines = []
+    
+    def add(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    
+    def add_histogram(name, help_text, histograms):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in histograms:
+            lines.extend(histogram.render(name, labels))
+    
+    add('xhs_sign_requests_total', 'counter', 'HTTP requests by endpoint and status code', [
+        (f'endpoint="{endpoint}",status="{status}"', count)
+        for (endpoint, status), count in sorted(request_counts.items(), key=lambda item: (str(item[0][0]), item[0][1]))
+    ])
+    add_histogram('xhs_sign_request_duration_seconds', 'End-to-end latency of signing requests', [
+        (f'endpoint="{endpoint}"', histogram) for endpoint, histogram in request_histograms.items()
+    ])
+    add_histogram('xhs_sign_queue_wait_seconds', 'Time a signing job waited for a page', [('', queue_wait_histogram)])
+    add_histogram('xhs_sign_evaluate_seconds', 'Time a signing job ran on a page', [('', evaluate_histogram)])
+    add_histogram('xhs_sign_attempts', 'Attempts needed per signing request', [('', attempts_histogram)])
+    
+    add('xhs_sign_pages', 'gauge', 'Pages in the shared signing pool', [('', len(page_workers))])
+    add('xhs_sign_pages_busy', 'gauge', 'Pages currently running a job', [('', sum(1 for w in page_workers if w.busy))])
+    add('xhs_sign_queue_depth', 'gauge', 'Jobs waiting for a page', [('', sign_jobs.qsize())])
+    add('xhs_sign_queue_capacity', 'gauge', 'Maximum queued jobs before 429', [('', PAGE_QUEUE_MAX)])
+    add('xhs_sign_identity_contexts', 'gauge', 'Per-account identity contexts', [('', len(identity_pool.contexts))])
+    add('xhs_sign_standby_contexts', 'gauge', 'Warm standby contexts ready to claim', [('', len(standby_pool.spares))])
+    add('xhs_sign_page_recycles_total', 'counter', 'Pages replaced by recycling or recovery', [
+        ('', sum(w.recycles for w in page_workers))
+    ])
+    add('xhs_sign_browser_ready', 'gauge', 'Whether the browser can sign', [('', int(browser_ready_event.is_set()))])
+    add('xhs_sign_browser_state', 'gauge', 'Current browser state', [
+        (f'state="{state}"', int(browser_state == state))
+        for state in ('initializing', 'ready', 'degraded', 'recovering')
+    ])
+    rss_mb = browser_rss_mb()
+    if rss_mb is not None:
+        add('xhs_sign_browser_rss_bytes', 'gauge', 'Resident memory of Playwright and Chromium', [
+            ('', int(rss_mb * 1024 * 1024))
+        ])
+    add('xhs_sign_init_duration_seconds', 'gauge', 'Duration of each phase of the last browser init', [
+        (f'phase="{phase}"', seconds) for phase, seconds in init_timings.items()
+    ])
+    add('xhs_sign_circuit_breaker_state', 'gauge', 'Circuit breaker state', [
+        (f'state="{state}"', int(sign_breaker.state == state)) for state in ('closed', 'open', 'half_open')
+    ])
+    add('xhs_sign_cache_entries', 'gauge', 'Signatures in the cache', [('', len(sign_cache.entries))])
+    add('xhs_sign_cache_hits_total', 'counter', 'Signature cache hits', [('', sign_cache.hits)])
+    add('xhs_sign_cache_misses_total', 'counter', 'Signature cache misses', [('', sign_cache.misses)])
+    add('xhs_sign_singleflight_coalesced_total', 'counter', 'Requests that waited for an identical in-flight signature', [
+        ('', singleflight_stats['coalesced'])
+    ])
+    add('xhs_sign_coalesce_batches_total', 'counter', 'Page calls made by the coalescer', [('', coalesce_stats['batches'])])
+    add('xhs_sign_coalesce_items_total', 'counter', 'Signatures sent through the coalescer', [('', coalesce_stats['items'])])
+    add('xhs_sign_blocked_requests_total', 'counter', 'Browser requests aborted by the block profile', [
+        ('', block_stats['requests'])
+    ])
+    return "\n".join(lines) + "\n"
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """签名服务内部统计（Prometheus 文本格式，默认抓取路径）"""
+    return Response(render_prometheus_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/metrics/json', methods=['GET'])
+def metrics_json():
+    """签名服务内部统计（JSON 格式的详细统计）"""
+    batches = coalesce_stats['batches']
+    items = coalesce_stats['items']
+    return jsonify({
+        'coalesce': {
+            'window_ms': SIGN_COALESCE_WINDOW_MS,
+            'max_items': SIGN_COALESCE_MAX_ITEMS,
+            'batches': batches,
+            'items': items,
+            'avg_batch_size': items / batches if batches else 0,
+            'max_batch_size': coalesce_stats['max_batch_size'],
+            'batch_size_buckets': {
+                **{f'le_{bound}': count for bound, count in zip(COALESCE_SIZE_BUCKETS, coalesce_stats['size_buckets'])},
+                'gt_max': coalesce_stats['size_buckets'][-1]
+            },
+            'avg_added_latency_ms': coalesce_stats['added_latency_ms_total'] / items if items else 0,
+            'max_added_latency_ms': coalesce_stats['added_latency_ms_max']
+        },
+        'cache': sign_cache.stats(),
+        'asset_cache': asset_cache.stats(),
+        'identities': identity_pool.stats(),
+        'trace': trace_recorder.stats(),
+        'standby': standby_pool.stats(),
+        'autoscaler': autoscaler.stats(),
+        'fast_path': {
+            'enabled': SIGN_FAST_PATH,
+            'pages': sum(1 for fast in sign_fast_paths.values() if fast),
+            'resolves': sum(fast.resolves for fast in sign_fast_paths.values() if fast)
+        },
+        'blocking': {
+            'profile': BLOCK_PROFILE,
+            'enabled': blocking_enabled(),
+            'resource_types': sorted(blocked_resource_types),
+            'url_patterns': blocked_url_patterns,
+            'blocked_requests': block_stats['requests'],
+            'blocked_by_type': block_stats['by_type'],
+            'validation': block_report
+        },
+        'singleflight': {
+            'in_flight': len(inflight_signs),
+            'leaders': singleflight_stats['leaders'],
+            'coalesced': singleflight_stats['coalesced']
+        },
+        'timestamp': time.time()
+    })
+
 @app.route('/a1', methods=['GET'])
 def get_a1():
     """获取当前浏览器的 a1 值"""
     return jsonify({'a1': global_a1})
 
-def generate_sign(uri, data, a1, web_session, web_id=None):
+def generate_sign(uri, data, a1, web_session, web_id=None, use_cache=True, deadline=None):
     """
     生成签名（参考官方 basic_usage.py 实现）
     参考：https://github.com/ReaJason/xhs/blob/master/example/basic_usage.py
@@ -211,47 +2645,357 @@ def generate_sign(uri, data, a1, web_session, web_id=None):
     - 签名服务器启动时设置一次 Cookie（使用浏览器自带的 a1）
     - 不再每次请求都更新 Cookie
     - 用户请求时带上完整 Cookie 即可
+    
+    开启多账号身份（IDENTITY_MAX_CONTEXTS > 0）时，a1 与服务自己的 a1 不同的请求
+    会在带有调用方 cookie 的独立上下文中签名，调用方不用再复制服务的 a1
+    
+    use_cache=False 时跳过缓存读取（对应请求头 Cache-Control: no-cache），新签名仍会写入缓存
+    deadline 为本次请求的截止时间（time.time() 时间戳），默认 SIGN_DEADLINE 秒后，所有重试都不会超过它
     """
-    global browser_context, context_page, global_a1
+    if deadline is None:
+        deadline = time.time() + SIGN_DEADLINE
     
-    # 重试最多 10 次（参考官方实现）
-    for attempt in range(10):
+    if identity_pool.enabled and a1 and a1 != global_a1:
+        identity = identity_pool.get(a1, web_session, web_id or '', deadline)
         try:
-            # 执行签名函数（关键：不再频繁切换 Cookie！）
-            logger.info(f"[尝试 {attempt + 1}/10] 执行签名 - URI: {uri}")
-            encrypt_params = context_page.evaluate(
-                "([url, data]) => window._webmsxyw(url, data)",
-                [uri, data]
-            )
-            
-            # 返回结果
-            result = {
-                "x-s": encrypt_params["X-s"],
-                "x-t": str(encrypt_params["X-t"])
-            }
+            return sign_once(uri, data, use_cache, deadline, identity)
+        finally:
+            identity_pool.release(identity)
+    return sign_once(uri, data, use_cache, deadline)
+
+
+def sign_once(uri, data, use_cache, deadline, identity=None):
+    """
+    查签名缓存、合并相同的进行中请求，都没有时才真正签名（identity 不为空时在该账号身份的页面上签名）
+    """
+    key = sign_cache_key(uri, data, identity.a1 if identity else '')
+    if sign_cache.enabled and use_cache:
+        cached = sign_cache.get(key)
+        if cached is not None:
+            logger.info(f"✅ 命中签名缓存 - x-t: {cached['x-t']}")
+            return cached
+    
+    # 相同的签名正在进行中：直接等待它的结果（或失败），不再重复占用页面
+    flight = inflight_signs.get(key)
+    if flight is not None:
+        singleflight_stats['coalesced'] += 1
+        logger.info(f"相同签名正在进行中，等待其结果 - URI: {uri}")
+        try:
+            return flight.get(timeout=max(0, deadline - time.time()))
+        except gevent.Timeout:
+            raise SignDeadlineExceeded("等待相同签名的结果超时")
+    
+    # 熔断中直接拒绝，不再给正在恢复的页面增加负担
+    # 熔断器只保护共享页面池，单个账号身份的失败不影响其他请求
+    probe = sign_breaker.acquire() if identity is None else False
+    
+    flight = AsyncResult()
+    inflight_signs[key] = flight
+    singleflight_stats['leaders'] += 1
+    try:
+        result = sign_with_retry(uri, data, deadline, identity)
+    except (PagePoolBusy, SignDeadlineExceeded) as e:
+        # 排队已满或超过调用方给的时限，不能说明页面坏了，不计入熔断
+        if identity is None:
+            sign_breaker.release(probe)
+        flight.set_exception(e)
+        raise
+    except Exception as e:
+        if identity is None:
+            sign_breaker.record_failure(probe, str(e))
+        flight.set_exception(e)
+        raise
+    else:
+        if identity is None:
+            sign_breaker.record_success(probe)
+        if sign_cache.enabled:
+            sign_cache.put(key, result)
+        flight.set(result)
+    finally:
+        del inflight_signs[key]
+        if not flight.ready():
+            # 领头请求被中断（greenlet 被 kill、客户端断开等）：让等待它的请求立即失败，而不是一直等到各自的截止时间
+            if identity is None:
+                sign_breaker.release(probe)
+            flight.set_exception(PagePoolBusy("相同签名的请求已中断，请重试"))
+    return result
+
+
+def sign_with_retry(uri, data, deadline, identity=None):
+    """
+    执行签名，失败时按错误类型重试（不经过缓存和相同请求合并）
+    identity 不为空时在该账号身份的页面上签名
+    - 签名函数丢失、页面跳转：页面持有者会在下一个任务前重新加载页面，随后重试
+    - 其他偶发错误：第一次立即重试，之后指数退避加随机抖动
+    所有重试都受 deadline 约束，超时抛出 SignDeadlineExceeded
+    """
+    for attempt in range(1, SIGN_MAX_ATTEMPTS + 1):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            attempts_histogram.observe(attempt - 1)
+            raise SignDeadlineExceeded(f"签名超时（已尝试 {attempt - 1} 次）")
+        
+        try:
+            # 交给合并器执行签名（关键：不再频繁切换 Cookie！）
+            # 同一时间窗口内的并发请求会合并成一次页面调用，每次重试都重新排队
+            logger.info(f"[尝试 {attempt}/{SIGN_MAX_ATTEMPTS}] 执行签名 - URI: {uri}")
+            if identity is None:
+                result = submit_coalesced_sign(uri, data, deadline)
+            else:
+                result = sign_on_identity(identity, uri, data, deadline=deadline)
             
-            logger.info(f"[尝试 {attempt + 1}/10] ✅ 签名生成成功 - x-t: {result['x-t']}")
+            logger.info(f"[尝试 {attempt}/{SIGN_MAX_ATTEMPTS}] ✅ 签名生成成功 - x-t: {result['x-t']}")
+            attempts_histogram.observe(attempt)
             return result
             
+        except (PagePoolBusy, SignDeadlineExceeded):
+            # 页面池繁忙不是签名失败，重试只会让排队更长
+            raise
         except Exception as e:
             # 这儿有时会出现 window._webmsxyw is not a function 或未知跳转错误
             # 因此加一个失败重试（官方注释）
             error_msg = str(e)
-            logger.warning(f"[尝试 {attempt + 1}/10] ❌ 签名生成失败: {error_msg}")
+            kind = classify_sign_error(e)
+            logger.warning(f"[尝试 {attempt}/{SIGN_MAX_ATTEMPTS}] ❌ 签名生成失败（{kind}）: {error_msg}")
             
             # 如果是最后一次尝试，抛出异常
-            if attempt == 9:
-                logger.error(f"重试了 10 次还是无法签名成功")
-                raise Exception(f"签名失败（重试10次）: {error_msg}")
+            if attempt == SIGN_MAX_ATTEMPTS:
+                attempts_histogram.observe(attempt)
+                logger.error(f"重试了 {SIGN_MAX_ATTEMPTS} 次还是无法签名成功")
+                raise Exception(f"签名失败（重试{SIGN_MAX_ATTEMPTS}次）: {error_msg}")
             
-            # 否则继续重试
-            logger.info(f"等待 0.5 秒后重试...")
-            time.sleep(0.5)
+            # 否则退避后重试，等待时间不超过剩余时间
+            delay = min(retry_delay(attempt), max(0, deadline - time.time()))
+            if delay > 0:
+                logger.info(f"等待 {delay:.2f} 秒后重试...")
+                time.sleep(delay)
     
     # 理论上不会到这里
     raise Exception("重试了这么多次还是无法签名成功，寄寄寄")
 
 
+def evaluate_sign_batch(payload, timeout=PAGE_ACQUIRE_TIMEOUT, jobs=None, deadline=None):
+    """
+    在某个签名页面上用一次 evaluate 调用签名 payload 中的所有 [uri, data]
+    返回页面端的原始结果列表：{ok: true, x-s, x-t} 或 {ok: false, error}
+    """
+    return run_on_page(lambda page: sign_on_page(page, payload), timeout=timeout, jobs=jobs, deadline=deadline)
+
+
+def sign_on_identity(identity, uri, data, deadline):
+    """在账号身份自己的页面上签名一条（每个账号的并发很低，不经过合并窗口），cookie 有变化时在同一个任务里先更新"""
+    def sign(page):
+        identity.sync_cookies(page)
+        return sign_on_page(page, [[uri, data]])
+    
+    outcome = run_on_page(sign, jobs=identity.jobs, deadline=deadline)[0]
+    if not outcome.get('ok'):
+        raise Exception(outcome.get('error', 'unknown error'))
+    identity.signs += 1
+    return {"x-s": outcome['x-s'], "x-t": outcome['x-t']}
+
+
+def submit_coalesced_sign(uri, data, deadline):
+    """
+    把一条签名放进当前合并窗口，等待所在批次完成后返回自己的结果
+    窗口到期或攒够 SIGN_COALESCE_MAX_ITEMS 条时整批发送
+    最多等到 deadline，超时抛出 SignDeadlineExceeded；
+    批次在所有成员都超过截止时间之前仍会执行，之后还没轮到页面的批次直接取消
+    """
+    global coalesce_timer
+    
+    pending = PendingSign(uri, data, deadline)
+    coalesce_pending.append(pending)
+    
+    if SIGN_COALESCE_WINDOW_MS <= 0 or len(coalesce_pending) >= SIGN_COALESCE_MAX_ITEMS:
+        # 不等待窗口，立即在另一个 greenlet 中发送，当前请求只等待到自己的截止时间
+        gevent.spawn(flush_coalesced_signs)
+    elif coalesce_timer is None:
+        coalesce_timer = gevent.spawn_later(SIGN_COALESCE_WINDOW_MS / 1000, flush_coalesced_signs)
+    
+    timeout = max(0, deadline - time.time())
+    try:
+        return pending.result.get(timeout=timeout)
+    except gevent.Timeout:
+        raise SignDeadlineExceeded(f"签名超时（{timeout:.2f} 秒内未完成）")
+
+
+def flush_coalesced_signs():
+    """取出当前窗口内的全部签名，合并成一次页面调用，并把结果分发给各个等待者"""
+    global coalesce_pending, coalesce_timer
+    
+    batch = coalesce_pending
+    coalesce_pending = []
+    if coalesce_timer is not None:
+        if coalesce_timer is not gevent.getcurrent():
+            coalesce_timer.kill(block=False)
+        coalesce_timer = None
+    if not batch:
+        return
+    
+    # 记录批次大小和每条在窗口内额外等待的时间
+    now = time.time()
+    size = len(batch)
+    coalesce_stats['batches'] += 1
+    coalesce_stats['items'] += size
+    coalesce_stats['max_batch_size'] = max(coalesce_stats['max_batch_size'], size)
+    bucket = next((i for i, bound in enumerate(COALESCE_SIZE_BUCKETS) if size <= bound), len(COALESCE_SIZE_BUCKETS))
+    coalesce_stats['size_buckets'][bucket] += 1
+    for pending in batch:
+        waited_ms = (now - pending.enqueued_at) * 1000
+        coalesce_stats['added_latency_ms_total'] += waited_ms
+        coalesce_stats['added_latency_ms_max'] = max(coalesce_stats['added_latency_ms_max'], waited_ms)
+    
+    try:
+        # 页面任务最多等到批次中最晚的截止时间，所有调用方都已放弃后不再占用队列和页面
+        outcomes = evaluate_sign_batch([[p.uri, p.data] for p in batch], deadline=max(p.deadline for p in batch))
+        for pending, outcome in zip(batch, outcomes):
+            if outcome.get('ok'):
+                pending.result.set({"x-s": outcome['x-s'], "x-t": outcome['x-t']})
+            else:
+                pending.result.set_exception(Exception(outcome.get('error', 'unknown error')))
+    except Exception as e:
+        # 整批失败（页面池繁忙、页面跳转等），每个等待者都收到同一个异常，各自决定是否重试
+        for pending in batch:
+            if not pending.result.ready():
+                pending.result.set_exception(e)
+    finally:
+        # 发送批次的 greenlet 被 kill 或结果条数不对时，剩下的等待者也要立即得到结果，不能一直等到截止时间
+        for pending in batch:
+            if not pending.result.ready():
+                pending.result.set_exception(PagePoolBusy("合并签名的批次被中断，请重试"))
+
+
+def generate_sign_batch(items, deadline=None):
+    """
+    批量生成签名：所有条目在同一个页面的一次 evaluate 调用中完成
+    
+    参数 items 为 [(uri, data), ...]，返回与之一一对应的结果列表，
+    每一项为 {"x-s": ..., "x-t": ...} 或 {"error": ...}
+    只有整个 evaluate 调用失败（例如页面跳转）才会重试，单条失败直接返回给调用方
+    重试策略与 sign_with_retry 相同，受 deadline 约束
+    """
+    if deadline is None:
+        deadline = time.time() + SIGN_DEADLINE
+    
+    probe = sign_breaker.acquire()
+    settled = False
+    try:
+        results = batch_sign_with_retry(items, deadline)
+    except (PagePoolBusy, SignDeadlineExceeded):
+        # 不能说明页面坏了，不计入熔断（在 finally 中归还试探名额）
+        raise
+    except Exception as e:
+        settled = True
+        sign_breaker.record_failure(probe, str(e))
+        raise
+    else:
+        settled = True
+        sign_breaker.record_success(probe)
+    finally:
+        if not settled:
+            # 排队已满、超过截止时间，或者请求被中断（greenlet 被 kill、客户端断开等）：
+            # 不计入熔断，但要归还半开状态的试探名额，否则熔断器会一直停在 half_open
+            sign_breaker.release(probe)
+    return results
+
+
+def batch_sign_with_retry(items, deadline):
+    """执行批量签名，整批失败时按错误类型重试"""
+    payload = [[uri, data] for uri, data in items]
+    
+    for attempt in range(1, SIGN_MAX_ATTEMPTS + 1):
+        if deadline - time.time() <= 0:
+            raise SignDeadlineExceeded(f"批量签名超时（已尝试 {attempt - 1} 次）")
+        
+        try:
+            logger.info(f"[尝试 {attempt}/{SIGN_MAX_ATTEMPTS}] 执行批量签名 - {len(payload)} 条")
+            outcomes = evaluate_sign_batch(payload, deadline=deadline)
+            
+            results = []
+            for outcome in outcomes:
+                if outcome.get('ok'):
+                    results.append({"x-s": outcome['x-s'], "x-t": outcome['x-t']})
+                else:
+                    results.append({"error": outcome.get('error', 'unknown error')})
+            
+            failed = sum(1 for r in results if 'error' in r)
+            logger.info(f"[尝试 {attempt}/{SIGN_MAX_ATTEMPTS}] ✅ 批量签名完成 - 成功 {len(results) - failed} 条，失败 {failed} 条")
+            return results
+            
+        except (PagePoolBusy, SignDeadlineExceeded):
+            raise
+        except Exception as e:
+            error_msg = str(e)
+            kind = classify_sign_error(e)
+            logger.warning(f"[尝试 {attempt}/{SIGN_MAX_ATTEMPTS}] ❌ 批量签名失败（{kind}）: {error_msg}")
+            
+            if attempt == SIGN_MAX_ATTEMPTS:
+                logger.error(f"重试了 {SIGN_MAX_ATTEMPTS} 次还是无法批量签名成功")
+                raise Exception(f"批量签名失败（重试{SIGN_MAX_ATTEMPTS}次）: {error_msg}")
+            
+            delay = min(retry_delay(attempt), max(0, deadline - time.time()))
+            if delay > 0:
+                logger.info(f"等待 {delay:.2f} 秒后重试...")
+                time.sleep(delay)
+    
+    raise Exception("重试了这么多次还是无法批量签名成功")
+
+
+def request_deadline():
+    """本次请求的截止时间：默认 SIGN_DEADLINE 秒，可用 X-Sign-Deadline 请求头（秒）覆盖"""
+    seconds = SIGN_DEADLINE
+    header = request.headers.get('X-Sign-Deadline')
+    if header:
+        try:
+            value = float(header)
+            if not math.isfinite(value):
+                raise ValueError(header)
+            seconds = min(max(value, 0.1), SIGN_DEADLINE_MAX)
+        except ValueError:
+            logger.warning(f"忽略无效的 X-Sign-Deadline: {header}")
+    return time.time() + seconds
+
+
+def deadline_response(e):
+    """签名超过总耗时上限时的响应"""
+    logger.warning(f"⚠️ 签名超时: {e}")
+    return jsonify({
+        'error': str(e),
+        'error_type': type(e).__name__,
+        'success': False,
+        'hint': '签名超时，请稍后重试或通过 X-Sign-Deadline 请求头放宽时限'
+    }), 504
+
+
+def circuit_open_response(e):
+    """熔断中的响应：503 + Retry-After"""
+    logger.warning(f"⚠️ 签名熔断中，拒绝请求: {e}")
+    response = jsonify({
+        'error': str(e),
+        'error_type': type(e).__name__,
+        'success': False,
+        'hint': f'签名服务正在恢复，请 {e.retry_after} 秒后重试'
+    })
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+
+def busy_response(e):
+    """签名服务繁忙时的响应：任务队列已满返回 429 + Retry-After，等待超时返回 503"""
+    logger.warning(f"⚠️ 签名服务繁忙: {e}")
+    response = jsonify({
+        'error': str(e),
+        'error_type': type(e).__name__,
+        'success': False,
+        'hint': '签名服务繁忙，请稍后重试'
+    })
+    if isinstance(e, SignQueueFull):
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    return response, 503
+
+
 @app.route('/sign', methods=['POST'])
 def sign():
     """
@@ -302,19 +3046,27 @@ def sign():
             }), 400
         
         # 记录请求信息
-        logger.info(f"收到签名请求:")
-        logger.info(f"  - URI: {uri}")
-        logger.info(f"  - 有 data: {bool(data)}")
+        logger.info(f"收到签名请求 - URI: {uri}，有 data: {bool(data)}")
         
         # 注意：根据官方实现，签名只依赖 uri 和 data
         # a1/web_session/web_id 不参与签名计算，只是请求时需要的 Cookie
+        # 开启多账号身份时，a1 决定在哪个浏览器上下文中签名
+        
+        # 客户端可以通过 Cache-Control: no-cache 要求重新签名
+        use_cache = 'no-cache' not in request.headers.get('Cache-Control', '').lower()
         
         # 生成签名（不需要传递 Cookie 参数）
-        result = generate_sign(uri, data, a1, web_session, web_id)
+        result = generate_sign(uri, data, a1, web_session, web_id, use_cache=use_cache, deadline=request_deadline())
         
         logger.info(f"✅ 签名请求处理成功")
         return jsonify(result)
         
+    except PagePoolBusy as e:
+        return busy_response(e)
+    except SignDeadlineExceeded as e:
+        return deadline_response(e)
+    except CircuitOpen as e:
+        return circuit_open_response(e)
     except Exception as e:
         logger.error(f"❌ 签名请求处理失败: {e}", exc_info=True)
         return jsonify({
@@ -324,12 +3076,100 @@ def sign():
             'hint': '即便做了重试，还是有可能会遇到签名失败的情况，请重试'
         }), 500
 
+@app.route('/sign/batch', methods=['POST'])
+def sign_batch():
+    """
+    批量生成小红书 API 签名（一次 HTTP 请求、一次页面调用完成多条签名）
+    
+    请求体：
+    {
+        "items": [
+            {"uri": "/api/sns/web/v1/feed", "data": {...}},
+            {"uri": "/api/sns/web/v2/note"}
+        ]
+    }
+    
+    返回（与 items 顺序一一对应，单条失败不影响其他条）：
+    {
+        "success": true,
+        "results": [
+            {"x-s": "签名值", "x-t": "时间戳字符串"},
+            {"error": "错误信息"}
+        ]
+    }
+    """
+    try:
+        # 格式错误的 JSON 和非对象的请求体都返回 400，而不是在后面访问字段时变成 500
+        json_data = request.get_json(silent=True)
+        if not isinstance(json_data, dict):
+            logger.error("批量签名请求体不是 JSON 对象")
+            return jsonify({
+                'error': 'Request body must be a JSON object',
+                'success': False
+            }), 400
+        
+        items = json_data.get('items')
+        if not isinstance(items, list) or not items:
+            logger.error("批量签名请求缺少 items")
+            return jsonify({
+                'error': 'items must be a non-empty array',
+                'success': False
+            }), 400
+        if not all(isinstance(item, dict) for item in items):
+            logger.error("批量签名请求的 items 中有非对象的条目")
+            return jsonify({
+                'error': 'items must be an array of objects',
+                'success': False
+            }), 400
+        
+        if len(items) > SIGN_BATCH_MAX:
+            return jsonify({
+                'error': f'too many items (max {SIGN_BATCH_MAX})',
+                'success': False
+            }), 400
+        
+        # 先在本地校验每一条，不合法的条目不发送到页面
+        results = [None] * len(items)
+        to_sign = []
+        for idx, item in enumerate(items):
+            if not item.get('uri'):
+                results[idx] = {'error': 'uri parameter is required'}
+            else:
+                to_sign.append((idx, item['uri'], item.get('data')))
+        
+        logger.info(f"收到批量签名请求: {len(items)} 条（有效 {len(to_sign)} 条）")
+        
+        if to_sign:
+            signed = generate_sign_batch([(uri, data) for _, uri, data in to_sign], deadline=request_deadline())
+            for (idx, _, _), result in zip(to_sign, signed):
+                results[idx] = result
+        
+        return jsonify({
+            'success': True,
+            'results': results
+        })
+        
+    except PagePoolBusy as e:
+        return busy_response(e)
+    except SignDeadlineExceeded as e:
+        return deadline_response(e)
+    except CircuitOpen as e:
+        return circuit_open_response(e)
+    except Exception as e:
+        logger.error(f"❌ 批量签名请求处理失败: {e}", exc_info=True)
+        return jsonify({
+            'error': str(e),
+            'error_type': type(e).__name__,
+            'success': False,
+            'hint': '即便做了重试，还是有可能会遇到签名失败的情况，请重试'
+        }), 500
+
 @app.errorhandler(404)
 def not_found(e):
     """404 错误处理"""
     return jsonify({
         'error': 'Endpoint not found',
-        'available_endpoints': ['/', '/health', '/sign']
+        'available_endpoints': ['/', '/health', '/a1', '/metrics', '/metrics/json', '/sign', '/sign/batch']
     }), 404
 
 @app.errorhandler(500)
@@ -350,17 +3190,36 @@ if __name__ == '__main__':
     logger.info("=" * 60)
     logger.info(f"启动端口: {port}")
     logger.info(f"环境变量 PORT: {os.environ.get('PORT', '未设置')}")
+    if WORKER_ID:
+        logger.info(f"Worker 编号: {WORKER_ID}（由 supervisor 管理）")
     
-    # 初始化浏览器
-    try:
-        init_browser()
-    except Exception as e:
-        logger.error(f"初始化失败，服务器将以降级模式启动: {e}")
+    # 在后台初始化浏览器（多进程模式下每个 worker 各自启动一个 Chromium）
+    # HTTP 服务器立即开始监听，初始化期间 /health 返回 initializing
+    start_browser_init()
+    
+    # 后台定期回收用久了的签名页面
+    if RECYCLE_AFTER_SIGNS or RECYCLE_AFTER_MINUTES or RECYCLE_RSS_MB:
+        gevent.spawn(page_recycler)
+    
+    # 后台保持预热好的备用上下文
+    if standby_pool.enabled:
+        gevent.spawn(standby_pool.run)
+    
+    # 根据负载自动调整页面数量
+    if autoscaler.enabled:
+        gevent.spawn(autoscaler.run)
     
     # 启动服务器
     # 使用 gevent 提高并发性能
     logger.info(f"正在启动 HTTP 服务器...")
-    server = pywsgi.WSGIServer(('0.0.0.0', port), app, log=logger)
+    if LISTEN_FD:
+        # 多进程模式：复用 supervisor 持有的监听 socket，所有 worker 共享同一端口
+        listener = socket.socket(fileno=int(LISTEN_FD))
+    else:
+        listener = ('0.0.0.0', port)
+    # 不输出 gevent 的访问日志：它在请求上下文结束后才写，不受 LOG_SUCCESS_SAMPLE_RATE 采样控制，
+    # 每个成功的请求都会多一行日志；请求结果已经记录在各接口自己的日志和 /metrics 中
+    server = pywsgi.WSGIServer(listener, app, log=None, error_log=logger)
     
     logger.info("=" * 60)
     logger.info(f"✅ 服务器启动成功！")
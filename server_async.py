@@ -0,0 +1,447 @@
+"""
+小红书签名服务器（asyncio 版本）
+与 server.py 提供相同的 /、/health、/a1、/sign 接口，
+但基于 ASGI + playwright.async_api，不使用 gevent monkey patch，
+多个签名页面上的 evaluate 可以真正并发执行。
+
+启动方式：
+  uvicorn server_async:app --host 0.0.0.0 --port 5005
+  python server_async.py
+"""
+
+from playwright.async_api import async_playwright
+import os
+import json
+import time
+import asyncio
+import logging
+import urllib.request
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 页面池配置（与 server.py 相同）
+PAGE_POOL_SIZE = max(1, int(os.environ.get('PAGE_POOL_SIZE', 1)))  # 预热页面数量
+PAGE_QUEUE_MAX = int(os.environ.get('PAGE_QUEUE_MAX', 64))  # 最多允许多少个请求排队等待页面
+PAGE_ACQUIRE_TIMEOUT = float(os.environ.get('PAGE_ACQUIRE_TIMEOUT', 10))  # 等待空闲页面的超时（秒）
+INIT_WAIT_TIMEOUT = float(os.environ.get('INIT_WAIT_TIMEOUT', 0))  # 初始化期间签名请求最多等待多久（秒），0 表示直接返回 503
+INIT_RETRY_INTERVAL = float(os.environ.get('INIT_RETRY_INTERVAL', 30))  # 初始化失败后多久重试（秒）
+
+STEALTH_JS_PATH = "stealth.min.js"
+STEALTH_CDN_URLS = [
+    "https://cdn.jsdelivr.net/gh/requireCool/stealth.min.js/stealth.min.js",
+    "https://fastly.jsdelivr.net/gh/requireCool/stealth.min.js/stealth.min.js",
+    "https://raw.githubusercontent.com/requireCool/stealth.min.js/main/stealth.min.js",
+]
+
+# 全局变量
+playwright_instance = None
+browser = None
+browser_context = None
+page_pool = None  # asyncio.Queue，空闲的签名页面
+pool_pages = []  # 所有已预热的签名页面
+pool_waiting = 0  # 正在等待空闲页面的请求数
+global_a1 = ""  # 当前浏览器中的 a1 值
+init_task = None  # 后台初始化任务（同一时间只有一个；不依赖 lifespan 事件，某些 ASGI 服务器不发送）
+init_error = None  # 最近一次初始化失败的原因，成功后清空
+
+
+class PagePoolBusy(Exception):
+    """页面池繁忙（等待队列已满或等待超时）"""
+
+
+class BrowserNotReady(Exception):
+    """浏览器尚未就绪（初始化中或初始化失败），调用方应在 retry_after 秒后重试"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def download_stealth_js():
+    """下载 stealth.min.js 到本地（同步执行，放在线程中调用）"""
+    if os.path.exists(STEALTH_JS_PATH):
+        logger.info("✅ stealth.min.js 已存在")
+        return STEALTH_JS_PATH
+
+    for idx, url in enumerate(STEALTH_CDN_URLS):
+        try:
+            logger.info(f"正在从源 {idx + 1}/{len(STEALTH_CDN_URLS)} 下载 stealth.min.js...")
+            with urllib.request.urlopen(url, timeout=30) as response:
+                content = response.read().decode('utf-8')
+            if len(content) < 100:
+                logger.warning(f"下载的文件太小，可能不是有效的脚本: {len(content)} bytes")
+                continue
+            with open(STEALTH_JS_PATH, 'w', encoding='utf-8') as f:
+                f.write(content)
+            logger.info(f"✅ stealth.min.js 下载成功 ({len(content)} bytes)")
+            return STEALTH_JS_PATH
+        except Exception as e:
+            logger.warning(f"从源 {idx + 1} 下载失败: {e}")
+
+    logger.error("❌ 所有下载源都失败了")
+    return None
+
+
+async def create_sign_page():
+    """创建一个预热好的签名页面（已访问首页，window._webmsxyw 可用）"""
+    page = await browser_context.new_page()
+    logger.info("正在访问小红书首页...")
+    await page.goto("https://www.xiaohongshu.com")
+    # 与 server.py 一致：访问首页后稍等一下，否则签名可能失败
+    await asyncio.sleep(1)
+    return page
+
+
+async def close_browser():
+    """关闭浏览器和 Playwright（初始化失败时释放已启动的部分），忽略关闭时的错误"""
+    global playwright_instance, browser, browser_context, page_pool, pool_pages
+
+    pool_pages = []
+    page_pool = None
+    browser_context = None
+    try:
+        if browser:
+            await browser.close()
+        if playwright_instance:
+            await playwright_instance.stop()
+    except Exception as e:
+        logger.warning(f"关闭浏览器失败（忽略）: {e}")
+    finally:
+        browser = None
+        playwright_instance = None
+
+
+async def init_browser():
+    """初始化浏览器环境并预热页面池，失败时关闭已启动的浏览器和 Playwright"""
+    global playwright_instance, browser, browser_context, page_pool, pool_pages, global_a1
+
+    try:
+        stealth_js_path = await asyncio.to_thread(download_stealth_js)
+        if not stealth_js_path:
+            logger.warning("⚠️ stealth.js 下载失败，将在没有反检测脚本的情况下启动")
+
+        logger.info("正在启动 playwright...")
+        playwright_instance = await async_playwright().start()
+
+        logger.info("正在启动 chromium 浏览器（无头模式）...")
+        browser = await playwright_instance.chromium.launch(headless=True)
+        browser_context = await browser.new_context()
+
+        if stealth_js_path:
+            await browser_context.add_init_script(path=stealth_js_path)
+            logger.info("✅ stealth.min.js 反检测脚本已加载")
+
+        # 并发预热所有页面
+        logger.info(f"正在预热 {PAGE_POOL_SIZE} 个签名页面...")
+        pages = await asyncio.gather(*[create_sign_page() for _ in range(PAGE_POOL_SIZE)])
+        page_pool = asyncio.Queue()
+        for page in pages:
+            page_pool.put_nowait(page)
+        pool_pages = list(pages)
+        logger.info(f"✅ 签名页面池已就绪（{len(pages)} 个页面）")
+
+        for cookie in await browser_context.cookies():
+            if cookie["name"] == "a1":
+                global_a1 = cookie["value"]
+                logger.info(f"✅ 浏览器已生成 a1: {global_a1[:20]}...")
+                break
+
+        if not global_a1:
+            logger.warning("⚠️ 未能获取到 a1 cookie，签名可能会失败")
+
+        logger.info("✅ 浏览器初始化完成，等待签名请求")
+
+    except Exception as e:
+        logger.error(f"❌ 浏览器初始化失败: {e}", exc_info=True)
+        await close_browser()
+        raise
+
+
+async def run_browser_init():
+    """后台初始化循环：直到浏览器初始化成功为止，失败后等待 INIT_RETRY_INTERVAL 秒重试"""
+    global init_error
+
+    while True:
+        try:
+            await init_browser()
+        except Exception as e:
+            init_error = str(e)
+            logger.error(f"初始化失败，服务器将以降级模式运行，{INIT_RETRY_INTERVAL:.0f} 秒后重试: {e}")
+        else:
+            init_error = None
+            return
+        await asyncio.sleep(INIT_RETRY_INTERVAL)
+
+
+def start_browser_init():
+    """在后台启动浏览器初始化（同一时间只有一个）"""
+    global init_task
+
+    if init_task is None or init_task.done():
+        init_task = asyncio.get_running_loop().create_task(run_browser_init())
+    return init_task
+
+
+async def ensure_browser():
+    """
+    签名接口需要浏览器已就绪
+    浏览器只在后台初始化，请求处理过程中从不启动浏览器：
+    初始化期间最多等待 INIT_WAIT_TIMEOUT 秒，仍未就绪抛出 BrowserNotReady（返回 503）
+    """
+    if pool_pages:
+        return
+    task = start_browser_init()
+    if INIT_WAIT_TIMEOUT > 0:
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout=INIT_WAIT_TIMEOUT)
+            return
+        except asyncio.TimeoutError:
+            pass
+    state = 'degraded' if init_error else 'initializing'
+    raise BrowserNotReady(f"浏览器尚未就绪（{state}）", retry_after=5)
+
+
+async def checkout_page():
+    """从页面池借出一个空闲页面，等待的请求数超过 PAGE_QUEUE_MAX 时直接拒绝"""
+    global pool_waiting
+
+    if pool_waiting >= PAGE_QUEUE_MAX:
+        raise PagePoolBusy(f"等待页面的请求过多（{pool_waiting}/{PAGE_QUEUE_MAX}）")
+
+    pool_waiting += 1
+    try:
+        return await asyncio.wait_for(page_pool.get(), timeout=PAGE_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise PagePoolBusy(f"等待空闲页面超时（{PAGE_ACQUIRE_TIMEOUT} 秒）")
+    finally:
+        pool_waiting -= 1
+
+
+async def generate_sign(uri, data):
+    """生成签名，失败时重试（与 server.py 的重试策略一致）"""
+    for attempt in range(10):
+        try:
+            logger.info(f"[尝试 {attempt + 1}/10] 执行签名 - URI: {uri}")
+            page = await checkout_page()
+            try:
+                encrypt_params = await page.evaluate(
+                    "([url, data]) => window._webmsxyw(url, data)",
+                    [uri, data]
+                )
+            finally:
+                page_pool.put_nowait(page)
+
+            result = {
+                "x-s": encrypt_params["X-s"],
+                "x-t": str(encrypt_params["X-t"])
+            }
+            logger.info(f"[尝试 {attempt + 1}/10] ✅ 签名生成成功 - x-t: {result['x-t']}")
+            return result
+
+        except PagePoolBusy:
+            raise
+        except Exception as e:
+            error_msg = str(e)
+            logger.warning(f"[尝试 {attempt + 1}/10] ❌ 签名生成失败: {error_msg}")
+            if attempt == 9:
+                logger.error("重试了 10 次还是无法签名成功")
+                raise Exception(f"签名失败（重试10次）: {error_msg}")
+            logger.info("等待 0.5 秒后重试...")
+            await asyncio.sleep(0.5)
+
+    raise Exception("重试了这么多次还是无法签名成功，寄寄寄")
+
+
+async def index(body):
+    """首页 - API 信息"""
+    return 200, {
+        'service': 'XHS Signature Server',
+        'description': '小红书 API 签名服务（asyncio 版本）',
+        'status': 'running',
+        'version': '1.0.0',
+        'endpoints': {
+            'health': {'path': '/health', 'method': 'GET', 'description': '健康检查'},
+            'sign': {
+                'path': '/sign',
+                'method': 'POST',
+                'description': '生成签名',
+                'parameters': {
+                    'uri': 'API 路径',
+                    'data': '请求数据（可选）',
+                    'a1': 'Cookie a1 字段',
+                    'web_session': 'Cookie web_session 字段'
+                }
+            }
+        }
+    }
+
+
+async def health(body):
+    """健康检查端点"""
+    browser_ready = bool(pool_pages)
+    return (200 if browser_ready else 503), {
+        'status': 'healthy' if browser_ready else ('degraded' if init_error else 'initializing'),
+        'browser_ready': browser_ready,
+        'init_error': init_error,
+        'a1': global_a1[:20] + "..." if global_a1 else "",
+        'page_pool': {
+            'size': len(pool_pages),
+            'idle': page_pool.qsize() if page_pool else 0,
+            'waiting': pool_waiting,
+            'max_waiting': PAGE_QUEUE_MAX
+        },
+        'pid': os.getpid(),
+        'timestamp': time.time()
+    }
+
+
+async def get_a1(body):
+    """获取当前浏览器的 a1 值"""
+    return 200, {'a1': global_a1}
+
+
+async def sign(body):
+    """生成小红书 API 签名（请求体和返回值与 server.py 的 /sign 完全一致）"""
+    try:
+        try:
+            json_data = json.loads(body) if body else None
+        except ValueError:
+            json_data = None
+        if not json_data:
+            logger.error("请求体为空")
+            return 400, {'error': 'Request body is required', 'success': False}
+        if not isinstance(json_data, dict):
+            logger.error("请求体不是 JSON 对象")
+            return 400, {'error': 'Request body must be a JSON object', 'success': False}
+
+        uri = json_data.get('uri', '')
+        data = json_data.get('data')
+        if not uri:
+            logger.error("缺少 uri 参数")
+            return 400, {'error': 'uri parameter is required', 'success': False}
+
+        logger.info(f"收到签名请求: URI: {uri}, 有 data: {bool(data)}")
+        result = await generate_sign(uri, data)
+        logger.info("✅ 签名请求处理成功")
+        return 200, result
+
+    except PagePoolBusy as e:
+        logger.warning(f"⚠️ 签名页面池繁忙: {e}")
+        return 503, {
+            'error': str(e),
+            'error_type': type(e).__name__,
+            'success': False,
+            'hint': '签名服务繁忙，请稍后重试'
+        }
+    except Exception as e:
+        logger.error(f"❌ 签名请求处理失败: {e}", exc_info=True)
+        return 500, {
+            'error': str(e),
+            'error_type': type(e).__name__,
+            'success': False,
+            'hint': '即便做了重试，还是有可能会遇到签名失败的情况，请重试'
+        }
+
+
+ROUTES = {
+    ('GET', '/'): index,
+    ('GET', '/health'): health,
+    ('GET', '/a1'): get_a1,
+    ('POST', '/sign'): sign,
+}
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def lifespan(receive, send):
+    """启动时在后台初始化浏览器（不阻塞启动），关闭时释放浏览器和 Playwright"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_browser_init()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if init_task is not None and not init_task.done():
+                init_task.cancel()
+                try:
+                    await init_task
+                except asyncio.CancelledError:
+                    pass
+            await close_browser()
+            logger.info("服务器已关闭")
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI 入口"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await send_json(send, 404, {
+            'error': 'Endpoint not found',
+            'available_endpoints': ['/', '/health', '/a1', '/sign']
+        })
+        return
+
+    body = await read_body(receive)
+    headers = ()
+    try:
+        if handler is sign:
+            await ensure_browser()
+        status, payload = await handler(body)
+    except BrowserNotReady as e:
+        logger.warning(f"⚠️ {e}")
+        status, payload = 503, {
+            'error': str(e),
+            'error_type': type(e).__name__,
+            'success': False,
+            'hint': f'签名服务正在启动，请 {e.retry_after} 秒后重试'
+        }
+        headers = [(b'retry-after', str(e.retry_after).encode())]
+    except Exception as e:
+        logger.error(f"Internal server error: {e}", exc_info=True)
+        status, payload = 500, {'error': 'Internal server error', 'message': str(e)}
+    await send_json(send, status, payload, headers)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 5005))
+    logger.info("=" * 60)
+    logger.info("小红书签名服务器（asyncio 版本）")
+    logger.info("=" * 60)
+    logger.info(f"启动端口: {port}")
+    uvicorn.run(app, host='0.0.0.0', port=port, log_level='info')
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+小红书签名服务器 - 多进程 supervisor
+预先创建监听 socket，启动 K 个 server.py worker 共享同一端口，
+每个 worker 各自运行 init_browser()（一个 worker 一个 Chromium），
+worker 崩溃后自动重启，并把每个 worker 的状态写入状态目录供 /health 汇总。
+
+使用方法：
+  python supervisor.py            # worker 数量默认为 CPU 核数
+  WORKERS=4 python supervisor.py
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import logging
+import tempfile
+import subprocess
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('supervisor')
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+
+# 重启退避：连续崩溃时等待时间逐步翻倍，最长 RESTART_BACKOFF_MAX 秒
+RESTART_BACKOFF_BASE = 1.0
+RESTART_BACKOFF_MAX = 30.0
+# worker 存活超过这么久就认为是健康的，重置退避
+WORKER_STABLE_SECONDS = 60
+
+
+class Worker:
+    """一个 server.py 子进程及其重启记录"""
+
+    def __init__(self, worker_id):
+        self.id = worker_id
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        self.last_exit_code = None
+        self.backoff = RESTART_BACKOFF_BASE
+        self.next_start_at = 0.0
+
+    def start(self, listener, status_dir):
+        env = dict(os.environ)
+        env.update({
+            'WORKER_ID': str(self.id),
+            'LISTEN_FD': str(listener.fileno()),
+            'SUPERVISOR_STATUS_DIR': status_dir,
+        })
+        self.process = subprocess.Popen(
+            [sys.executable, SERVER_SCRIPT],
+            env=env,
+            pass_fds=(listener.fileno(),)
+        )
+        self.started_at = time.time()
+        logger.info(f"✅ worker {self.id} 已启动 (pid={self.process.pid})")
+
+    def poll(self):
+        """检查进程是否退出，退出则安排重启，返回 True 表示进程仍在运行"""
+        if self.process is None:
+            return False
+        exit_code = self.process.poll()
+        if exit_code is None:
+            if time.time() - self.started_at > WORKER_STABLE_SECONDS:
+                self.backoff = RESTART_BACKOFF_BASE
+            return True
+
+        logger.warning(f"❌ worker {self.id} (pid={self.process.pid}) 已退出，退出码: {exit_code}")
+        self.last_exit_code = exit_code
+        self.process = None
+        self.next_start_at = time.time() + self.backoff
+        logger.info(f"worker {self.id} 将在 {self.backoff:.0f} 秒后重启")
+        self.backoff = min(self.backoff * 2, RESTART_BACKOFF_MAX)
+        return False
+
+    def status(self):
+        return {
+            'id': self.id,
+            'pid': self.process.pid if self.process else None,
+            'alive': self.process is not None,
+            'started_at': self.started_at,
+            'restarts': self.restarts,
+            'last_exit_code': self.last_exit_code
+        }
+
+
+def create_listener(port):
+    """创建由 supervisor 持有的监听 socket，子进程通过文件描述符继承"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('0.0.0.0', port))
+    listener.listen(1024)
+    listener.set_inheritable(True)
+    return listener
+
+
+def write_status(status_dir, workers):
+    """写入 supervisor 状态文件（先写临时文件再替换）"""
+    status = {
+        'supervisor_pid': os.getpid(),
+        'updated_at': time.time(),
+        'workers': [worker.status() for worker in workers]
+    }
+    path = os.path.join(status_dir, 'supervisor.json')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)
+
+
+def main():
+    port = int(os.environ.get('PORT', 5005))
+    worker_count = int(os.environ.get('WORKERS', os.cpu_count() or 1))
+    status_dir = os.environ.get('SUPERVISOR_STATUS_DIR') or tempfile.mkdtemp(prefix='xhs-sign-')
+
+    logger.info("=" * 60)
+    logger.info("小红书签名服务器 - 多进程模式")
+    logger.info("=" * 60)
+    logger.info(f"启动端口: {port}")
+    logger.info(f"worker 数量: {worker_count}")
+    logger.info(f"状态目录: {status_dir}")
+
+    # 所有 worker 使用同一个流量录制指纹的盐，写入同一个 TRACE_FILE 的请求之间可以比较指纹
+    os.environ.setdefault('TRACE_SALT', os.urandom(16).hex())
+
+    listener = create_listener(port)
+    workers = [Worker(i) for i in range(worker_count)]
+    for worker in workers:
+        worker.start(listener, status_dir)
+
+    stopping = False
+
+    def handle_stop(signum, frame):
+        nonlocal stopping
+        logger.info(f"收到停止信号 ({signum})，正在关闭所有 worker...")
+        stopping = True
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    while not stopping:
+        now = time.time()
+        for worker in workers:
+            if not worker.poll() and now >= worker.next_start_at:
+                worker.restarts += 1
+                worker.start(listener, status_dir)
+        try:
+            write_status(status_dir, workers)
+        except OSError as e:
+            logger.warning(f"写入 supervisor 状态失败: {e}")
+        time.sleep(1)
+
+    # 先发送 SIGTERM，等待一段时间后强制结束
+    for worker in workers:
+        if worker.process:
+            worker.process.terminate()
+    deadline = time.time() + 10
+    for worker in workers:
+        if worker.process:
+            try:
+                worker.process.wait(timeout=max(0.1, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+
+    listener.close()
+    logger.info("服务器已关闭")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+签名服务单元测试的公共夹具
+用假的页面和上下文代替 Chromium，所有模块级状态都通过 monkeypatch 设置，测试结束后自动恢复
+"""
+
+import os
+import queue
+import sys
+
+# 导入 server 之前设置：关闭合并窗口和 CDP 快速路径（假页面没有 CDP 会话），不读写保存的浏览器身份
+os.environ.setdefault('SIGN_COALESCE_WINDOW_MS', '0')
+os.environ.setdefault('SIGN_FAST_PATH', '0')
+os.environ.setdefault('LOG_SUCCESS_SAMPLE_RATE', '0')
+os.environ.setdefault('STORAGE_STATE_PATH', '')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import server
+from fakes import FakePage, FakePlaywright
+
+
+@pytest.fixture
+def sign_pool(monkeypatch):
+    """两个假页面组成的共享页面池，浏览器状态为 ready；熔断器、缓存和相同请求合并都是新的"""
+    pages = [FakePage(), FakePage()]
+    monkeypatch.setattr(server, 'browser_context', pages[0].context)
+    monkeypatch.setattr(server, 'pool_pages', pages)
+    monkeypatch.setattr(server, 'context_page', pages[0])
+    monkeypatch.setattr(server, 'page_workers', [])
+    monkeypatch.setattr(server, 'sign_jobs', queue.Queue(maxsize=server.PAGE_QUEUE_MAX))
+    monkeypatch.setattr(server, 'sign_cache', server.SignCache(10, 1000, 1024 * 1024))
+    monkeypatch.setattr(server, 'inflight_signs', {})
+    monkeypatch.setattr(server, 'sign_breaker', server.CircuitBreaker(3, 0.05, 1, recover=lambda: None))
+    monkeypatch.setattr(server, 'browser_state', 'ready')
+    monkeypatch.setattr(server, 'init_greenlet', None)
+    monkeypatch.setattr(server, 'browser_instance', None)
+    monkeypatch.setattr(server, 'playwright_instance', None)
+    server.start_page_workers(pages)
+    server.browser_ready_event.set()
+    yield pages
+    for worker in server.page_workers:
+        worker.stop()
+    if server.sign_breaker.recovery is not None:
+        server.sign_breaker.recovery.kill()
+    server.browser_ready_event.clear()
+
+
+@pytest.fixture
+def client(sign_pool):
+    return server.app.test_client()
+
+
+@pytest.fixture
+def fake_playwright(monkeypatch):
+    """让 init_browser() 启动假的 Playwright 和 Chromium，初始化改动的模块级状态在测试结束后恢复"""
+    for name in ('playwright_instance', 'browser_instance', 'browser_context', 'context_page', 'global_a1',
+                 'pool_pages', 'page_workers', 'stealth_script_path', 'init_mode', 'browser_state', 'init_greenlet'):
+        monkeypatch.setattr(server, name, getattr(server, name))
+    monkeypatch.setattr(server, 'sync_playwright', FakePlaywright)
+    monkeypatch.setattr(server, 'download_stealth_js', lambda: None)
+    yield
+    for worker in server.page_workers:
+        worker.stop()
@@ -0,0 +1,204 @@
+"""
+假的签名页面和浏览器上下文，代替 Chromium 供单元测试使用
+"""
+
+import json
+import time
+
+import server
+
+
+def default_signer(url, data):
+    """假的 window._webmsxyw"""
+    return {'X-s': f'XYW_{url}', 'X-t': int(time.time() * 1000)}
+
+
+def slow_signer(url, data):
+    """每次签名耗时 0.3 秒的 window._webmsxyw，用于测试截止时间、合并和繁忙"""
+    time.sleep(0.3)
+    return {'X-s': 'XYW_slow', 'X-t': int(time.time() * 1000)}
+
+
+class FakeContext:
+    """假的浏览器上下文：只保存 cookie 和 localStorage"""
+
+    def __init__(self, cookies=None, origins=None):
+        self.cookies_list = list(cookies or [{'name': 'a1', 'value': 'server-a1', 'domain': '.xiaohongshu.com', 'path': '/'}])
+        self.origins = list(origins or [])
+        self.closed = False
+
+    def cookies(self):
+        return list(self.cookies_list)
+
+    def add_cookies(self, cookies):
+        names = {cookie['name'] for cookie in cookies}
+        self.cookies_list = [c for c in self.cookies_list if c['name'] not in names] + list(cookies)
+
+    def clear_cookies(self):
+        self.cookies_list = []
+
+    def storage_state(self, path=None):
+        state = {'cookies': self.cookies(), 'origins': list(self.origins)}
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+        return state
+
+    def add_init_script(self, script=None, path=None):
+        pass
+
+    def route(self, url, handler):
+        pass
+
+    def new_page(self):
+        return FakePage(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakePage:
+    """
+    假的签名页面
+    evaluate 只接受服务端真正发送的脚本：BATCH_SIGN_JS 按它的语义逐条调用 signer（即 window._webmsxyw），
+    CLEAR_STORAGE_JS 清空上下文的 localStorage
+    - signer 为 None 表示签名函数丢失，goto 重新访问首页后换回 site_signer（首页定义的签名函数）
+    - failures 中的错误信息会在接下来的调用中依次整体抛出（模拟页面跳转等）
+    - FakePage.fail_next 大于 0 时，接下来的几次调用（不论落在哪个页面）整体抛出偶发错误，走重试路径
+    """
+    fail_next = 0
+
+    def __init__(self, context=None):
+        self.context = context or FakeContext()
+        self.site_signer = default_signer
+        self.signer = default_signer
+        self.failures = []
+        self.calls = 0
+        self.gotos = 0
+        self.closed = False
+
+    def evaluate(self, expression, items=None):
+        if expression == server.CLEAR_STORAGE_JS:
+            self.context.origins = []
+            return None
+        assert expression == server.BATCH_SIGN_JS, "假页面只支持 BATCH_SIGN_JS 和 CLEAR_STORAGE_JS"
+        self.calls += 1
+        if FakePage.fail_next > 0:
+            FakePage.fail_next -= 1
+            raise Exception('fake page: transient failure')
+        if self.failures:
+            raise Exception(self.failures.pop(0))
+        if self.signer is None:
+            raise Exception('window._webmsxyw is not a function')
+        results = []
+        for url, data in items:
+            try:
+                result = self.signer(url, data)
+                results.append({'ok': True, 'x-s': result['X-s'], 'x-t': str(result['X-t'])})
+            except Exception as e:
+                results.append({'ok': False, 'error': str(e)})
+        return results
+
+    def goto(self, url):
+        self.gotos += 1
+        self.signer = self.site_signer
+
+    def wait_for_function(self, expression, timeout=None):
+        if self.signer is None:
+            raise Exception('Timeout waiting for window._webmsxyw')
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCDPSession:
+    """
+    假的 CDP 会话，只支持签名快速路径用到的 Runtime.evaluate 和 Runtime.callFunctionOn
+    - 每次解析 window._webmsxyw 都发一个新的 objectId，之前的句柄全部失效
+    - invalidate() 让现有句柄失效但不触发 framenavigated（跳转事件还没到达）
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.object_id = None
+        self.resolved = 0
+
+    def invalidate(self):
+        self.object_id = None
+
+    def send(self, method, params):
+        if method == 'Runtime.evaluate':
+            assert params['expression'] == 'window._webmsxyw'
+            if self.page.signer is None:
+                return {'result': {'type': 'undefined'}}
+            self.resolved += 1
+            self.object_id = f'sign-{self.resolved}'
+            return {'result': {'type': 'function', 'objectId': self.object_id}}
+        assert method == 'Runtime.callFunctionOn', f"假 CDP 会话不支持 {method}"
+        assert params['functionDeclaration'] == server.FAST_SIGN_FN
+        self.page.calls += 1
+        if params['objectId'] != self.object_id:
+            raise Exception('Protocol error (Runtime.callFunctionOn): Could not find object with given id')
+        results = []
+        for url, data in json.loads(params['arguments'][0]['value']):
+            try:
+                result = self.page.signer(url, data)
+                results.append({'ok': True, 'x-s': result['X-s'], 'x-t': str(result['X-t'])})
+            except Exception as e:
+                results.append({'ok': False, 'error': str(e)})
+        return {'result': {'type': 'string', 'value': json.dumps(results)}}
+
+
+class FakeCDPPage(FakePage):
+    """支持 CDP 会话和 framenavigated 事件的假签名页面；evaluate 仍可用于回退"""
+
+    def __init__(self, context=None):
+        super().__init__(context)
+        self.main_frame = object()
+        self.handlers = {}
+        self.cdp = FakeCDPSession(self)
+        self.context.new_cdp_session = lambda page: page.cdp
+
+    def on(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def goto(self, url):
+        super().goto(url)
+        self.cdp.invalidate()
+        for handler in self.handlers.get('framenavigated', []):
+            handler(self.main_frame)
+
+
+class FakeBrowser:
+    """假的 Chromium：new_context 与 Playwright 一样，storage_state 可以是文件路径或字典"""
+
+    def __init__(self):
+        self.contexts = []
+
+    def new_context(self, storage_state=None):
+        if isinstance(storage_state, str):
+            with open(storage_state, encoding='utf-8') as f:
+                storage_state = json.load(f)
+        state = storage_state or {}
+        context = FakeContext(state.get('cookies'), state.get('origins'))
+        self.contexts.append(context)
+        return context
+
+    def close(self):
+        pass
+
+
+class FakePlaywright:
+    """sync_playwright() 的替身"""
+
+    def __init__(self):
+        self.chromium = self
+
+    def start(self):
+        return self
+
+    def launch(self, headless=True):
+        return FakeBrowser()
+
+    def stop(self):
+        pass
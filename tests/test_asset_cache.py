@@ -0,0 +1,160 @@
+"""静态资源磁盘缓存的请求拦截"""
+
+import pytest
+
+import server
+
+SCRIPT_URL = 'https://fe-static.xhscdn.com/formula-static/xhs-pc-web/public/vendor.js'
+SCRIPT_HEADERS = {
+    'content-type': 'application/javascript',
+    'access-control-allow-origin': '*',
+    'timing-allow-origin': '*',
+    'etag': '"v1"',
+    'set-cookie': 'should-not-be-cached=1',
+}
+
+
+class FakeRequest:
+    def __init__(self, url):
+        self.url = url
+        self.method = 'GET'
+        self.resource_type = 'script'
+        self.headers = {'origin': 'https://www.xiaohongshu.com'}
+
+
+class FakeResponse:
+    def __init__(self, status=200, body=b'console.log(1)', headers=None):
+        self.status = status
+        self.ok = 200 <= status < 300
+        self.headers = dict(SCRIPT_HEADERS if headers is None else headers)
+        self._body = body
+
+    def body(self):
+        return self._body
+
+
+class FakeRoute:
+    """记录拦截函数对请求的处理方式"""
+
+    def __init__(self, url, response=None, error=None):
+        self.request = FakeRequest(url)
+        self.response = response
+        self.error = error
+        self.fulfilled = None
+        self.aborted = None
+
+    def fetch(self, headers=None):
+        if self.error:
+            raise Exception(self.error)
+        return self.response
+
+    def fulfill(self, **kwargs):
+        self.fulfilled = kwargs
+
+    def abort(self, error_code=None):
+        self.aborted = error_code or 'failed'
+
+    def fallback(self):
+        pass
+
+
+@pytest.fixture
+def asset_cache(tmp_path, monkeypatch):
+    cache = server.AssetCache(str(tmp_path), 3600)
+    monkeypatch.setattr(server, 'asset_cache', cache)
+    return cache
+
+
+def test_cached_script_keeps_cors_headers(asset_cache):
+    server.handle_asset_route(FakeRoute(SCRIPT_URL, FakeResponse()))
+
+    route = FakeRoute(SCRIPT_URL, error='network should not be used')
+    server.handle_asset_route(route)
+
+    assert asset_cache.hits == 1
+    assert route.fulfilled['body'] == b'console.log(1)'
+    assert route.fulfilled['headers'] == {
+        'content-type': 'application/javascript',
+        'access-control-allow-origin': '*',
+        'timing-allow-origin': '*',
+    }
+
+
+def test_revalidated_and_stale_scripts_keep_cors_headers(asset_cache):
+    server.handle_asset_route(FakeRoute(SCRIPT_URL, FakeResponse()))
+    asset_cache.revalidate_seconds = 0
+
+    not_modified = FakeRoute(SCRIPT_URL, FakeResponse(status=304, body=b'', headers={}))
+    server.handle_asset_route(not_modified)
+    offline = FakeRoute(SCRIPT_URL, error='net::ERR_INTERNET_DISCONNECTED')
+    server.handle_asset_route(offline)
+
+    for route in (not_modified, offline):
+        assert route.fulfilled['body'] == b'console.log(1)'
+        assert route.fulfilled['headers']['access-control-allow-origin'] == '*'
+
+
+def test_failed_fetch_without_cache_aborts_request(asset_cache):
+    route = FakeRoute(SCRIPT_URL, error='net::ERR_CONNECTION_RESET')
+
+    server.handle_asset_route(route)
+
+    assert route.aborted == 'failed'
+    assert route.fulfilled is None
+
+
+def test_old_index_entries_still_served(asset_cache):
+    server.handle_asset_route(FakeRoute(SCRIPT_URL, FakeResponse()))
+    entry = asset_cache.index[SCRIPT_URL]
+    del entry['headers']
+    entry['content_type'] = 'application/javascript'
+
+    route = FakeRoute(SCRIPT_URL)
+    server.handle_asset_route(route)
+
+    assert route.fulfilled['headers'] == {'content-type': 'application/javascript'}
+
+
+def test_failed_store_still_fulfills_response(asset_cache, monkeypatch):
+    def disk_full(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(asset_cache, 'store', disk_full)
+    route = FakeRoute(SCRIPT_URL, FakeResponse())
+
+    server.handle_asset_route(route)
+
+    assert route.fulfilled['body'] == b'console.log(1)'
+    assert route.aborted is None
+
+
+def test_temp_files_are_per_process(asset_cache, monkeypatch):
+    replaced = []
+    real_replace = server.os.replace
+
+    def replace(src, dst):
+        replaced.append(src)
+        real_replace(src, dst)
+
+    monkeypatch.setattr(server.os, 'replace', replace)
+
+    asset_cache.store(SCRIPT_URL, b'console.log(1)', SCRIPT_HEADERS)
+
+    assert replaced and all(f'.{server.os.getpid()}.tmp' in src for src in replaced)
+
+
+def test_workers_sharing_a_directory_keep_each_others_entries(asset_cache, tmp_path):
+    other = server.AssetCache(str(tmp_path), 3600)
+    other_url = SCRIPT_URL.replace('vendor', 'main')
+
+    server.handle_asset_route(FakeRoute(SCRIPT_URL, FakeResponse()))
+    other.store(other_url, b'console.log(2)', SCRIPT_HEADERS)
+    asset_cache.touch(SCRIPT_URL)
+
+    on_disk = server.AssetCache(str(tmp_path), 3600).index
+    assert set(on_disk) == {SCRIPT_URL, other_url}
+
+    # 另一个 worker 缓存的资源不需要重新下载
+    route = FakeRoute(other_url, error='network should not be used')
+    server.handle_asset_route(route)
+    assert route.fulfilled['body'] == b'console.log(2)'
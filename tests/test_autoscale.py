@@ -0,0 +1,88 @@
+"""共享页面池的自动扩缩容决策"""
+
+from collections import deque
+
+import gevent
+import pytest
+
+import server
+from fakes import FakeContext
+
+
+@pytest.fixture
+def scaler(sign_pool, monkeypatch):
+    """两个页面的页面池，上下限 1～4；新建的上下文都是假的，主机内存充足"""
+    memory = {'available_mb': 4096}
+    monkeypatch.setattr(server, 'new_browser_context', lambda storage_state=None, block=True: FakeContext())
+    monkeypatch.setattr(server, 'host_mem_available_mb', lambda: memory['available_mb'])
+    monkeypatch.setattr(server, 'page_job_waits', deque())
+    monkeypatch.setattr(server, 'page_job_runs', deque())
+    scaler = server.Autoscaler(1, 4)
+    scaler.memory = memory
+    return scaler
+
+
+def interval(scaler, wait_ms, run_ms, jobs=20):
+    """模拟一个检查周期：jobs 个任务，每个排队 wait_ms、执行 run_ms，然后做一次决策"""
+    server.page_job_waits.extend([wait_ms / 1000] * jobs)
+    server.page_job_runs.extend([run_ms / 1000] * jobs)
+    scaler.evaluate()
+    return len(server.page_workers)
+
+
+def test_scale_up_needs_consecutive_slow_intervals(scaler):
+    assert interval(scaler, wait_ms=500, run_ms=50) == 2
+    assert interval(scaler, wait_ms=1, run_ms=50) == 2
+    assert interval(scaler, wait_ms=500, run_ms=50) == 2
+    assert interval(scaler, wait_ms=500, run_ms=50) == 3
+
+    decision = scaler.decisions[-1]
+    assert (decision['action'], decision['from'], decision['to']) == ('scale_up', 2, 3)
+    assert server.pool_pages[-1] is server.page_workers[-1].page
+
+
+def test_cooldown_blocks_back_to_back_scaling(scaler):
+    for _ in range(2):
+        interval(scaler, wait_ms=500, run_ms=50)
+    assert len(server.page_workers) == 3
+
+    for _ in range(3):
+        assert interval(scaler, wait_ms=500, run_ms=50) == 3
+
+    scaler.last_scaled_at -= server.AUTOSCALE_COOLDOWN
+    assert interval(scaler, wait_ms=500, run_ms=50) == 4
+
+
+def test_saturated_pages_do_not_scale_up(scaler):
+    for _ in range(4):
+        assert interval(scaler, wait_ms=500, run_ms=server.AUTOSCALE_MAX_EVAL_P95_MS + 100) == 2
+    assert scaler.up_streak == 0
+
+
+def test_scale_down_is_slower_and_keeps_the_health_check_page(scaler):
+    newest = server.page_workers[1].page
+    for _ in range(server.AUTOSCALE_DOWN_INTERVALS - 1):
+        assert interval(scaler, wait_ms=1, run_ms=1, jobs=1) == 2
+    assert interval(scaler, wait_ms=1, run_ms=1, jobs=1) == 1
+
+    assert server.page_workers[0].page is server.context_page
+    assert server.pool_pages == [server.context_page]
+    gevent.sleep(0)
+    assert newest.closed
+
+    # 已经是下限，不再缩容
+    for _ in range(server.AUTOSCALE_DOWN_INTERVALS):
+        scaler.last_scaled_at = 0
+        assert interval(scaler, wait_ms=1, run_ms=1, jobs=1) == 1
+
+
+def test_low_memory_scales_down_at_once_and_blocks_scale_up(scaler):
+    scaler.memory['available_mb'] = server.AUTOSCALE_MIN_FREE_MB - 1
+
+    assert interval(scaler, wait_ms=500, run_ms=50) == 1
+    assert scaler.decisions[-1]['action'] == 'scale_down'
+
+    scaler.last_scaled_at = 0
+    for _ in range(3):
+        assert interval(scaler, wait_ms=500, run_ms=50) == 1
+    assert scaler.up_streak == 0
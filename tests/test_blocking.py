@@ -0,0 +1,39 @@
+"""资源拦截档位验证"""
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def block_profile(monkeypatch):
+    monkeypatch.setattr(server, 'blocked_resource_types', {'image', 'font'})
+    monkeypatch.setattr(server, 'blocked_url_patterns', ['google-analytics.com'])
+    monkeypatch.setattr(server, 'block_report', None)
+
+
+def fake_measure(blocked_error=None):
+    def measure(block):
+        if block and blocked_error:
+            raise Exception(blocked_error)
+        return (20, 400000, True, None) if not block else (8, 100000, True, None)
+    return measure
+
+
+def test_blocking_disabled_when_blocked_page_fails_to_load(block_profile, monkeypatch):
+    monkeypatch.setattr(server, 'measure_sign_page_load', fake_measure('Timeout waiting for window._webmsxyw'))
+
+    server.validate_block_profile()
+
+    assert not server.blocking_enabled()
+    assert server.block_report['sign_ok'] is False
+    assert '_webmsxyw' in server.block_report['error']
+
+
+def test_blocking_kept_when_validation_passes(block_profile, monkeypatch):
+    monkeypatch.setattr(server, 'measure_sign_page_load', fake_measure())
+
+    server.validate_block_profile()
+
+    assert server.blocked_resource_types == {'image', 'font'}
+    assert server.block_report['requests']['saved'] == 12
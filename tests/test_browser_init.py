@@ -0,0 +1,74 @@
+"""浏览器初始化和重启"""
+
+import json
+import os
+
+import pytest
+
+import server
+from fakes import FakeContext, FakePage
+
+
+def test_failed_restart_is_retried_in_background(client, monkeypatch):
+    attempts = []
+
+    def flaky_init_browser():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise Exception("chromium crashed")
+        pages = [FakePage()]
+        server.start_page_workers(pages)
+        server.pool_pages = pages
+        server.context_page = pages[0]
+
+    monkeypatch.setattr(server, 'init_browser', flaky_init_browser)
+    monkeypatch.setattr(server, 'INIT_RETRY_INTERVAL', 0.01)
+
+    with pytest.raises(Exception, match='chromium crashed'):
+        server.restart_browser()
+    assert server.browser_state == 'degraded'
+    assert client.post('/sign', json={'uri': '/api/x'}).status_code == 503
+
+    assert server.browser_ready_event.wait(2)
+    assert server.browser_state == 'ready'
+    assert len(attempts) == 2
+    assert client.post('/sign', json={'uri': '/api/x'}).status_code == 200
+
+
+def test_corrupt_storage_state_falls_back_to_cold_start(fake_playwright, tmp_path, monkeypatch):
+    state_path = tmp_path / 'storage_state.json'
+    state_path.write_text('{"cookies": [', encoding='utf-8')
+    (tmp_path / 'storage_state.json.meta.json').write_text('{"a1": "old-a1"}', encoding='utf-8')
+    monkeypatch.setattr(server, 'STORAGE_STATE_PATH', str(state_path))
+
+    server.init_browser()
+
+    assert server.init_mode == 'cold'
+    assert server.context_page is not None
+    assert (tmp_path / 'storage_state.json.bad').read_text(encoding='utf-8') == '{"cookies": ['
+    # 冷启动成功后重新保存了可用的身份，下次启动可以正常恢复
+    assert json.loads(state_path.read_text(encoding='utf-8'))['cookies']
+    assert json.loads((tmp_path / 'storage_state.json.meta.json').read_text(encoding='utf-8'))['a1'] == 'server-a1'
+
+
+def test_save_identity_writes_through_per_process_temp_files(tmp_path, monkeypatch):
+    state_path = tmp_path / 'storage_state.json'
+    monkeypatch.setattr(server, 'STORAGE_STATE_PATH', str(state_path))
+    monkeypatch.setattr(server, 'browser_context', FakeContext())
+    replaced = []
+    real_replace = os.replace
+
+    def replace(src, dst):
+        replaced.append((os.path.basename(src), os.path.basename(dst)))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(server.os, 'replace', replace)
+
+    server.save_identity({'a1': 'server-a1'})
+
+    pid = os.getpid()
+    assert replaced == [
+        (f'storage_state.json.{pid}.tmp', 'storage_state.json'),
+        (f'storage_state.json.meta.json.{pid}.tmp', 'storage_state.json.meta.json'),
+    ]
+    assert json.loads((tmp_path / 'storage_state.json.meta.json').read_text(encoding='utf-8')) == {'a1': 'server-a1'}
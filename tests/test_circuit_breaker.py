@@ -0,0 +1,88 @@
+"""熔断器：哪些失败计入熔断"""
+
+import gevent
+import pytest
+
+import server
+from fakes import slow_signer
+
+
+def broken_signer(url, data):
+    raise Exception('signature error')
+
+
+def test_deadline_exceeded_does_not_trip_breaker(client, sign_pool):
+    for page in sign_pool:
+        page.signer = slow_signer
+
+    for i in range(5):
+        response = client.post('/sign', json={'uri': f'/api/{i}'}, headers={'X-Sign-Deadline': '0.1'})
+        assert response.status_code == 504
+
+    response = client.post('/sign/batch', json={'items': [{'uri': '/api/batch'}]}, headers={'X-Sign-Deadline': '0.1'})
+    assert response.status_code == 504
+    assert server.sign_breaker.state == 'closed'
+    assert server.sign_breaker.consecutive_failures == 0
+
+
+def test_sign_failures_trip_breaker(client, sign_pool, monkeypatch):
+    monkeypatch.setattr(server, 'SIGN_MAX_ATTEMPTS', 1)
+    for page in sign_pool:
+        page.signer = broken_signer
+
+    statuses = [client.post('/sign', json={'uri': f'/api/{i}'}).status_code for i in range(4)]
+
+    assert statuses == [500, 500, 500, 503]
+    assert server.sign_breaker.state == 'open'
+
+
+def test_recovery_checks_every_page(sign_pool, monkeypatch):
+    restarts = []
+    monkeypatch.setattr(server, 'restart_browser', lambda: restarts.append(1))
+
+    server.recover_sign_backend()
+
+    assert restarts == []
+    assert [page.gotos for page in sign_pool] == [1, 1]
+    assert all(page.calls == 1 for page in sign_pool)
+
+
+def test_recovery_restarts_browser_when_one_page_stays_broken(sign_pool, monkeypatch):
+    restarts = []
+    monkeypatch.setattr(server, 'restart_browser', lambda: restarts.append(1))
+    sign_pool[1].site_signer = broken_signer
+
+    server.recover_sign_backend()
+
+    assert restarts == [1]
+
+
+def test_recovery_retries_later_when_page_is_busy(sign_pool, monkeypatch):
+    restarts = []
+    monkeypatch.setattr(server, 'restart_browser', lambda: restarts.append(1))
+    monkeypatch.setattr(server, 'BREAKER_RECOVERY_TIMEOUT', 0.05)
+    for page in sign_pool:
+        page.signer = slow_signer
+    # 两个页面都在执行一个很慢的签名任务
+    running = [gevent.spawn(server.evaluate_sign_batch, [[f'/api/{i}', None]]) for i in range(2)]
+    gevent.sleep(0)
+
+    with pytest.raises(server.PagePoolBusy):
+        server.recover_sign_backend()
+
+    assert restarts == []
+    gevent.joinall(running)
+
+
+def test_interrupted_batch_probe_is_released(sign_pool):
+    server.sign_breaker.state = 'half_open'
+    for page in sign_pool:
+        page.signer = slow_signer
+
+    probe = gevent.spawn(server.generate_sign_batch, [('/api/probe', None)])
+    gevent.sleep(0.05)
+    assert server.sign_breaker.probes_in_flight == 1
+    probe.kill()
+
+    assert server.sign_breaker.probes_in_flight == 0
+    assert server.sign_breaker.acquire() is True
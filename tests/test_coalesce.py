@@ -0,0 +1,53 @@
+"""自动合并并发的单条签名"""
+
+import copy
+
+import gevent
+import pytest
+
+import server
+from fakes import slow_signer
+
+
+@pytest.fixture
+def window(sign_pool, monkeypatch):
+    """一个还没发送的合并窗口"""
+    batch = [server.PendingSign(f'/api/{i}', None) for i in range(3)]
+    monkeypatch.setattr(server, 'coalesce_pending', list(batch))
+    monkeypatch.setattr(server, 'coalesce_timer', None)
+    monkeypatch.setattr(server, 'coalesce_stats', copy.deepcopy(server.coalesce_stats))
+    return batch
+
+
+def test_batch_results_are_distributed(window):
+    batches = server.coalesce_stats['batches']
+
+    server.flush_coalesced_signs()
+
+    assert [pending.result.get(timeout=0)['x-s'] for pending in window] == ['XYW_/api/0', 'XYW_/api/1', 'XYW_/api/2']
+    assert server.coalesce_stats['batches'] == batches + 1
+
+
+def test_killed_flusher_fails_every_waiter(window, sign_pool):
+    for page in sign_pool:
+        page.signer = slow_signer
+    flusher = gevent.spawn(server.flush_coalesced_signs)
+    gevent.sleep(0.01)
+
+    flusher.kill()
+
+    for pending in window:
+        assert pending.result.ready()
+        with pytest.raises(server.PagePoolBusy):
+            pending.result.get(timeout=0)
+
+
+def test_short_outcome_list_fails_the_rest(window, monkeypatch):
+    monkeypatch.setattr(server, 'evaluate_sign_batch', lambda payload, deadline=None: [{'ok': True, 'x-s': 'XYW', 'x-t': 1}])
+
+    server.flush_coalesced_signs()
+
+    assert window[0].result.get(timeout=0)['x-s'] == 'XYW'
+    for pending in window[1:]:
+        with pytest.raises(server.PagePoolBusy):
+            pending.result.get(timeout=0)
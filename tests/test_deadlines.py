@@ -0,0 +1,64 @@
+"""请求截止时间（X-Sign-Deadline）"""
+
+import math
+import time
+
+import gevent
+import pytest
+
+import server
+from fakes import slow_signer
+
+
+def test_sign_returns_at_deadline_without_coalesce_window(client, sign_pool):
+    for page in sign_pool:
+        page.signer = slow_signer
+
+    started = time.perf_counter()
+    response = client.post('/sign', json={'uri': '/api/slow'}, headers={'X-Sign-Deadline': '0.1'})
+
+    assert response.status_code == 504
+    assert time.perf_counter() - started < 0.25
+
+
+@pytest.mark.parametrize('header', ['nan', 'inf', '-inf', 'abc'])
+def test_invalid_deadline_header_uses_default(header):
+    with server.app.test_request_context('/sign', method='POST', headers={'X-Sign-Deadline': header}):
+        remaining = server.request_deadline() - time.time()
+
+    assert math.isfinite(remaining)
+    assert abs(remaining - server.SIGN_DEADLINE) < 1
+
+
+def test_nan_deadline_header_still_signs(client):
+    response = client.post('/sign', json={'uri': '/api/nan'}, headers={'X-Sign-Deadline': 'nan'})
+
+    assert response.status_code == 200
+
+
+def test_batch_returns_504_at_deadline(client, sign_pool):
+    for page in sign_pool:
+        page.signer = slow_signer
+
+    response = client.post('/sign/batch', json={'items': [{'uri': '/api/batch'}]}, headers={'X-Sign-Deadline': '0.1'})
+
+    assert response.status_code == 504
+    assert 'Retry-After' not in response.headers
+
+
+def test_abandoned_coalesced_sign_does_not_reach_a_page(sign_pool):
+    for page in sign_pool:
+        page.signer = slow_signer
+    deadline = time.time() + 0.1
+
+    requests = []
+    for i in range(3):
+        # 错开发送，每条各自成为一个批次
+        requests.append(gevent.spawn(server.generate_sign, f'/api/{i}', None, '', '', deadline=deadline))
+        gevent.sleep(0.01)
+    gevent.joinall(requests)
+    gevent.sleep(0.5)
+
+    assert all(isinstance(g.exception, server.SignDeadlineExceeded) for g in requests)
+    # 两个页面各执行了一个批次，排在后面的批次在截止时间后被取消，没有占用页面
+    assert sum(page.calls for page in sign_pool) == 2
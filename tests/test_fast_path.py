@@ -0,0 +1,67 @@
+"""签名快速路径 SignFastPath：句柄解析、失效后重新解析、不可用时回退到 page.evaluate"""
+
+import pytest
+
+import server
+from fakes import FakeCDPPage, FakePage
+
+
+@pytest.fixture
+def fast_path(monkeypatch):
+    monkeypatch.setattr(server, 'SIGN_FAST_PATH', True)
+    monkeypatch.setattr(server, 'sign_fast_paths', {})
+
+
+def test_handle_is_resolved_once(fast_path):
+    page = FakeCDPPage()
+
+    first = server.sign_on_page(page, [['/api/a', None]])
+    second = server.sign_on_page(page, [['/api/b', {'k': 1}]])
+
+    assert first[0]['x-s'] == 'XYW_/api/a'
+    assert second[0]['x-s'] == 'XYW_/api/b'
+    assert server.sign_fast_paths[page].resolves == 1
+
+
+def test_stale_handle_is_resolved_again(fast_path):
+    page = FakeCDPPage()
+    server.sign_on_page(page, [['/api/a', None]])
+    # 页面已经换了执行上下文，但 framenavigated 还没到达
+    page.cdp.invalidate()
+
+    results = server.sign_on_page(page, [['/api/b', None]])
+
+    assert results[0] == {'ok': True, 'x-s': 'XYW_/api/b', 'x-t': results[0]['x-t']}
+    assert server.sign_fast_paths[page].resolves == 2
+    assert page.calls == 3
+
+
+def test_navigation_drops_the_handle(fast_path):
+    page = FakeCDPPage()
+    server.sign_on_page(page, [['/api/a', None]])
+
+    page.goto('https://www.xiaohongshu.com')
+    results = server.sign_on_page(page, [['/api/b', None]])
+
+    assert results[0]['x-s'] == 'XYW_/api/b'
+    assert server.sign_fast_paths[page].resolves == 2
+    # 跳转后直接用新句柄，不会先撞上失效错误
+    assert page.calls == 2
+
+
+def test_missing_sign_function_fails_the_call(fast_path):
+    page = FakeCDPPage()
+    page.signer = None
+
+    with pytest.raises(Exception, match='window._webmsxyw is not a function'):
+        server.sign_on_page(page, [['/api/a', None]])
+
+
+def test_falls_back_to_evaluate_without_cdp(fast_path):
+    page = FakePage()
+
+    results = server.sign_on_page(page, [['/api/a', None]])
+
+    assert results[0]['x-s'] == 'XYW_/api/a'
+    assert server.sign_fast_paths[page] is False
+    assert page.calls == 1
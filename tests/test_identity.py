@@ -0,0 +1,125 @@
+"""多账号身份上下文"""
+
+import time
+
+import gevent
+import pytest
+
+import server
+from fakes import FakeContext, slow_signer
+
+
+def test_claimed_spare_drops_server_identity(sign_pool):
+    spare_context = FakeContext(
+        cookies=[{'name': 'a1', 'value': 'server-a1', 'domain': '.xiaohongshu.com', 'path': '/'},
+                 {'name': 'web_session', 'value': 'server-session', 'domain': '.xiaohongshu.com', 'path': '/'}],
+        origins=[{'origin': 'https://www.xiaohongshu.com', 'localStorage': [{'name': 'b1', 'value': 'server'}]}]
+    )
+    page = spare_context.new_page()
+
+    identity = server.IdentityContext('customer-a1', 'customer-session', '', spare=(page, spare_context))
+    try:
+        cookies = {cookie['name']: cookie['value'] for cookie in spare_context.cookies()}
+        assert cookies == {'a1': 'customer-a1', 'web_session': 'customer-session'}
+        assert spare_context.origins == []
+        assert page.gotos == 1
+    finally:
+        identity.close()
+
+
+@pytest.fixture
+def identities(sign_pool, monkeypatch):
+    """开启账号身份池，新建的上下文都是假的"""
+    contexts = []
+
+    def new_context():
+        context = FakeContext()
+        contexts.append(context)
+        return context
+
+    monkeypatch.setattr(server, 'identity_pool', server.IdentityPool(4, 0))
+    monkeypatch.setattr(server, 'global_a1', 'server-a1')
+    monkeypatch.setattr(server, 'new_browser_context', new_context)
+    yield contexts
+    for identity in server.identity_pool.contexts.values():
+        identity.close()
+
+
+def test_identity_creation_respects_deadline(client, identities, monkeypatch):
+    def slow_load(page):
+        time.sleep(0.3)
+        page.goto('https://www.xiaohongshu.com')
+
+    monkeypatch.setattr(server, 'load_sign_page', slow_load)
+
+    started = time.perf_counter()
+    response = client.post('/sign', json={'uri': '/api/x', 'a1': 'customer-a1'}, headers={'X-Sign-Deadline': '0.1'})
+
+    assert response.status_code == 504
+    assert time.perf_counter() - started < 0.25
+    # 创建在后台继续完成，之后的请求直接使用
+    gevent.sleep(0.4)
+    assert 'customer-a1' in server.identity_pool.contexts
+    assert client.post('/sign', json={'uri': '/api/x', 'a1': 'customer-a1'}).status_code == 200
+
+
+def test_cookie_change_is_applied_only_when_signing(client, identities):
+    payload = {'uri': '/api/x', 'a1': 'customer-a1', 'web_session': 'session-1'}
+    assert client.post('/sign', json=payload).status_code == 200
+    identity = server.identity_pool.contexts['customer-a1']
+    context = identities[0]
+
+    # 命中缓存：只记录新的 web_session，不向页面投递任务
+    assert client.post('/sign', json={**payload, 'web_session': 'session-2'}).status_code == 200
+    assert identity.worker.jobs_done == 1
+    assert {c['name']: c['value'] for c in context.cookies()}['web_session'] == 'session-1'
+
+    # 真正签名时在同一个任务里先更新 cookie
+    assert client.post('/sign', json={**payload, 'uri': '/api/y', 'web_session': 'session-2'}).status_code == 200
+    assert identity.worker.jobs_done == 2
+    assert {c['name']: c['value'] for c in context.cookies()}['web_session'] == 'session-2'
+
+
+def test_identity_sign_returns_504_at_deadline(client, identities):
+    assert client.post('/sign', json={'uri': '/api/warm', 'a1': 'customer-a1'}).status_code == 200
+
+    server.identity_pool.contexts['customer-a1'].worker.page.signer = slow_signer
+    response = client.post('/sign', json={'uri': '/api/slow', 'a1': 'customer-a1'}, headers={'X-Sign-Deadline': '0.1'})
+
+    assert response.status_code == 504
+
+
+def test_concurrent_first_requests_respect_the_cap(identities, monkeypatch):
+    def slow_load(page):
+        time.sleep(0.1)
+        page.goto('https://www.xiaohongshu.com')
+
+    monkeypatch.setattr(server, 'load_sign_page', slow_load)
+    monkeypatch.setattr(server, 'identity_pool', server.IdentityPool(2, 0))
+
+    requests = [gevent.spawn(server.generate_sign, '/api/x', None, f'customer-{i}', '') for i in range(4)]
+    gevent.joinall(requests)
+
+    assert sum(1 for g in requests if g.successful()) == 2
+    assert all(isinstance(g.exception, server.PagePoolBusy) for g in requests if not g.successful())
+    assert len(identities) == 2
+    assert len(server.identity_pool.contexts) == 2
+
+
+def test_handed_out_identity_is_not_evicted(identities, monkeypatch):
+    monkeypatch.setattr(server, 'identity_pool', server.IdentityPool(1, 0))
+    deadline = time.time() + 1
+    first = server.identity_pool.get('customer-1', '', '', deadline)
+
+    # 第一个身份已经交给请求、还没投递任务：不能被淘汰
+    with pytest.raises(server.PagePoolBusy):
+        server.identity_pool.get('customer-2', '', '', deadline)
+    assert not identities[0].closed
+
+    server.identity_pool.release(first)
+    second = server.identity_pool.get('customer-2', '', '', deadline)
+    server.identity_pool.release(second)
+
+    assert list(server.identity_pool.contexts) == ['customer-2']
+    gevent.sleep(0)
+    assert identities[0].closed
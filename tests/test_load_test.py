@@ -0,0 +1,19 @@
+"""压测报告的分位数与服务端 /metrics 使用同一个定义"""
+
+import pytest
+
+import load_test
+import server
+
+
+@pytest.mark.parametrize('n', [1, 2, 20, 21, 99, 100, 101])
+@pytest.mark.parametrize('pct', [50, 95, 99])
+def test_percentile_matches_server(n, pct):
+    values = list(range(1, n + 1))
+
+    assert load_test.percentile(values, pct) == server.percentile(values, pct)
+
+
+def test_percentile_uses_nearest_rank():
+    # n=21 时 p50 是第 ceil(10.5) = 11 个值，不是四舍五入到偶数得到的第 10 个
+    assert load_test.percentile(list(range(1, 22)), 50) == 11
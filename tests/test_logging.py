@@ -0,0 +1,39 @@
+"""非阻塞日志"""
+
+import logging
+import threading
+
+import server
+
+
+class RecordingHandler(logging.Handler):
+    """记录写入的日志和写入它的线程"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+        self.threads = set()
+        self.flushed = False
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+        self.threads.add(threading.get_ident())
+
+    def flush(self):
+        self.flushed = True
+
+
+def test_close_lets_the_drain_thread_write_everything():
+    target = RecordingHandler()
+    handler = server.AsyncLogHandler(target)
+    records = [logging.makeLogRecord({'msg': f'line {i}', 'levelno': logging.INFO}) for i in range(200)]
+
+    for record in records:
+        handler.emit(record)
+    handler.close()
+    handler.close()
+
+    assert target.messages == [f'line {i}' for i in range(200)]
+    assert target.flushed
+    # 所有日志都由写日志线程写入，close() 所在的线程不直接写 target
+    assert threading.get_ident() not in target.threads
@@ -0,0 +1,26 @@
+"""/metrics 输出格式"""
+
+import server
+
+
+def test_metrics_defaults_to_prometheus_text(client):
+    response = client.get('/metrics')
+
+    assert response.content_type.startswith('text/plain')
+    assert b'# TYPE xhs_sign_requests_total counter' in response.data
+
+
+def test_json_stats_are_served_separately(client):
+    response = client.get('/metrics/json')
+
+    assert response.is_json
+    assert 'cache' in response.get_json()
+
+
+def test_unmatched_requests_are_labelled(client, monkeypatch):
+    monkeypatch.setattr(server, 'request_counts', {})
+
+    assert client.get('/no-such-path').status_code == 404
+
+    assert server.request_counts == {('unmatched', 404): 1}
+    assert b'endpoint="unmatched",status="404"' in client.get('/metrics').data
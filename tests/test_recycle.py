@@ -0,0 +1,85 @@
+"""签名页面的蓝绿回收"""
+
+import time
+
+import gevent
+import pytest
+
+import server
+from fakes import FakeContext, FakePage
+
+
+@pytest.fixture
+def new_contexts(sign_pool, monkeypatch):
+    """新建的上下文都是假的，记录是在哪个 greenlet 中创建的"""
+    created = []
+
+    def new_context(storage_state=None, block=True):
+        context = FakeContext()
+        created.append((context, gevent.getcurrent()))
+        return context
+
+    monkeypatch.setattr(server, 'new_browser_context', new_context)
+    return created
+
+
+def test_idle_worker_is_swapped_in_by_its_owner(sign_pool, new_contexts):
+    worker = server.page_workers[0]
+    old_page = worker.page
+
+    server.recycle_page_worker(worker, 'test')
+
+    assert worker.page is not old_page
+    assert worker.recycles == 1
+    assert server.pool_pages[0] is worker.page
+    assert server.context_page is worker.page
+    # 新页面在回收器中预热，持有者只负责切换
+    assert [owner for _, owner in new_contexts] == [gevent.getcurrent()]
+    gevent.sleep(0)
+    assert old_page.closed
+
+
+def test_failed_canary_keeps_old_page(sign_pool, new_contexts, monkeypatch):
+    worker = server.page_workers[0]
+    old_page = worker.page
+
+    def broken_canary(page):
+        raise Exception('canary failed')
+
+    monkeypatch.setattr(server, 'check_sign_page', broken_canary)
+
+    with pytest.raises(Exception, match='canary failed'):
+        server.recycle_page_worker(worker, 'test')
+
+    assert worker.page is old_page
+    assert new_contexts[0][0].closed
+    assert not old_page.closed
+
+
+def test_signing_continues_while_replacement_warms_up(client, sign_pool, monkeypatch):
+    class SlowPage(FakePage):
+        def goto(self, url):
+            time.sleep(1)
+            super().goto(url)
+
+    class SlowContext(FakeContext):
+        def new_page(self):
+            return SlowPage(self)
+
+    monkeypatch.setattr(server, 'new_browser_context', lambda storage_state=None, block=True: SlowContext())
+    monkeypatch.setattr(server, 'pool_pages', sign_pool[:1])
+    server.start_page_workers(sign_pool[:1])
+    worker = server.page_workers[0]
+    old_page = worker.page
+
+    recycling = gevent.spawn(server.recycle_page_worker, worker, 'test')
+    gevent.sleep(0.05)
+    statuses = []
+    for i in range(3):
+        response = client.post('/sign', json={'uri': f'/api/recycle/{i}'}, headers={'X-Sign-Deadline': '0.3'})
+        statuses.append(response.status_code)
+    recycling.get(timeout=2)
+
+    assert statuses == [200, 200, 200]
+    assert old_page.calls == 3
+    assert worker.page is not old_page
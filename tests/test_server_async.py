@@ -0,0 +1,130 @@
+"""asyncio 版本的签名服务器"""
+
+import asyncio
+import json
+
+import pytest
+
+import server_async
+
+
+async def call(method, path, body=b''):
+    """不经过 lifespan 事件，直接调用 ASGI 应用"""
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    await server_async.app({'type': 'http', 'method': method, 'path': path}, receive, send)
+    return sent[0]['status'], dict(sent[0]['headers']), json.loads(sent[1]['body'])
+
+
+@pytest.fixture
+def browser(monkeypatch):
+    """假的初始化：记录调用次数，完成后页面池不为空"""
+    inits = []
+
+    async def init_browser():
+        inits.append(1)
+        await asyncio.sleep(0.01)
+        server_async.pool_pages.append(object())
+
+    monkeypatch.setattr(server_async, 'pool_pages', [])
+    monkeypatch.setattr(server_async, 'init_task', None)
+    monkeypatch.setattr(server_async, 'init_error', None)
+    monkeypatch.setattr(server_async, 'init_browser', init_browser)
+    return inits
+
+
+def test_sign_returns_503_while_background_init_runs_once(browser):
+    async def main():
+        results = await asyncio.gather(*[call('POST', '/sign', b'{"uri": "/api/x"}') for _ in range(5)])
+        await server_async.init_task
+        return results
+
+    results = asyncio.run(main())
+
+    assert [status for status, _, _ in results] == [503] * 5
+    assert all(headers[b'retry-after'] == b'5' for _, headers, _ in results)
+    assert browser == [1]
+    assert server_async.pool_pages
+
+
+def test_info_endpoints_do_not_start_the_browser(browser):
+    async def main():
+        return [await call('GET', '/'), await call('GET', '/a1')]
+
+    results = asyncio.run(main())
+
+    assert [status for status, _, _ in results] == [200, 200]
+    assert browser == []
+    assert server_async.init_task is None
+
+
+@pytest.mark.parametrize('body', [b'[{"uri": "/api/x"}]', b'"/api/x"', b'42'])
+def test_sign_rejects_non_object_body(browser, body):
+    server_async.pool_pages.append(object())
+
+    status, _, payload = asyncio.run(call('POST', '/sign', body))
+
+    assert status == 400
+    assert payload['success'] is False
+
+
+class FakeAsyncBrowser:
+    def __init__(self):
+        self.closed = False
+
+    async def new_context(self):
+        return FakeAsyncContext()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAsyncContext:
+    async def new_page(self):
+        return FakeAsyncPage()
+
+
+class FakeAsyncPage:
+    async def goto(self, url):
+        raise Exception('Timeout 30000ms exceeded')
+
+
+class FakeAsyncPlaywright:
+    """async_playwright() 的替身：启动的浏览器访问首页总是超时"""
+
+    def __init__(self):
+        self.chromium = self
+        self.browser = FakeAsyncBrowser()
+        self.stopped = False
+
+    async def start(self):
+        return self
+
+    async def launch(self, headless=True):
+        return self.browser
+
+    async def stop(self):
+        self.stopped = True
+
+
+def test_failed_init_closes_browser_and_playwright(monkeypatch):
+    playwright = FakeAsyncPlaywright()
+    monkeypatch.setattr(server_async, 'async_playwright', lambda: playwright)
+    monkeypatch.setattr(server_async, 'download_stealth_js', lambda: None)
+    for name in ('playwright_instance', 'browser', 'browser_context', 'page_pool', 'pool_pages'):
+        monkeypatch.setattr(server_async, name, getattr(server_async, name))
+
+    with pytest.raises(Exception, match='Timeout'):
+        asyncio.run(server_async.init_browser())
+
+    assert playwright.browser.closed
+    assert playwright.stopped
+    assert server_async.playwright_instance is None
+    assert server_async.browser is None
+    assert server_async.pool_pages == []
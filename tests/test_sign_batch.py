@@ -0,0 +1,29 @@
+"""批量签名接口 /sign/batch"""
+
+import pytest
+
+
+def test_batch_signs_each_item(client, sign_pool):
+    response = client.post('/sign/batch', json={'items': [{'uri': '/api/a'}, {'uri': ''}, {'uri': '/api/b', 'data': {'k': 1}}]})
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0]['x-s'] == 'XYW_/api/a'
+    assert results[1] == {'error': 'uri parameter is required'}
+    assert results[2]['x-s'] == 'XYW_/api/b'
+    assert sum(page.calls for page in sign_pool) == 1
+
+
+@pytest.mark.parametrize('body', ['{"items": [', '[{"uri": "/api/a"}]', '"items"', 'null'])
+def test_malformed_or_non_object_body_is_rejected(client, body):
+    response = client.post('/sign/batch', data=body, content_type='application/json')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+@pytest.mark.parametrize('items', [[], {'uri': '/api/a'}, [{'uri': '/api/a'}, '/api/b'], [None]])
+def test_items_must_be_a_list_of_objects(client, items):
+    response = client.post('/sign/batch', json={'items': items})
+
+    assert response.status_code == 400
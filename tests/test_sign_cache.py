@@ -0,0 +1,64 @@
+"""签名缓存"""
+
+import time
+
+import server
+
+
+def signature(x_s, signed_at=None):
+    return {'x-s': x_s, 'x-t': str(int((signed_at or time.time()) * 1000))}
+
+
+def test_expiry_counts_from_x_t():
+    cache = server.SignCache(10, 100, 1024 * 1024)
+
+    cache.put('fresh', signature('a'))
+    cache.put('stale', signature('b', time.time() - 11))
+    cache.put('expiring', signature('c', time.time() - 9.99))
+    time.sleep(0.02)
+
+    assert cache.get('fresh')['x-s'] == 'a'
+    assert 'stale' not in cache.entries
+    assert cache.get('expiring') is None
+    assert cache.expired == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = server.SignCache(10, 2, 1024 * 1024)
+    cache.put('a', signature('a'))
+    cache.put('b', signature('b'))
+    cache.get('a')
+
+    cache.put('c', signature('c'))
+
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.evictions == 1
+
+
+def test_byte_limit_evicts_entries():
+    cache = server.SignCache(10, 100, 600)
+
+    for key in ('a', 'b', 'c'):
+        cache.put(key, signature('x' * 100))
+
+    assert cache.bytes <= 600
+    assert len(cache.entries) < 3
+
+
+def test_cache_key_is_independent_of_key_order_and_scoped_by_identity():
+    first = server.sign_cache_key('/api/x', {'a': 1, 'b': 2})
+
+    assert first == server.sign_cache_key('/api/x', {'b': 2, 'a': 1})
+    assert first != server.sign_cache_key('/api/x', {'a': 1, 'b': 3})
+    assert first != server.sign_cache_key('/api/x', {'a': 1, 'b': 2}, identity='customer-a1')
+
+
+def test_no_cache_header_skips_lookup_but_refreshes_entry(client, sign_pool):
+    body = {'uri': '/api/x', 'data': {'k': 1}}
+
+    first = client.post('/sign', json=body).get_json()
+    assert client.post('/sign', json=body).get_json()['x-s'] == first['x-s']
+    assert sum(page.calls for page in sign_pool) == 1
+
+    client.post('/sign', json=body, headers={'Cache-Control': 'no-cache'})
+    assert sum(page.calls for page in sign_pool) == 2
@@ -0,0 +1,40 @@
+"""相同签名请求合并（single-flight）"""
+
+import time
+
+import gevent
+import pytest
+
+import server
+from fakes import slow_signer
+
+
+def test_identical_requests_share_one_page_call(sign_pool):
+    for page in sign_pool:
+        page.signer = slow_signer
+
+    requests = [gevent.spawn(server.generate_sign, '/api/same', {'k': 1}, '', '') for _ in range(5)]
+    gevent.joinall(requests, raise_error=True)
+
+    assert len({request.value['x-s'] for request in requests}) == 1
+    assert sum(page.calls for page in sign_pool) == 1
+    assert server.inflight_signs == {}
+
+
+def test_killed_leader_releases_followers(sign_pool):
+    for page in sign_pool:
+        page.signer = slow_signer
+    deadline = time.time() + 5
+
+    leader = gevent.spawn(server.generate_sign, '/api/same', None, '', '', deadline=deadline)
+    gevent.sleep(0.01)
+    follower = gevent.spawn(server.generate_sign, '/api/same', None, '', '', deadline=deadline)
+    gevent.sleep(0.01)
+    leader.kill()
+
+    started = time.perf_counter()
+    with pytest.raises(server.PagePoolBusy):
+        follower.get(timeout=1)
+    assert time.perf_counter() - started < 0.1
+    assert server.inflight_signs == {}
+    assert server.sign_breaker.state == 'closed'
@@ -0,0 +1,68 @@
+"""流量录制：脱敏、有界队列和写入线程状态"""
+
+import json
+import time
+
+import server
+from replay_trace import build_uri
+
+
+def wait_recorded(recorder, count):
+    deadline = time.time() + 2
+    while recorder.recorded + recorder.errors < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_query_values_are_not_recorded(tmp_path):
+    path = tmp_path / 'sign.jsonl'
+    recorder = server.TraceRecorder(str(path), salt='shared')
+    payload = {'uri': '/api/sns/web/v1/search?keyword=secret&page=2', 'data': {'note_id': 'abc'}}
+
+    recorder.record(1.0, payload, False, 200, 0.01)
+    recorder.record(2.0, payload, False, 200, 0.01)
+    wait_recorded(recorder, 2)
+
+    text = path.read_text(encoding='utf-8')
+    assert 'secret' not in text and 'abc' not in text
+    first, second = [json.loads(line) for line in text.splitlines()]
+    assert first['uri'] == '/api/sns/web/v1/search'
+    assert first['query_keys'] == ['keyword', 'page']
+    assert first['query_fp'] == second['query_fp']
+    assert build_uri(first).startswith('/api/sns/web/v1/search?keyword=')
+
+
+def test_shared_salt_gives_same_fingerprints_across_recorders():
+    payload = {'uri': '/api/x?a=1', 'data': {'k': 'v'}}
+    first = server.TraceRecorder('', salt='shared').build(1.0, payload, False, 200, 0.01)
+    second = server.TraceRecorder('', salt='shared').build(1.0, payload, False, 200, 0.01)
+
+    assert first['data_fp'] == second['data_fp']
+    assert first['query_fp'] == second['query_fp']
+
+
+def test_full_queue_drops_and_counts():
+    recorder = server.TraceRecorder('', max_queued=2)
+    recorder.queue = server.monkey.get_original('queue', 'SimpleQueue')()
+    recorder.alive = True
+
+    for i in range(5):
+        recorder.record(float(i), {'uri': '/api/x'}, False, 200, 0.01)
+
+    assert recorder.queue.qsize() == 2
+    assert recorder.dropped == 3
+
+
+def test_writer_failure_is_reported(tmp_path):
+    blocker = tmp_path / 'not-a-dir'
+    blocker.write_text('', encoding='utf-8')
+    recorder = server.TraceRecorder(str(blocker / 'sign.jsonl'))
+    deadline = time.time() + 2
+    while recorder.alive and time.time() < deadline:
+        time.sleep(0.01)
+
+    recorder.record(1.0, {'uri': '/api/x'}, False, 200, 0.01)
+
+    stats = recorder.stats()
+    assert stats['writer_alive'] is False
+    assert '无法打开录制文件' in stats['last_error']
+    assert stats['dropped'] == 1